@@ -0,0 +1,170 @@
+# تأكيد حفظ الرسائل للمستخدم دون إغراق التوبيك بالردود
+# لكل محادثة طابور إرسال بمعدلها (حد تيليجرام في المجموعات حوالي 20 رسالة في الدقيقة)
+# مع حد عام للبوت كله، فلا يتأخر استقبال الرسائل ولا تأكيدات المحادثات الأخرى بسبب مجموعة مزدحمة
+import asyncio
+import logging
+
+from telegram.error import RetryAfter
+
+from metrics import TELEGRAM_REPLY_SECONDS
+from notion_dispatcher import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# أوضاع التأكيد:
+# reply: رد على كل رسالة (السلوك الأصلي)
+# reaction: تفاعل على الرسالة نفسها دون رسالة جديدة
+# summary: رسالة ملخص واحدة لكل توبيك خلال النافذة الزمنية
+# silent: بدون تأكيد
+ACK_MODES = ("reply", "reaction", "summary", "silent")
+
+SAVED_TEXT = "تم حفظ الرسالة في Notion بنجاح!"
+ACK_REACTION = "👍"
+
+CHAT_IDLE = 60.0  # مدة بقاء عامل المحادثة بعد آخر تأكيد بالثواني
+
+
+class Acknowledger:
+    """
+    إرسال تأكيدات الحفظ حسب الوضع المحدد عبر طابور لكل محادثة بمعدل محدود
+    التأكيدات غير ضرورية لعمل البوت، لذلك تُهمل عند امتلاء الطوابير بدلاً من انتظار الإرسال
+    """
+
+    def __init__(self, mode: str = "reply", window: float = 5.0, rate: float = 20.0, chat_rate: float = 20.0,
+                 max_queue: int = 1000, max_retries: int = 3):
+        """
+        Args:
+            mode (str): وضع التأكيد من ACK_MODES
+            window (float): مدة تجميع التأكيدات في وضع summary بالثواني
+            rate (float): عدد رسائل التأكيد المرسلة في الثانية لكل المحادثات
+            chat_rate (float): عدد رسائل التأكيد المرسلة في الدقيقة لكل محادثة
+            max_queue (int): أقصى عدد تأكيدات تنتظر الإرسال في كل الطوابير
+            max_retries (int): عدد مرات إعادة المحاولة عند RetryAfter
+        """
+        if mode not in ACK_MODES:
+            raise ValueError(f"وضع تأكيد غير معروف: {mode}")
+        self.mode = mode
+        self.window = window
+        self.chat_rate = chat_rate
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self._chats = {}  # chat_id -> (طابور، دلو المحادثة، العامل)
+        self._summaries = {}  # (chat_id, thread_id) -> عدد الرسائل المحفوظة خلال النافذة
+        self._timers = {}
+        self._started = False
+        self.bot = None
+
+    def pending(self) -> int:
+        """
+        عدد التأكيدات التي تنتظر الإرسال
+        """
+        return sum(queue.qsize() for queue, _, _ in self._chats.values())
+
+    def start(self, bot):
+        """
+        بدء الإرسال بعد تشغيل البوت (عامل لكل محادثة يُنشأ عند أول تأكيد لها)
+        """
+        self.bot = bot
+        if self.mode == "reaction" and not hasattr(bot, "set_message_reaction"):
+            logger.warning("إصدار المكتبة لا يدعم التفاعلات، سيتم استخدام وضع summary")
+            self.mode = "summary"
+        self._started = True
+
+    def ack(self, message, count: int = 1, text: str = None):
+        """
+        تأكيد حفظ رسالة (أو ألبوم من count رسائل) دون انتظار الإرسال
+
+        Args:
+            message: الرسالة التي تم حفظها
+            count (int): عدد الرسائل التي تمثلها
+            text (str): نص الرد في وضع reply
+        """
+        if self.mode == "silent":
+            return
+        chat_id = message.chat.id
+        if self.mode == "reply":
+            self._enqueue(chat_id, lambda: self.bot.send_message(
+                chat_id,
+                text or SAVED_TEXT,
+                message_thread_id=message.message_thread_id if message.is_topic_message else None,
+                reply_to_message_id=message.message_id,
+            ))
+        elif self.mode == "reaction":
+            self._enqueue(chat_id, lambda: self.bot.set_message_reaction(chat_id, message.message_id, ACK_REACTION))
+        else:
+            key = (chat_id, message.message_thread_id if message.is_topic_message else None)
+            self._summaries[key] = self._summaries.get(key, 0) + count
+            if key not in self._timers:
+                self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._summarize, key)
+
+    def _summarize(self, key):
+        self._timers.pop(key, None)
+        count = self._summaries.pop(key, 0)
+        if not count:
+            return
+        chat_id, thread_id = key
+        text = SAVED_TEXT if count == 1 else f"تم حفظ {count} رسائل في Notion"
+        self._enqueue(chat_id, lambda: self.bot.send_message(chat_id, text, message_thread_id=thread_id))
+
+    def _enqueue(self, chat_id, send):
+        if self.pending() >= self.max_queue:
+            logger.warning("طابور التأكيدات ممتلئ، تم تجاهل تأكيد")
+            return
+        if chat_id not in self._chats:
+            # دفعة أولية برسالة واحدة: الحد في المجموعات للدقيقة لا للحظة
+            bucket = TokenBucket(self.chat_rate / 60, capacity=1)
+            queue = asyncio.Queue()
+            worker = asyncio.get_running_loop().create_task(self._run(chat_id, queue, bucket))
+            self._chats[chat_id] = (queue, bucket, worker)
+        self._chats[chat_id][0].put_nowait(send)
+
+    async def _run(self, chat_id, queue: asyncio.Queue, bucket: TokenBucket):
+        while True:
+            try:
+                send = await asyncio.wait_for(queue.get(), CHAT_IDLE)
+            except asyncio.TimeoutError:
+                # المحادثة هادئة: دلوها امتلأ، فلا حاجة لبقاء العامل
+                if queue.empty():
+                    self._chats.pop(chat_id, None)
+                    return
+                continue
+            try:
+                await self._send(send, bucket)
+            finally:
+                queue.task_done()
+
+    async def _send(self, send, bucket: TokenBucket):
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self.bucket.acquire()
+            try:
+                with TELEGRAM_REPLY_SECONDS.time(mode=self.mode):
+                    await send()
+                return
+            except RetryAfter as e:
+                # تيليجرام يطلب الانتظار: نوقف تأكيدات هذه المحادثة فقط، ولا تتأثر المحادثات الأخرى
+                logger.warning("تم تجاوز حد الإرسال في تيليجرام، الانتظار %s ثانية", e.retry_after)
+                bucket.pause(float(e.retry_after))
+            except Exception as e:
+                logger.warning("فشل إرسال التأكيد: %s", e)
+                return
+        logger.warning("تم تجاهل تأكيد بعد تكرار تجاوز حد الإرسال")
+
+    async def stop(self, timeout: float = 5.0):
+        """
+        إرسال الملخصات المنتظرة وما في الطوابير ثم إيقاف العمال
+        """
+        for key, timer in list(self._timers.items()):
+            timer.cancel()
+            self._summarize(key)
+        if not self._started:
+            return
+        chats = list(self._chats.values())
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue, _, _ in chats)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("انتهت مهلة إرسال التأكيدات المتبقية")
+        for _, _, worker in chats:
+            worker.cancel()
+        self._chats.clear()
@@ -0,0 +1,68 @@
+# ذاكرة مؤقتة لمشرفي كل مجموعة
+# قائمة المشرفين تُجلب بطلب get_chat_administrators واحد وتُستخدم لكل الأوامر والأزرار حتى انتهاء صلاحيتها
+# أو حتى يصل تحديث chat_member يغير صلاحيات أحد الأعضاء
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ("creator", "administrator")
+
+
+class AdminCache:
+    """
+    معرفات مشرفي كل محادثة مع مدة صلاحية
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Args:
+            ttl (float): مدة صلاحية قائمة المشرفين بالثواني
+        """
+        self.ttl = ttl
+        self._admins = {}  # chat_id -> (وقت انتهاء الصلاحية، مجموعة معرفات المشرفين)
+        self._locks = {}
+
+    async def is_admin(self, bot, chat_id: int, user_id: int) -> bool:
+        """
+        هل المستخدم مشرف (أو منشئ) في المحادثة؟
+        """
+        return user_id in await self.admins(bot, chat_id)
+
+    async def admins(self, bot, chat_id: int) -> frozenset:
+        """
+        معرفات مشرفي المحادثة، من الذاكرة أو بطلب واحد إلى تيليجرام
+        """
+        cached = self._admins.get(chat_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            # ربما جلبها طلب آخر أثناء الانتظار
+            cached = self._admins.get(chat_id)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+            members = await bot.get_chat_administrators(chat_id)
+            admins = frozenset(member.user.id for member in members if member.status in ADMIN_STATUSES)
+            self._admins[chat_id] = (time.monotonic() + self.ttl, admins)
+            logger.debug("تم تحديث قائمة مشرفي المحادثة %s (%s مشرف)", chat_id, len(admins))
+            return admins
+
+    def invalidate(self, chat_id: int):
+        """
+        حذف قائمة مشرفي المحادثة حتى تُجلب من جديد عند أول استخدام
+        """
+        self._admins.pop(chat_id, None)
+
+    def on_member_update(self, chat_member_updated):
+        """
+        تحديث chat_member: نحذف القائمة فقط إذا تغير كون العضو مشرفاً
+        """
+        old = chat_member_updated.old_chat_member.status in ADMIN_STATUSES
+        new = chat_member_updated.new_chat_member.status in ADMIN_STATUSES
+        if old != new:
+            logger.info("تغيرت صلاحيات عضو في المحادثة %s، سيتم تحديث قائمة المشرفين", chat_member_updated.chat.id)
+            self.invalidate(chat_member_updated.chat.id)
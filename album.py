@@ -0,0 +1,80 @@
+# تجميع أجزاء الألبوم (media_group_id) في إدخال واحد
+# تيليجرام يرسل كل صورة من الألبوم كتحديث منفصل، فنجمعها خلال نافذة زمنية قصيرة
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Album:
+    __slots__ = ("items", "started", "timer")
+
+    def __init__(self):
+        self.items = []
+        self.started = time.monotonic()
+        self.timer = None
+
+
+class AlbumAggregator:
+    """
+    جمع الرسائل التي تحمل نفس media_group_id ثم تمريرها معاً إلى on_album
+    المفتاح يحدده المستخدم، مثل (page_id, media_group_id)
+    النافذة تبدأ من جديد مع كل جزء يصل، بحد أقصى max_wait من أول جزء
+    """
+
+    def __init__(self, on_album, window: float = 1.0, max_wait: float = 5.0):
+        """
+        Args:
+            on_album: دالة غير متزامنة (key, items) تستقبل أجزاء الألبوم بالترتيب
+            window (float): مدة الانتظار بعد آخر جزء بالثواني
+            max_wait (float): أقصى مدة انتظار من أول جزء بالثواني
+        """
+        self._on_album = on_album
+        self.window = window
+        self.max_wait = max_wait
+        self._albums = {}
+        self._tasks = set()
+
+    def add(self, key, item):
+        """
+        إضافة جزء من الألبوم
+        """
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = _Album()
+        album.items.append(item)
+
+        if album.timer is not None:
+            album.timer.cancel()
+        delay = min(self.window, max(0.0, album.started + self.max_wait - time.monotonic()))
+        album.timer = asyncio.get_running_loop().call_later(delay, self._complete, key)
+
+    def _complete(self, key):
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        task = asyncio.get_running_loop().create_task(self._deliver(key, album.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, key, items: list):
+        try:
+            await self._on_album(key, items)
+        except Exception as e:
+            logger.error("خطأ في حفظ الألبوم %s: %s", key, e)
+
+    async def flush(self, match=None):
+        """
+        تسليم الألبومات المنتظرة فوراً دون انتظار نهاية النافذة
+        يستخدم قبل حفظ رسالة عادية حتى لا تسبق الألبوم الذي أُرسل قبلها، وعند الإيقاف
+
+        Args:
+            match: دالة اختيارية (key) تحدد الألبومات المطلوب تسليمها، والافتراضي كلها
+        """
+        for key in list(self._albums):
+            if match is None or match(key):
+                self._albums[key].timer.cancel()
+                self._complete(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,341 @@
+# استيراد سجل محادثة سابق من ملف تصدير تيليجرام (result.json من Telegram Desktop)
+# الملف يُقرأ كتدفق رسالة برسالة، فلا يتجاوز استهلاك الذاكرة حجم رسالة واحدة مهما كبر الملف
+# (مع مجموعة محدودة من معرفات رسائل التوبيك الأخيرة عند استيراد توبيك واحد)
+# الرسائل تمر عبر الصندوق الصادر مثل الرسائل الجديدة، فتُرسل بدفعات وبنفس تنظيم المعدل
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from telegram import Message
+
+from blocks import build_content_blocks, build_message_blocks, build_message_link
+from rich_text import utf16_len
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 64 * 1024  # عدد الأحرف المقروءة من الملف في كل مرة
+CHECKPOINT_EVERY = 500  # عدد الرسائل المقروءة من الملف بين كل نقطتي حفظ للتقدم
+TOPIC_IDS_LIMIT = 100_000  # عدد معرفات رسائل التوبيك الأخيرة التي تُعرف بها الردود داخله
+
+_MESSAGES_START = re.compile(r'"messages"\s*:\s*\[')
+
+# أنواع التنسيق في ملف التصدير وما يقابلها في Bot API (الباقي يبقى نصاً عادياً)
+_EXPORT_ENTITIES = {
+    "bold": "bold",
+    "italic": "italic",
+    "underline": "underline",
+    "strikethrough": "strikethrough",
+    "code": "code",
+    "pre": "pre",
+    "text_link": "text_link",
+    "link": "url",
+    "mention": "mention",
+    "email": "email",
+    "blockquote": "blockquote",
+}
+
+
+def iter_export_messages(path: str, chunk_size: int = READ_CHUNK):
+    """
+    قراءة رسائل ملف التصدير واحدة تلو الأخرى دون تحميل الملف كاملاً
+
+    Raises:
+        ValueError: إذا لم يكن الملف تصدير محادثة صالحاً
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError("الملف لا يحتوي على قائمة رسائل")
+            buffer += chunk
+            match = _MESSAGES_START.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            # نحتفظ بنهاية الجزء في حال انقسم المفتاح بين قراءتين
+            buffer = buffer[-64:]
+
+        position = 0
+        finished = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                if buffer[position] == "]":
+                    return
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # الرسالة لم تكتمل في الجزء المقروء
+                    if finished:
+                        raise ValueError("ملف التصدير غير مكتمل أو تالف")
+                else:
+                    yield item
+                    continue
+            elif finished:
+                raise ValueError("انتهى الملف قبل نهاية قائمة الرسائل")
+
+            chunk = f.read(chunk_size)
+            finished = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def _text_and_entities(data: dict):
+    """
+    تحويل نص رسالة التصدير إلى نص وتنسيقات بصيغة Bot API (المواضع بوحدات UTF-16)
+    """
+    parts = data.get("text_entities")
+    if parts is None:
+        # ملفات التصدير القديمة تحفظ النص كسلسلة أو قائمة من السلاسل والأجزاء المنسقة
+        text = data.get("text", "")
+        if isinstance(text, str):
+            parts = [{"type": "plain", "text": text}]
+        else:
+            parts = [part if isinstance(part, dict) else {"type": "plain", "text": part} for part in text]
+
+    texts = []
+    entities = []
+    offset = 0
+    for part in parts:
+        part_text = part.get("text", "")
+        length = utf16_len(part_text)
+        entity_type = _EXPORT_ENTITIES.get(part.get("type"))
+        if entity_type and length:
+            entity = {"type": entity_type, "offset": offset, "length": length}
+            if entity_type == "text_link":
+                entity["url"] = part.get("href", "")
+            elif entity_type == "pre" and part.get("language"):
+                entity["language"] = part["language"]
+            entities.append(entity)
+        texts.append(part_text)
+        offset += length
+    return "".join(texts), entities
+
+
+def _export_media(data: dict) -> dict:
+    """
+    حقول الوسائط بصيغة Bot API لرسالة التصدير
+    الملفات نفسها ليست في تيليجرام، فمسارها في التصدير يُستخدم كمعرف فقط
+    """
+    if data.get("photo"):
+        return {"photo": [{
+            "file_id": data["photo"],
+            "file_unique_id": data["photo"],
+            "width": data.get("width", 0),
+            "height": data.get("height", 0),
+        }]}
+
+    if data.get("file"):
+        media = {"file_id": data["file"], "file_unique_id": data["file"]}
+        size = {"width": data.get("width", 0), "height": data.get("height", 0)}
+        duration = data.get("duration_seconds", 0)
+        media_type = data.get("media_type")
+        if media_type == "animation":
+            return {"animation": {**media, **size, "duration": duration}}
+        if media_type == "video_file":
+            return {"video": {**media, **size, "duration": duration}}
+        if media_type == "video_message":
+            return {"video_note": {**media, "length": size["width"], "duration": duration}}
+        if media_type == "voice_message":
+            return {"voice": {**media, "duration": duration}}
+        if media_type == "audio_file":
+            return {"audio": {
+                **media, "duration": duration, "title": data.get("title"), "performer": data.get("performer")
+            }}
+        if media_type == "sticker":
+            return {"sticker": {
+                **media, **size, "is_animated": False, "is_video": False, "type": "regular",
+                "emoji": data.get("sticker_emoji"),
+            }}
+        return {"document": {
+            **media,
+            "file_name": data.get("file_name") or os.path.basename(data["file"]),
+            "mime_type": data.get("mime_type"),
+        }}
+
+    if data.get("poll"):
+        poll = data["poll"]
+        return {"poll": {
+            "id": str(data["id"]),
+            "question": poll.get("question", ""),
+            "options": [
+                {"text": answer.get("text", ""), "voter_count": answer.get("voters", 0)}
+                for answer in poll.get("answers", [])
+            ],
+            "total_voter_count": poll.get("total_voters", 0),
+            "is_closed": poll.get("closed", False),
+            "is_anonymous": True,
+            "type": "regular",
+            "allows_multiple_answers": False,
+        }}
+
+    if data.get("location_information"):
+        return {"location": data["location_information"]}
+
+    if data.get("contact_information"):
+        contact = data["contact_information"]
+        return {"contact": {
+            "phone_number": contact.get("phone_number", ""),
+            "first_name": contact.get("first_name", ""),
+            "last_name": contact.get("last_name"),
+        }}
+
+    return {}
+
+
+def export_to_message(data: dict, chat: dict, thread_id: int = None):
+    """
+    تحويل رسالة من ملف التصدير إلى Message حتى تُبنى كتلها بنفس دوال الرسائل الجديدة
+
+    Returns:
+        Message: الرسالة، أو None لرسائل الخدمة والرسائل الفارغة
+    """
+    if data.get("type") != "message":
+        return None
+
+    fields = {
+        "message_id": data["id"],
+        "date": int(data.get("date_unixtime") or 0),
+        "chat": chat,
+    }
+    if thread_id is not None:
+        fields.update(message_thread_id=thread_id, is_topic_message=True)
+
+    text, entities = _text_and_entities(data)
+    media = _export_media(data)
+    if media:
+        fields.update(media)
+        if text:
+            fields.update(caption=text, caption_entities=entities)
+    elif text:
+        fields.update(text=text, entities=entities)
+    else:
+        return None
+    return Message.de_json(fields, None)
+
+
+def _load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": 0, "imported": 0}
+
+
+def _save_checkpoint(path: str, state: dict):
+    """
+    حفظ التقدم بكتابة ملف مؤقت ثم استبداله حتى لا يتلف عند الانهيار
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+class Backfill:
+    """
+    استيراد رسائل ملف تصدير إلى صفحة Notion مع حفظ التقدم لاستكماله بعد أي توقف
+    """
+
+    def __init__(self, outbox, drainer, max_pending: int = 1000, report_interval: float = 5.0):
+        """
+        Args:
+            outbox: الصندوق الصادر الذي تُكتب فيه الرسائل
+            drainer: المُفرِّغ الذي يرسلها إلى Notion
+            max_pending (int): أقصى عدد رسائل منتظرة للصفحة في الصندوق قبل إيقاف القراءة مؤقتاً
+            report_interval (float): أقل مدة بين تقارير التقدم بالثواني
+        """
+        self.outbox = outbox
+        self.drainer = drainer
+        self.max_pending = max_pending
+        self.report_interval = report_interval
+
+    async def run(self, path: str, chat: dict, thread_id, page_id: str, progress=None, defer=None,
+                  live_from: int = None) -> int:
+        """
+        استيراد الملف إلى الصفحة، بدءاً من آخر نقطة حفظ إن وجدت
+
+        Args:
+            path (str): مسار result.json
+            chat (dict): بيانات المحادثة التي تُستورد إليها الرسائل
+            thread_id: معرف التوبيك، أو None للمحادثة كاملة
+            page_id (str): صفحة Notion المرتبطة
+            progress: دالة غير متزامنة اختيارية (imported, scanned, finished) لتقارير التقدم
+            defer: دالة اختيارية (message, blocks) تعيد كتل الرسالة كما تُحفظ في الصندوق
+                (مع بيانات اختيار الصفحة الفرعية في التوبيكات المقسمة)
+            live_from (int): معرف رسالة الربط: الرسائل من بعدها حُفظت مباشرة (ومنها الألبومات بمفاتيحها الخاصة)،
+                فيتوقف الاستيراد عندها. بدونه تُمنع الرسائل المكررة بمفاتيح الصندوق فقط
+
+        Returns:
+            int: عدد الرسائل المستوردة
+        """
+        checkpoint_path = f"{path}.checkpoint"
+        state = _load_checkpoint(checkpoint_path)
+        if state["last_id"]:
+            logger.info("استكمال الاستيراد بعد الرسالة %s", state['last_id'])
+
+        # ملف التصدير لا يحدد توبيك كل رسالة، لكن رسائل التوبيك ردود على رسالة إنشائه أو على رسائل منه
+        # المعرفات محدودة بالأحدث منها، فالرد على رسالة أقدم من TOPIC_IDS_LIMIT رسالة في التوبيك لا يُستورد
+        topic_ids = OrderedDict.fromkeys([thread_id]) if thread_id is not None else None
+        scanned = 0
+        reported = time.monotonic()
+
+        for read, data in enumerate(iter_export_messages(path), 1):
+            # الإيقاع حسب الرسائل المقروءة لا المستوردة: التوبيك القليل في ملف كبير،
+            # أو الاستكمال من وسط الملف، لا يوقف حلقة الأحداث طوال القراءة
+            if read % CHECKPOINT_EVERY == 0:
+                _save_checkpoint(checkpoint_path, state)
+                self.drainer.notify(page_id)
+                # لا نقرأ أكثر مما يستطيع Notion استقباله للصفحة حتى يبقى الصندوق صغيراً
+                # (تعطل صفحات أخرى لا يوقف الاستيراد)
+                while self.outbox.pending_count(page_id) > self.max_pending:
+                    await asyncio.sleep(1)
+                await asyncio.sleep(0)
+                if progress is not None and time.monotonic() - reported >= self.report_interval:
+                    reported = time.monotonic()
+                    await progress(state["imported"], scanned, False)
+
+            message_id = data.get("id")
+            if not isinstance(message_id, int):
+                continue
+            if live_from is not None and message_id >= live_from:
+                # الملف مرتب حسب المعرف، فكل ما بعد هذه الرسالة حُفظ مباشرة
+                logger.info("توقف الاستيراد عند الرسالة %s (بداية الحفظ المباشر)", message_id)
+                break
+            if topic_ids is not None:
+                if data.get("reply_to_message_id") not in topic_ids:
+                    continue
+                topic_ids[message_id] = None
+                if len(topic_ids) > TOPIC_IDS_LIMIT:
+                    # معرف التوبيك نفسه يبقى دائماً
+                    topic_ids.popitem(last=False)
+                    topic_ids[thread_id] = None
+            scanned += 1
+            if message_id <= state["last_id"]:
+                continue
+
+            message = export_to_message(data, chat, thread_id)
+            if message is not None:
+                _, content = build_content_blocks(message, build_message_link(message))
+                if content:
+                    blocks = build_message_blocks(content)
+                    if defer is not None:
+                        blocks = defer(message, blocks)
+                    # نفس مفتاح الرسائل المفردة، فلا تتكرر إذا أعيد الاستيراد قبل حذف مفاتيحها من الصندوق
+                    if self.outbox.put(f"{chat['id']}:{message_id}", page_id, blocks):
+                        state["imported"] += 1
+            state["last_id"] = message_id
+
+        _save_checkpoint(checkpoint_path, state)
+        self.drainer.notify(page_id)
+        if progress is not None:
+            await progress(state["imported"], scanned, True)
+        logger.info("اكتمل استيراد %s رسالة من %s", state['imported'], path)
+        return state["imported"]
@@ -0,0 +1,183 @@
+# قياس أداء مسار الرسائل محلياً: تحديثات اصطناعية بمعدل ثابت عبر عدة توبيكات
+# تمر بـ handle_message والصندوق الصادر والمنظم حتى خادم Notion الوهمي
+#
+# الاستخدام:
+#   python benchmark.py --rate 200 --topics 20 --duration 10 --latency 0.15
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+
+from fakes import FakeBot, FakeNotionServer, UpdateGenerator
+from log_config import setup_logging
+
+_MARKER = re.compile(r"\[bench:(\d+)\]")
+
+
+def create_bot(base_url: str, data_dir: str, ack_mode: str = "silent", **settings):
+    """
+    بناء البوت موجهاً إلى خادم Notion الوهمي وبقواعد بيانات في data_dir
+    الإعدادات تُمرر مباشرة إلى create_application دون تعديل os.environ
+
+    Returns:
+        tuple: وحدة البوت (مكوناتها في bot.services) وتطبيق تيليجرام
+    """
+    import bot
+    environ = {
+        "NOTION_TOKEN": "secret_fake",
+        "NOTION_BASE_URL": base_url,
+        "OUTBOX_PATH": os.path.join(data_dir, "outbox.db"),
+        "DIGEST_PATH": os.path.join(data_dir, "digest.db"),
+        "BINDINGS_PATH": os.path.join(data_dir, "bindings.db"),
+        "BLOCK_INDEX_PATH": os.path.join(data_dir, "block_index.db"),
+        "ACK_MODE": ack_mode,
+        **settings,
+    }
+    application = bot.create_application(environ, bot_token="123456:fake")
+    return bot, application
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    النسبة المئوية بطريقة أقرب ترتيب، أو 0 لقائمة فارغة
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def _block_texts(block: dict):
+    body = block.get(block.get("type"), {})
+    for part in body.get("rich_text", []) + body.get("caption", []):
+        yield part.get("text", {}).get("content", "")
+    for child in body.get("children", []):
+        yield from _block_texts(child)
+
+
+async def run_benchmark(app, server: FakeNotionServer, telegram_bot, rate: float, topics: int,
+                        duration: float, drain_timeout: float = 60.0, media_ratio: float = 0.0) -> dict:
+    """
+    إرسال rate رسالة في الثانية لمدة duration عبر topics توبيك وقياس النتائج
+
+    Args:
+        app: وحدة البوت بعد تشغيل مكوناتها (app.services.start)
+        server (FakeNotionServer): خادم Notion الوهمي الذي يستقبل الكتابة
+        telegram_bot: البوت الوهمي الذي تُربط به الرسائل
+        drain_timeout (float): أقصى مدة انتظار لوصول كل الرسائل إلى Notion بعد انتهاء الإرسال
+
+    Returns:
+        dict: عدد الرسائل، الإنتاجية، زمن handle_message وزمن الوصول إلى Notion (p50/p99)، وعدد الطلبات لكل رسالة
+    """
+    generator = UpdateGenerator(topics, bot=telegram_bot, media_ratio=media_ratio)
+    for thread_id in generator.thread_ids:
+        page_id = server.add_page(f"توبيك {thread_id}")
+        app.services.bindings.bind(str(generator.chat_id), str(thread_id), page_id)
+
+    received = {}
+    delivered = {}
+    handled = []
+
+    def on_append(page_id, children, timestamp):
+        for block in children:
+            for text in _block_texts(block):
+                for match in _MARKER.finditer(text):
+                    delivered.setdefault(int(match.group(1)), timestamp)
+
+    server.on_append = on_append
+    requests_before = server.total_requests
+    throttled_before = server.throttled
+    total = int(rate * duration)
+
+    async def handle(number: int):
+        update = generator.update(text=f"رسالة قياس {number} [bench:{number}]")
+        started = time.monotonic()
+        received[number] = started
+        await app.handle_message(update, None)
+        handled.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    tasks = []
+    for number in range(total):
+        delay = started + number / rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.get_running_loop().create_task(handle(number)))
+    await asyncio.gather(*tasks)
+    sent = time.monotonic() - started
+
+    deadline = time.monotonic() + drain_timeout
+    while len(delivered) < total and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    server.on_append = None
+
+    lags = [delivered[number] - received[number] for number in delivered if number in received]
+    elapsed = (max(delivered.values()) - started) if delivered else sent
+    requests = server.total_requests - requests_before
+    return {
+        "messages": total,
+        "delivered": len(delivered),
+        "topics": topics,
+        "target_rate": rate,
+        "send_seconds": round(sent, 3),
+        "throughput": round(len(delivered) / elapsed, 2) if elapsed else 0.0,
+        "handle_p50_ms": round(percentile(handled, 0.50) * 1000, 2),
+        "handle_p99_ms": round(percentile(handled, 0.99) * 1000, 2),
+        "e2e_p50_ms": round(percentile(lags, 0.50) * 1000, 2),
+        "e2e_p99_ms": round(percentile(lags, 0.99) * 1000, 2),
+        "notion_requests": requests,
+        "requests_per_message": round(requests / total, 3) if total else 0.0,
+        "throttled": server.throttled - throttled_before,
+    }
+
+
+async def main(args):
+    server = FakeNotionServer(
+        latency=args.latency, jitter=args.jitter,
+        throttle_probability=args.throttle, rate_limit=args.rate_limit, seed=args.seed,
+    )
+    await server.start()
+    setup_logging(level="WARNING")
+    with tempfile.TemporaryDirectory() as data_dir:
+        settings = {"NOTION_RATE_LIMIT": str(args.notion_rate)} if args.notion_rate else {}
+        app, _ = create_bot(server.base_url, data_dir, **settings)
+        telegram_bot = FakeBot()
+        await app.services.start(telegram_bot)
+        try:
+            result = await run_benchmark(
+                app, server, telegram_bot, args.rate, args.topics, args.duration,
+                drain_timeout=args.drain_timeout, media_ratio=args.media_ratio,
+            )
+        finally:
+            await app.services.stop()
+            await server.stop()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        for key, value in result.items():
+            print(f"{key:>22}: {value}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء مسار الرسائل مع Notion وتيليجرام وهميين")
+    parser.add_argument("--rate", type=float, default=50, help="عدد الرسائل في الثانية")
+    parser.add_argument("--topics", type=int, default=10, help="عدد التوبيكات")
+    parser.add_argument("--duration", type=float, default=5, help="مدة الإرسال بالثواني")
+    parser.add_argument("--latency", type=float, default=0.1, help="زمن رد Notion بالثواني")
+    parser.add_argument("--jitter", type=float, default=0.05, help="تفاوت زمن الرد بالثواني")
+    parser.add_argument("--throttle", type=float, default=0.0, help="نسبة ردود 429 العشوائية")
+    parser.add_argument("--rate-limit", type=float, default=None, help="حد طلبات الخادم في الثانية")
+    parser.add_argument("--notion-rate", type=float, default=None, help="NOTION_RATE_LIMIT للبوت")
+    parser.add_argument("--media-ratio", type=float, default=0.0, help="نسبة رسائل الصور")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="أقصى انتظار لوصول الرسائل")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="طباعة النتيجة كـ JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,448 @@
+# مخزن الروابط بين التوبيكات وصفحات Notion
+# قاعدة SQLite (WAL) مفتاحها (chat_id, thread_id) مع نسخة في الذاكرة للبحث السريع
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# ملف التخزين القديم الذي كان مفتاحه معرف التوبيك فقط
+LEGACY_STORAGE_FILE = 'topic_pages.json'
+
+# معرف المحادثة للروابط المنقولة من الملف القديم، لأنه لم يكن يحفظ معرف المحادثة
+# المحادثة الخاصة تتملك رابطها لأن مفتاحها معرفها نفسه، أما التوبيكات فيُطلب من مشرفيها
+# إعادة ربطها (انظر legacy_page)، ويُحذف الرابط القديم عند أول إعادة ربط لنفس معرف التوبيك
+LEGACY_CHAT = "*"
+
+# نوع الهدف المرتبط بالتوبيك
+PAGE = "page"  # الرسائل تضاف ككتل إلى نهاية الصفحة
+DATABASE = "database"  # كل رسالة تُنشأ كصف في قاعدة البيانات
+
+# معرف مساحة العمل الافتراضية (NOTION_TOKEN) للروابط والمحادثات التي لم تُربط بمساحة عمل عبر /connect
+DEFAULT_WORKSPACE = ""
+
+
+class Shard(NamedTuple):
+    """
+    صفحة فرعية تحت الصفحة المرتبطة، مفتاحها يحدد الفترة أو رقم الجزء
+    """
+    key: str
+    page_id: str
+    blocks: int
+
+
+class BindingStore:
+    """
+    تخزين ربط كل توبيك بصفحة Notion مع كتابة آمنة عند الانهيار
+    """
+
+    def __init__(self, path: str = "bindings.db", legacy_path: str = LEGACY_STORAGE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bindings (
+                chat_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (chat_id, thread_id)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rollover (
+                chat_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                policy TEXT NOT NULL,
+                PRIMARY KEY (chat_id, thread_id)
+            );
+            CREATE TABLE IF NOT EXISTS digest (
+                chat_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                period TEXT NOT NULL,
+                PRIMARY KEY (chat_id, thread_id)
+            );
+            CREATE TABLE IF NOT EXISTS shards (
+                parent_page_id TEXT NOT NULL,
+                shard_key TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                blocks INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (parent_page_id, shard_key)
+            );
+            CREATE TABLE IF NOT EXISTS workspaces (
+                workspace TEXT PRIMARY KEY,
+                token TEXT NOT NULL,  -- غير مشفر، الحماية بصلاحيات الملف (انظر README)
+                name TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chat_workspaces (
+                chat_id TEXT PRIMARY KEY,
+                workspace TEXT NOT NULL
+            );
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(bindings)")}
+        if "target" not in columns:
+            self._db.execute(f"ALTER TABLE bindings ADD COLUMN target TEXT NOT NULL DEFAULT '{PAGE}'")
+        if "workspace" not in columns:
+            self._db.execute(f"ALTER TABLE bindings ADD COLUMN workspace TEXT NOT NULL DEFAULT '{DEFAULT_WORKSPACE}'")
+        if "live_from" not in columns:
+            # أول رسالة قد تُحفظ مباشرة بعد الربط، والاستيراد يتوقف عندها
+            self._db.execute("ALTER TABLE bindings ADD COLUMN live_from INTEGER")
+        self._migrate_legacy(legacy_path)
+
+        self.reload()
+
+    def changed(self) -> bool:
+        """
+        هل عدّلت عملية أخرى الروابط أو السياسات أو مساحات العمل منذ آخر reload؟
+        (data_version يتغير فقط مع تعديلات الاتصالات الأخرى، وقراءته لا تصل إلى الجداول)
+        """
+        with self._lock:
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        return version != self._data_version
+
+    def reload(self):
+        """
+        إعادة قراءة الروابط من القرص (عندما تعدلها عملية أخرى، مثل عمال الصندوق الصادر)
+        """
+        with self._lock:
+            self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            # نسخة في الذاكرة حتى يكون البحث من handle_message دون الوصول إلى القرص
+            self._bindings = {
+                (chat_id, thread_id): page_id
+                for chat_id, thread_id, page_id in self._db.execute(
+                    "SELECT chat_id, thread_id, page_id FROM bindings"
+                )
+            }
+            self._has_legacy = any(chat_id == LEGACY_CHAT for chat_id, _ in self._bindings)
+            # الروابط بقواعد البيانات فقط، فالصفحات هي الافتراضية
+            self._databases = set(
+                self._db.execute("SELECT chat_id, thread_id FROM bindings WHERE target = ?", (DATABASE,))
+            )
+            self._rollover = {
+                (chat_id, thread_id): policy
+                for chat_id, thread_id, policy in self._db.execute("SELECT chat_id, thread_id, policy FROM rollover")
+            }
+            self._digest = {
+                (chat_id, thread_id): period
+                for chat_id, thread_id, period in self._db.execute("SELECT chat_id, thread_id, period FROM digest")
+            }
+            # مساحات العمل: للروابط خارج المساحة الافتراضية فقط، ولكل صفحة حتى يُرسل الصندوق الصادر بتوكنها
+            # الصفحات لا تُزال عند إلغاء الربط حتى تصل رسائلها المنتظرة بنفس التوكن
+            self._workspaces = {}
+            self._page_workspaces = {}
+            for chat_id, thread_id, page_id, workspace in self._db.execute(
+                "SELECT chat_id, thread_id, page_id, workspace FROM bindings WHERE workspace != ?", (DEFAULT_WORKSPACE,)
+            ):
+                self._workspaces[(chat_id, thread_id)] = workspace
+                self._page_workspaces[page_id] = workspace
+            self._shard_parents = dict(self._db.execute("SELECT page_id, parent_page_id FROM shards"))
+            self._chat_workspaces = dict(self._db.execute("SELECT chat_id, workspace FROM chat_workspaces"))
+            self._tokens = {
+                workspace: token for workspace, token in self._db.execute("SELECT workspace, token FROM workspaces")
+            }
+
+    def _migrate_legacy(self, legacy_path: str):
+        """
+        نقل الروابط من topic_pages.json مرة واحدة فقط
+        """
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return
+
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            # لا نعلّم الملف كمنقول حتى نعيد المحاولة في التشغيل التالي
+            logger.error("خطأ في قراءة ملف التخزين القديم: %s", e)
+            return
+
+        now = time.time()
+        with self._lock:
+            # عمال الصندوق الصادر يفتحون نفس الملف معاً، فعملية واحدة فقط تنقل الروابط
+            self._db.execute("BEGIN IMMEDIATE")
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_migrated', ?)", (str(now),)
+            )
+            if cursor.rowcount == 0:
+                self._db.execute("ROLLBACK")
+                return
+            self._db.executemany(
+                "INSERT OR IGNORE INTO bindings (chat_id, thread_id, page_id, updated_at) VALUES (?, ?, ?, ?)",
+                [(LEGACY_CHAT, str(thread_id), page_id, now) for thread_id, page_id in legacy.items()]
+            )
+            self._db.execute("COMMIT")
+        logger.info("تم نقل %s ربط من %s", len(legacy), legacy_path)
+
+    def get(self, chat_id: str, thread_id: str):
+        """
+        الحصول على معرف الصفحة المرتبطة بالتوبيك، أو None
+        """
+        page_id = self._bindings.get((chat_id, thread_id))
+        # مفتاح المحادثة الخاصة في الملف القديم هو معرفها نفسه فيُربط مباشرة، أما معرفات التوبيكات
+        # فتتكرر بين المجموعات، فلا تُربط بأول مجموعة تستخدمها ويعيد المشرف ربطها (انظر legacy_page)
+        if page_id is None and self._has_legacy and thread_id == chat_id:
+            page_id = self._claim_legacy(chat_id, thread_id)
+        return page_id
+
+    def legacy_page(self, thread_id: str) -> Optional[str]:
+        """
+        صفحة رابط توبيك منقول من الملف القديم دون معرف مجموعته، أو None
+        """
+        return self._bindings.get((LEGACY_CHAT, thread_id))
+
+    def _claim_legacy(self, chat_id: str, thread_id: str):
+        """
+        ربط رابط محادثة خاصة منقول من الملف القديم بالمحادثة نفسها
+        """
+        page_id = self._bindings.get((LEGACY_CHAT, thread_id))
+        if page_id is None:
+            return None
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT OR REPLACE INTO bindings (chat_id, thread_id, page_id, updated_at) VALUES (?, ?, ?, ?)",
+                (chat_id, thread_id, page_id, time.time())
+            )
+            self._db.execute(
+                "DELETE FROM bindings WHERE chat_id = ? AND thread_id = ?", (LEGACY_CHAT, thread_id)
+            )
+            self._db.execute("COMMIT")
+        self._bindings[(chat_id, thread_id)] = page_id
+        del self._bindings[(LEGACY_CHAT, thread_id)]
+        self._has_legacy = any(key[0] == LEGACY_CHAT for key in self._bindings)
+        logger.info("تم ربط المحادثة القديمة %s", chat_id)
+        return page_id
+
+    def bind(self, chat_id: str, thread_id: str, page_id: str, target: str = PAGE,
+             workspace: str = DEFAULT_WORKSPACE, live_from: int = None):
+        """
+        ربط التوبيك بصفحة أو قاعدة بيانات في مساحة عمل (يستبدل الربط السابق إن وجد)
+
+        Args:
+            live_from (int): معرف رسالة الربط، فكل رسالة بعدها تُحفظ مباشرة ولا يستوردها /backfill
+                (إعادة الربط بنفس الصفحة تُبقي المعرف الأول)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT page_id, live_from FROM bindings WHERE chat_id = ? AND thread_id = ?", (chat_id, thread_id)
+            ).fetchone()
+            if row is not None and row[0] == page_id and row[1] is not None:
+                live_from = row[1] if live_from is None else min(row[1], live_from)
+            # التوبيك أُعيد ربطه، فلا يبقى رابطه القديم ليُطلب من مجموعات أخرى بنفس معرف التوبيك إعادة الربط
+            legacy = chat_id != LEGACY_CHAT and (LEGACY_CHAT, thread_id) in self._bindings
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT OR REPLACE INTO bindings (chat_id, thread_id, page_id, target, workspace, live_from, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, thread_id, page_id, target, workspace, live_from, time.time())
+            )
+            if legacy:
+                self._db.execute(
+                    "DELETE FROM bindings WHERE chat_id = ? AND thread_id = ?", (LEGACY_CHAT, thread_id)
+                )
+            self._db.execute("COMMIT")
+        self._bindings[(chat_id, thread_id)] = page_id
+        if legacy:
+            del self._bindings[(LEGACY_CHAT, thread_id)]
+            self._has_legacy = any(key[0] == LEGACY_CHAT for key in self._bindings)
+            logger.info("تم حذف الرابط القديم للتوبيك %s بعد إعادة ربطه", thread_id)
+        if target == DATABASE:
+            self._databases.add((chat_id, thread_id))
+        else:
+            self._databases.discard((chat_id, thread_id))
+        if workspace == DEFAULT_WORKSPACE:
+            self._workspaces.pop((chat_id, thread_id), None)
+            self._page_workspaces.pop(page_id, None)
+        else:
+            self._workspaces[(chat_id, thread_id)] = workspace
+            self._page_workspaces[page_id] = workspace
+
+    def live_from(self, chat_id: str, thread_id: str) -> Optional[int]:
+        """
+        معرف الرسالة التي بدأ منها الحفظ المباشر للتوبيك، أو None إذا لم يُسجل (روابط قديمة)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT live_from FROM bindings WHERE chat_id = ? AND thread_id = ?", (chat_id, thread_id)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def get_target(self, chat_id: str, thread_id: str) -> str:
+        """
+        نوع الهدف المرتبط بالتوبيك: PAGE أو DATABASE
+        """
+        return DATABASE if (chat_id, thread_id) in self._databases else PAGE
+
+    def unbind(self, chat_id: str, thread_id: str):
+        """
+        إزالة ربط التوبيك
+        """
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM bindings WHERE chat_id = ? AND thread_id = ?", (chat_id, thread_id)
+            )
+        self._bindings.pop((chat_id, thread_id), None)
+        self._databases.discard((chat_id, thread_id))
+        self._workspaces.pop((chat_id, thread_id), None)
+
+    def get_workspace(self, chat_id: str, thread_id: str) -> str:
+        """
+        مساحة العمل التي ينتمي إليها هدف التوبيك
+        """
+        return self._workspaces.get((chat_id, thread_id), DEFAULT_WORKSPACE)
+
+    def page_workspace(self, page_id: str) -> str:
+        """
+        مساحة العمل التي تنتمي إليها صفحة مرتبطة أو صفحة فرعية منها
+        """
+        page_id = self._shard_parents.get(page_id, page_id)
+        return self._page_workspaces.get(page_id, DEFAULT_WORKSPACE)
+
+    def set_chat_workspace(self, chat_id: str, workspace: str, token: str = None, name: str = ""):
+        """
+        ربط المحادثة بمساحة عمل (وحفظ توكنها)، أو إعادتها إلى المساحة الافتراضية بـ DEFAULT_WORKSPACE
+        الروابط الحالية تبقى في مساحة عملها، والروابط الجديدة تُنشأ في المساحة المحددة
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            if token is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO workspaces (workspace, token, name, updated_at) VALUES (?, ?, ?, ?)",
+                    (workspace, token, name, time.time())
+                )
+            if workspace == DEFAULT_WORKSPACE:
+                self._db.execute("DELETE FROM chat_workspaces WHERE chat_id = ?", (chat_id,))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO chat_workspaces (chat_id, workspace) VALUES (?, ?)", (chat_id, workspace)
+                )
+            self._db.execute("COMMIT")
+        if token is not None:
+            self._tokens[workspace] = token
+        if workspace == DEFAULT_WORKSPACE:
+            self._chat_workspaces.pop(chat_id, None)
+        else:
+            self._chat_workspaces[chat_id] = workspace
+
+    def get_chat_workspace(self, chat_id: str) -> str:
+        """
+        مساحة العمل التي تُنشأ فيها روابط المحادثة الجديدة
+        """
+        return self._chat_workspaces.get(chat_id, DEFAULT_WORKSPACE)
+
+    def workspace_token(self, workspace: str) -> Optional[str]:
+        """
+        توكن مساحة عمل مسجلة عبر /connect، أو None
+        """
+        return self._tokens.get(workspace)
+
+    def get_rollover(self, chat_id: str, thread_id: str) -> Optional[str]:
+        """
+        سياسة تقسيم الصفحة المرتبطة بالتوبيك، أو None
+        """
+        return self._rollover.get((chat_id, thread_id))
+
+    def set_rollover(self, chat_id: str, thread_id: str, policy: Optional[str]):
+        """
+        تحديد سياسة التقسيم للتوبيك، أو إلغاؤها بـ None
+        """
+        with self._lock:
+            if policy is None:
+                self._db.execute("DELETE FROM rollover WHERE chat_id = ? AND thread_id = ?", (chat_id, thread_id))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rollover (chat_id, thread_id, policy) VALUES (?, ?, ?)",
+                    (chat_id, thread_id, policy)
+                )
+        if policy is None:
+            self._rollover.pop((chat_id, thread_id), None)
+        else:
+            self._rollover[(chat_id, thread_id)] = policy
+
+    def get_digest(self, chat_id: str, thread_id: str) -> Optional[str]:
+        """
+        فترة ملخص التوبيك (hourly أو daily)، أو None إذا كانت رسائله تُكتب فوراً
+        """
+        return self._digest.get((chat_id, thread_id))
+
+    def set_digest(self, chat_id: str, thread_id: str, period: Optional[str]):
+        """
+        تفعيل وضع الملخص للتوبيك، أو إلغاؤه بـ None
+        """
+        with self._lock:
+            if period is None:
+                self._db.execute("DELETE FROM digest WHERE chat_id = ? AND thread_id = ?", (chat_id, thread_id))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO digest (chat_id, thread_id, period) VALUES (?, ?, ?)",
+                    (chat_id, thread_id, period)
+                )
+        if period is None:
+            self._digest.pop((chat_id, thread_id), None)
+        else:
+            self._digest[(chat_id, thread_id)] = period
+
+    def get_shard(self, parent_page_id: str, key: str) -> Optional[Shard]:
+        """
+        الصفحة الفرعية بمفتاح معين، أو None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT shard_key, page_id, blocks FROM shards WHERE parent_page_id = ? AND shard_key = ?",
+                (parent_page_id, key)
+            ).fetchone()
+        return Shard(*row) if row else None
+
+    def latest_shard(self, parent_page_id: str, prefix: str) -> Optional[Shard]:
+        """
+        أحدث صفحة فرعية لنوع السياسة (المفاتيح مرتبة زمنياً كنصوص)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT shard_key, page_id, blocks FROM shards WHERE parent_page_id = ? AND shard_key LIKE ? "
+                "ORDER BY shard_key DESC LIMIT 1",
+                (parent_page_id, f"{prefix}%")
+            ).fetchone()
+        return Shard(*row) if row else None
+
+    def save_shard(self, parent_page_id: str, shard: Shard):
+        """
+        حفظ صفحة فرعية أو تحديث عدد كتلها
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO shards (parent_page_id, shard_key, page_id, blocks, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (parent_page_id, shard_key) DO UPDATE SET page_id = excluded.page_id, blocks = excluded.blocks",
+                (parent_page_id, shard.key, shard.page_id, shard.blocks, time.time())
+            )
+        self._shard_parents[shard.page_id] = parent_page_id
+
+    def shard_pages(self):
+        """
+        معرفات صفحات التقسيم التي أنشأها البوت (لا تظهر في قائمة /start)
+        عمال الصندوق الصادر ينشئون أغلبها، فنعيد القراءة إذا عدلت عملية أخرى القاعدة
+        """
+        if self.changed():
+            self.reload()
+        return self._shard_parents.keys()
+
+    def __len__(self) -> int:
+        return len(self._bindings)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,92 @@
+# فهرس كتل Notion لكل رسالة محفوظة
+# يربط مفتاح الرسالة (chat_id:message_id) بمعرفات الكتل التي أنشأها Notion حتى يمكن تعديلها أو حذفها لاحقاً
+# الجدول على القرص يتسع لملايين الرسائل، وأمامه ذاكرة مؤقتة LRU محدودة الحجم
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class IndexedMessage(NamedTuple):
+    """
+    كتل رسالة في Notion:
+    content قائمة [block_id, type] لكتل المحتوى بالترتيب، وpadding معرفات الأسطر الفارغة المحيطة بها
+    """
+    page_id: str
+    content: list
+    padding: list
+
+
+class BlockIndex:
+    """
+    فهرس (مفتاح الرسالة -> كتل Notion) على SQLite مع ذاكرة مؤقتة للرسائل الحديثة
+    """
+
+    def __init__(self, path: str = "block_index.db", cache_size: int = 10000):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS message_blocks (
+                message_key TEXT PRIMARY KEY,
+                page_id TEXT NOT NULL,
+                blocks TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+
+    def get(self, message_key: str) -> Optional[IndexedMessage]:
+        """
+        كتل الرسالة، أو None إذا لم تكن مفهرسة
+        """
+        with self._lock:
+            entry = self._cache.get(message_key)
+            if entry is not None:
+                self._cache.move_to_end(message_key)
+                return entry
+            row = self._db.execute(
+                "SELECT page_id, blocks FROM message_blocks WHERE message_key = ?", (message_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            blocks = json.loads(row[1])
+            entry = IndexedMessage(row[0], blocks["content"], blocks["padding"])
+            self._remember(message_key, entry)
+            return entry
+
+    def put(self, message_key: str, entry: IndexedMessage):
+        """
+        حفظ كتل الرسالة أو استبدالها بعد التعديل
+        """
+        blocks = json.dumps({"content": entry.content, "padding": entry.padding})
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO message_blocks (message_key, page_id, blocks, updated_at) VALUES (?, ?, ?, ?)",
+                (message_key, entry.page_id, blocks, time.time())
+            )
+            self._remember(message_key, entry)
+
+    def remove(self, message_key: str):
+        """
+        حذف الرسالة من الفهرس بعد حذف كتلها من Notion
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM message_blocks WHERE message_key = ?", (message_key,))
+            self._cache.pop(message_key, None)
+
+    def _remember(self, message_key: str, entry: IndexedMessage):
+        self._cache[message_key] = entry
+        self._cache.move_to_end(message_key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def close(self):
+        self._db.close()
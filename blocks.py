@@ -0,0 +1,264 @@
+# بناء كتل Notion من رسائل تيليجرام
+# كل أنواع الوسائط معرفة في جدول واحد، وإضافة نوع جديد تتطلب سطراً واحداً فيه
+from typing import Callable, NamedTuple, Optional
+
+from rich_text import NOTION_RICH_TEXT_LIMIT, inline_rich_text, text_to_blocks
+
+
+def text_item(content: str) -> dict:
+    """
+    جزء نص عادي داخل rich_text
+    """
+    return {"type": "text", "text": {"content": content}}
+
+
+def link_item(url: str) -> dict:
+    """
+    جزء نص يحمل رابطاً داخل rich_text
+    """
+    return {"type": "text", "text": {"content": url, "link": {"url": url}}}
+
+
+# سطر فارغ يضاف قبل المحتوى وبعده (ثابت مشترك، لا يجب تعديله)
+EMPTY_PARAGRAPH = {
+    "object": "block",
+    "type": "paragraph",
+    "paragraph": {
+        "rich_text": []
+    }
+}
+
+
+class MediaBlockSpec(NamedTuple):
+    """
+    وصف نوع وسائط: اسم الخاصية في رسالة تيليجرام، والتسمية المعروضة،
+    ودالة اختيارية تضيف بيانات وصفية قبل التسمية،
+    ونوع كتلة Notion الأصلية عند رفع الملف نفسه (None إذا لم يكن الرفع مدعوماً)
+    """
+    attribute: str
+    label: str
+    details: Optional[Callable] = None
+    notion_type: Optional[str] = None
+
+
+def _audio_details(audio) -> str:
+    title = audio.title if audio.title else "بدون عنوان"
+    performer = audio.performer if audio.performer else "غير معروف"
+    return f"العنوان: {title}\nالمؤدي: {performer}\n"
+
+
+def _document_details(document) -> str:
+    file_name = document.file_name if document.file_name else "بدون اسم"
+    return f"اسم الملف: {file_name}\n"
+
+
+def _sticker_details(sticker) -> str:
+    return f"{sticker.emoji}\n" if sticker.emoji else ""
+
+
+def _poll_details(poll) -> str:
+    options = "\n".join(f"- {option.text}" for option in poll.options)
+    return f"{poll.question}\n{options}\n"
+
+
+def _location_details(location) -> str:
+    return f"الموقع: {location.latitude}, {location.longitude}\n"
+
+
+def _contact_details(contact) -> str:
+    name = " ".join(part for part in (contact.first_name, contact.last_name) if part)
+    return f"الاسم: {name}\nالهاتف: {contact.phone_number}\n"
+
+
+# جدول أنواع الوسائط حسب الأولوية
+# ملاحظة: رسائل animation تحتوي أيضاً على document، لذلك يجب أن تسبقه
+MEDIA_BLOCKS = (
+    MediaBlockSpec("photo", "صورة", notion_type="image"),
+    MediaBlockSpec("video", "فيديو", notion_type="video"),
+    MediaBlockSpec("animation", "صورة متحركة", notion_type="video"),
+    MediaBlockSpec("video_note", "رسالة فيديو", notion_type="video"),
+    MediaBlockSpec("voice", "رسالة صوتية", notion_type="audio"),
+    MediaBlockSpec("audio", "ملف صوتي", _audio_details, notion_type="audio"),
+    MediaBlockSpec("document", "مستند", _document_details, notion_type="file"),
+    MediaBlockSpec("sticker", "ملصق", _sticker_details),
+    MediaBlockSpec("poll", "استطلاع", _poll_details),
+    MediaBlockSpec("location", "موقع", _location_details),
+    MediaBlockSpec("contact", "جهة اتصال", _contact_details),
+)
+
+_NEWLINE = text_item("\n")
+
+# نوع الكتلة الداخلي لمراجع ملفات تيليجرام التي لم تُرفع بعد (لا يُرسل إلى Notion)
+FILE_REFERENCE = "telegram_file"
+
+# أجزاء التسميات الثابتة تُنشأ مرة واحدة عند تحميل الوحدة
+_LABEL_FRAGMENTS = {spec.attribute: text_item(f"{spec.label}: ") for spec in MEDIA_BLOCKS}
+
+
+def build_message_link(message) -> str:
+    """
+    إنشاء رابط الرسالة في تيليجرام
+    """
+    chat_id_str = str(message.chat.id)[4:] if str(message.chat.id).startswith('-100') else str(message.chat.id)
+
+    if message.is_topic_message:
+        return f"https://t.me/c/{chat_id_str}/{message.message_thread_id}/{message.message_id}"
+    return f"https://t.me/c/{chat_id_str}/{message.message_id}"
+
+
+def create_media_block(spec: MediaBlockSpec, media, caption: Optional[str], message_link: str,
+                       caption_entities=None) -> dict:
+    """
+    إنشاء كتلة وسائط: الوصف بتنسيقاته ثم البيانات الوصفية ثم التسمية والرابط
+    """
+    rich_text = []
+    if caption:
+        # نترك مكاناً لأجزاء البيانات الوصفية والتسمية والرابط ضمن حد Notion
+        rich_text.extend(inline_rich_text(caption, caption_entities, limit=NOTION_RICH_TEXT_LIMIT - 4))
+        rich_text.append(_NEWLINE)
+    if spec.details:
+        details = spec.details(media)
+        if details:
+            rich_text.append(text_item(details))
+    rich_text.append(_LABEL_FRAGMENTS.get(spec.attribute) or text_item(f"{spec.label}: "))
+    rich_text.append(link_item(message_link))
+    return {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": rich_text
+        }
+    }
+
+
+def find_media(message):
+    """
+    البحث عن أول نوع وسائط موجود في الرسالة
+
+    Returns:
+        tuple: (MediaBlockSpec, كائن الوسائط) أو (None, None)
+    """
+    for spec in MEDIA_BLOCKS:
+        media = getattr(message, spec.attribute, None)
+        if media:
+            return spec, media
+    return None, None
+
+
+def build_content_blocks(message, message_link: str):
+    """
+    إنشاء كتل المحتوى المناسبة لنوع الرسالة
+
+    Returns:
+        tuple: (نوع الرسالة، قائمة كتل Notion) أو (None, None) إذا كان النوع غير مدعوم
+    """
+    if message.text:
+        blocks = text_to_blocks(message.text, message.entities)
+        if not blocks:
+            # نص من مسافات وأسطر فارغة فقط
+            blocks = [{
+                "object": "block",
+                "type": "paragraph",
+                "paragraph": {
+                    "rich_text": [text_item(message.text)]
+                }
+            }]
+        return "text", blocks
+
+    spec, media = find_media(message)
+    if spec is None:
+        return None, None
+    return spec.attribute, [
+        create_media_block(spec, media, message.caption, message_link, message.caption_entities)
+    ]
+
+
+def create_file_reference(message, content: dict) -> dict:
+    """
+    استبدال كتلة الوسائط بمرجع للملف في تيليجرام حتى يُرفع إلى Notion عند الإرسال
+    الكتلة الأصلية تبقى داخل المرجع وتُستخدم كوصف للملف أو كبديل إذا فشل الرفع
+
+    Returns:
+        dict: مرجع الملف، أو الكتلة نفسها إذا كان نوع الوسائط لا يدعم الرفع
+    """
+    if message.text:
+        return content
+    spec, media = find_media(message)
+    if spec is None or spec.notion_type is None:
+        return content
+
+    # الصور تصل بعدة أحجام، نأخذ الأكبر
+    if isinstance(media, (tuple, list)):
+        media = media[-1]
+
+    return {
+        "type": FILE_REFERENCE,
+        FILE_REFERENCE: {
+            "file_id": media.file_id,
+            "file_unique_id": media.file_unique_id,
+            "file_size": getattr(media, "file_size", None),
+            "file_name": getattr(media, "file_name", None),
+            "mime_type": getattr(media, "mime_type", None),
+            "notion_type": spec.notion_type,
+        },
+        "fallback": content,
+    }
+
+
+def create_file_block(reference: dict, file_upload_id: str) -> dict:
+    """
+    إنشاء كتلة Notion أصلية (image/video/audio/file) لملف تم رفعه
+    """
+    notion_type = reference[FILE_REFERENCE]["notion_type"]
+    return {
+        "object": "block",
+        "type": notion_type,
+        notion_type: {
+            "type": "file_upload",
+            "file_upload": {"id": file_upload_id},
+            "caption": reference["fallback"]["paragraph"]["rich_text"],
+        }
+    }
+
+
+def build_album_blocks(messages: list, prepare: Optional[Callable] = None) -> list:
+    """
+    إنشاء كتل ألبوم كامل: الوصف أولاً ثم كتلة toggle تضم وسائط الألبوم بالترتيب
+
+    Args:
+        messages (list): أجزاء الألبوم مرتبة حسب message_id
+        prepare: دالة اختيارية (message, block) تطبق على كتلة كل جزء، مثل create_file_reference
+    """
+    # تيليجرام يضع وصف الألبوم عادة في أول جزء، وباقي الأوصاف تبقى مع وسائطها
+    captioned = next((message for message in messages if message.caption), None)
+    content = []
+    if captioned:
+        content.extend(text_to_blocks(captioned.caption, captioned.caption_entities))
+
+    children = []
+    for message in messages:
+        spec, media = find_media(message)
+        if spec is None:
+            continue
+        caption = message.caption if message is not captioned else None
+        block = create_media_block(
+            spec, media, caption, build_message_link(message), message.caption_entities if caption else None
+        )
+        children.append(prepare(message, block) if prepare else block)
+
+    content.append({
+        "object": "block",
+        "type": "toggle",
+        "toggle": {
+            "rich_text": [text_item(f"ألبوم ({len(children)}): "), link_item(build_message_link(messages[0]))],
+            "children": children,
+        }
+    })
+    return content
+
+
+def build_message_blocks(content: list) -> list:
+    """
+    إحاطة كتل المحتوى بسطر فارغ قبلها وبعدها
+    """
+    return [EMPTY_PARAGRAPH, *content, EMPTY_PARAGRAPH]
@@ -1,83 +1,102 @@
 # استيراد المكتبات اللازمة
+# الاستيراد لا يقرأ الإعدادات ولا يتصل بأي خدمة: المكونات تُبنى في create_application
 import os  # للتعامل مع متغيرات البيئة ونظام التشغيل
 import logging  # لتسجيل الأحداث والأخطاء
-import sys  # للتعامل مع النظام
 from dotenv import load_dotenv  # لتحميل المتغيرات البيئية من ملف .env
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup  # مكونات واجهة تيليجرام
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes  # معالجات تيليجرام
-from notion_client import Client  # مكتبة للتعامل مع Notion API
-import json  # للتعامل مع بيانات JSON
-import io
-
-# إعداد السجلات
-import sys
-import io
-
-# إعداد الترميز للمخرجات
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    stream=sys.stdout
-)
-logger = logging.getLogger(__name__)
-
-# تعيين مستوى التسجيل للمكتبات الأخرى
-logging.getLogger('httpx').setLevel(logging.INFO)
-logging.getLogger('telegram').setLevel(logging.INFO)
-
-# تحميل المتغيرات البيئية
-load_dotenv()
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChatMemberHandler, TypeHandler, filters, ContextTypes  # معالجات تيليجرام
+import asyncio  # لتشغيل الاستيراد في الخلفية
+from notion_client.errors import APIResponseError  # أخطاء Notion API
+from services import BotServices  # بناء مكونات البوت من الإعدادات
+from workers import start_workers, stop_workers  # عمال إرسال الصندوق الصادر في عمليات منفصلة
+from binding_store import DATABASE  # نوع هدف التوبيك
+from blocks import build_album_blocks, build_content_blocks, build_message_blocks, build_message_link, create_file_reference  # بناء كتل Notion من الرسائل
+from message_sync import ARCHIVE, EDIT  # مزامنة تعديل الرسائل وحذفها
+from rollover import parse_policy  # تقسيم الصفحة المرتبطة إلى صفحات فرعية
+from database_rows import ROW, build_row  # حفظ الرسائل كصفوف في قاعدة بيانات
+from digest import album_summary, message_summary, parse_period  # ملخصات التوبيكات كثيرة الرسائل
+from callback_data import BIND, NAV, find_page  # بيانات الأزرار المختصرة والموقعة
+import metrics  # مقاييس التشغيل بصيغة Prometheus
+from log_config import redact, set_correlation_id, setup_logging  # إعداد السجلات
 
-logger.info("جاري تحميل المتغيرات البيئية...")
-
-# الحصول على التوكن من المتغيرات البيئية
-notion_token = os.getenv("NOTION_TOKEN")
-if not notion_token:
-    logger.error("لم يتم العثور على NOTION_TOKEN في ملف .env")
-    sys.exit(1)
-    
-logger.info(f"Notion token: {notion_token[:4]}...{notion_token[-4:]}")
+logger = logging.getLogger(__name__)
 
-# إنشاء عميل Notion
-try:
-    notion = Client(auth=notion_token)
-    # اختبار الاتصال
-    notion.users.me()
-    logger.info("تم الاتصال بـ Notion بنجاح")
-except Exception as e:
-    logger.error(f"فشل الاتصال بـ Notion: {str(e)}")
-    sys.exit(1)
+# مكونات البوت الحالية (BotServices)، تُنشأ في create_application
+services = None
 
-# قاموس لتخزين الصفحات المرتبطة بكل محادثة/توبيك
-STORAGE_FILE = 'topic_pages.json'
+# عدد الصفحات المعروضة في كل شاشة من قائمة /start
+PAGES_PER_SCREEN = 10
 
-def load_topic_pages() -> dict:
+def message_thread(message) -> str:
     """
-    تحميل الروابط المخزنة بين التوبيكات والصفحات
+    معرف التوبيك للرسالة، أو معرف المحادثة خارج التوبيكات
     """
-    if os.path.exists(STORAGE_FILE):
-        try:
-            with open(STORAGE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"خطأ في قراءة ملف التخزين: {str(e)}")
-    return {}
+    return str(message.message_thread_id) if message.is_topic_message else str(message.chat.id)
 
-def save_topic_pages(topic_pages: dict):
+async def save_album(key: tuple, items: list):
     """
-    حفظ الروابط بين التوبيكات والصفحات
+    حفظ ألبوم كامل كإدخال واحد في الصندوق الصادر والرد عليه مرة واحدة
     """
+    page_id, media_group_id = key
+    messages = sorted(items, key=lambda message: message.message_id)
+    first = messages[0]
+    chat_id = str(first.chat.id)
+    logger.info("حفظ ألبوم %s من %s أجزاء في الصفحة %s", media_group_id, len(messages), page_id)
     try:
-        with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(topic_pages, f, ensure_ascii=False, indent=2)
+        content = build_album_blocks(messages, prepare=create_file_reference if services.upload_media else None)
+        # المفتاح يحمل أول رسالة في الألبوم، فلا يتكرر عند إعادة الإرسال
+        # ولا تضيع الأجزاء المتأخرة إذا حُفظ الألبوم على دفعتين
+        key = f"{chat_id}:album:{media_group_id}:{first.message_id}"
+        if services.bindings.get_target(chat_id, message_thread(first)) == DATABASE:
+            captioned = next((message for message in messages if message.caption), first)
+            row = build_row(captioned, "album", content, build_message_link(first))
+            is_new = services.outbox.put(key, page_id, row, kind=ROW)
+        elif services.bindings.get_digest(chat_id, message_thread(first)) is not None:
+            # في وضع الملخص يظهر الألبوم كسطر واحد برابط أول رسالة فيه
+            is_new = services.digest.add(
+                chat_id, message_thread(first), page_id, first, build_message_link(first), album_summary(messages)
+            )
+            page_id = None
+        else:
+            blocks = services.rollover.defer(chat_id, message_thread(first), first.date, build_message_blocks(content))
+            is_new = services.outbox.put(key, page_id, blocks)
+        if is_new:
+            if page_id is not None:
+                services.drainer.notify(page_id)
+            metrics.TOPIC_MESSAGES.inc(len(messages), chat_id=chat_id, thread_id=message_thread(first))
+        metrics.MESSAGES.inc(type="album", outcome="saved" if is_new else "duplicate")
+        services.acknowledger.ack(first, count=len(messages), text=f"تم حفظ الألبوم ({len(messages)} عناصر) في Notion بنجاح!")
     except Exception as e:
-        logger.error(f"خطأ في حفظ ملف التخزين: {str(e)}")
+        metrics.MESSAGES.inc(type="album", outcome="error")
+        logger.error("خطأ في إضافة الألبوم إلى Notion: %s", e)
+        await first.reply_text("حدث خطأ أثناء حفظ الألبوم في Notion. الرجاء المحاولة مرة أخرى.")
 
-# تحميل الروابط المخزنة عند بدء البوت
-topic_pages = load_topic_pages()
+def build_pages_keyboard(pages: list, page_index, chat_id: str, thread_id: str, offset: int) -> InlineKeyboardMarkup:
+    """
+    إنشاء أزرار صفحة واحدة من قائمة الصفحات مع أزرار التنقل التالي/السابق
+    كل زر يحمل موضع الصفحة في الفهرس بدل معرفها الكامل، موقعاً بـ services.callbacks
+    """
+    keyboard = []
+    for page in pages[offset:offset + PAGES_PER_SCREEN]:
+        # في حالة المجموعة، نستخدم معرف التوبيك
+        # في حالة المحادثة المباشرة، نستخدم معرف المحادثة
+        callback_data = services.callbacks.bind(chat_id, thread_id, page_index.position(page["id"]) or 0, page["id"])
+        title = f"🗃 {page['title']}" if page.get("object") == DATABASE else page["title"]
+        keyboard.append([InlineKeyboardButton(title, callback_data=callback_data)])
+    
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            "◀ السابق", callback_data=services.callbacks.nav(chat_id, thread_id, max(0, offset - PAGES_PER_SCREEN))
+        ))
+    if offset + PAGES_PER_SCREEN < len(pages):
+        navigation.append(InlineKeyboardButton(
+            "التالي ▶", callback_data=services.callbacks.nav(chat_id, thread_id, offset + PAGES_PER_SCREEN)
+        ))
+    if navigation:
+        keyboard.append(navigation)
+    
+    return InlineKeyboardMarkup(keyboard)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -88,16 +107,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not message:
             return
             
-        logger.info(f"تم استلام أمر start من المستخدم {message.from_user.id}")
+        logger.info("تم استلام أمر start من المستخدم %s", message.from_user.id)
         
         # التحقق من نوع المحادثة
         chat_type = message.chat.type
         chat_id = str(message.chat.id)  # تحويل معرف المحادثة إلى نص
         thread_id = str(message.message_thread_id) if message.is_topic_message else chat_id  # تحويل معرف التوبيك إلى نص
         
-        logger.info(f"نوع المحادثة: {chat_type}")
-        logger.info(f"معرف المحادثة: {chat_id}")
-        logger.info(f"معرف التوبيك: {thread_id}")
+        logger.info("نوع المحادثة: %s", chat_type)
+        logger.info("معرف المحادثة: %s", chat_id)
+        logger.info("معرف التوبيك: %s", thread_id)
         
         # في حالة المجموعة
         if chat_type in ['group', 'supergroup']:
@@ -113,63 +132,25 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
             # التحقق من صلاحيات المستخدم في المجموعة
             user = message.from_user
-            chat_member = await context.bot.get_chat_member(message.chat.id, user.id)
-            if not chat_member.status in ['creator', 'administrator']:
-                logger.info(f"المستخدم {user.id} ليس مشرفاً")
+            if not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+                logger.info("المستخدم %s ليس مشرفاً", user.id)
                 await message.reply_text("عذراً، هذا الأمر متاح فقط للمشرفين في المجموعات.")
                 return
         
-        logger.info("جاري البحث عن صفحات Notion...")
+        logger.info("جاري تحميل فهرس صفحات Notion...")
         try:
-            # البحث عن الصفحات في Notion
-            pages = notion.search(
-                **{
-                    "filter": {
-                        "value": "page",
-                        "property": "object"
-                    }
-                }
-            ).get("results", [])
+            # نص البحث الاختياري بعد الأمر، مثل: /start مذكرات
+            search_query = " ".join(context.args) if context.args else ""
+            # الصفحات من مساحة عمل المحادثة (المحددة بـ /connect أو الافتراضية)
+            page_index = services.for_chat(chat_id).page_index
+            await page_index.get()
+            pages = page_index.filter(search_query)
             
             if not pages:
                 logger.info("لم يتم العثور على صفحات")
-                await message.reply_text("لم يتم العثور على صفحات في حساب Notion الخاص بك.")
-                return
-                
-            # إنشاء أزرار للصفحات
-            keyboard = []
-            for page in pages[:10]:  # نأخذ أول 10 صفحات فقط
-                try:
-                    # الحصول على عنوان الصفحة
-                    page_id = page["id"]
-                    page_title = None
-                    
-                    # محاولة الحصول على العنوان من خصائص الصفحة
-                    if "properties" in page:
-                        title_property = page["properties"].get("title", {})
-                        if title_property and "title" in title_property:
-                            title_items = title_property["title"]
-                            if title_items:
-                                page_title = title_items[0].get("plain_text", "")
-                    
-                    # إذا لم نجد العنوان، نستخدم عنواناً افتراضياً
-                    if not page_title:
-                        page_title = "صفحة بدون عنوان"
-                    
-                    logger.info(f"تمت إضافة صفحة: {page_title} (ID: {page_id})")
-                    
-                    # في حالة المجموعة، نستخدم معرف التوبيك
-                    # في حالة المحادثة المباشرة، نستخدم معرف المحادثة
-                    callback_data = f"page_{thread_id}_{page_id}"
-                    
-                    keyboard.append([InlineKeyboardButton(page_title, callback_data=callback_data)])
-                    
-                except Exception as e:
-                    logger.error(f"خطأ في معالجة الصفحة {page.get('id', 'unknown')}: {str(e)}")
-                    continue
-                
-            if not keyboard:
-                logger.warning("لم يتم العثور على صفحات صالحة")
+                if search_query:
+                    await message.reply_text("لم يتم العثور على صفحات تطابق البحث.")
+                    return
                 await message.reply_text(
                     "لم يتم العثور على صفحات يمكن استخدامها.\n"
                     "تأكد من:\n"
@@ -177,20 +158,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "2. منح الصلاحيات المناسبة للـ integration"
                 )
                 return
-                
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            # حفظ نص البحث لاستخدامه عند التنقل بين صفحات القائمة
+            context.chat_data.setdefault("page_queries", {})[thread_id] = search_query
+            
+            reply_markup = build_pages_keyboard(pages, page_index, chat_id, thread_id, 0)
             await message.reply_text(
-                "اختر الصفحة التي تريد ربطها:",
+                "اختر الصفحة أو قاعدة البيانات (🗃) التي تريد ربطها:",
                 reply_markup=reply_markup
             )
-            logger.info(f"تم إرسال قائمة الصفحات للمستخدم {message.from_user.id}")
+            logger.info("تم إرسال قائمة الصفحات للمستخدم %s", message.from_user.id)
             
         except Exception as e:
-            logger.error(f"خطأ في البحث عن صفحات Notion: {str(e)}")
+            logger.error("خطأ في البحث عن صفحات Notion: %s", e)
             await message.reply_text("حدث خطأ أثناء البحث عن الصفحات. الرجاء المحاولة مرة أخرى.")
             
     except Exception as e:
-        logger.error(f"خطأ في معالجة أمر start: {str(e)}")
+        logger.error("خطأ في معالجة أمر start: %s", e)
         await update.message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
 
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -199,71 +183,82 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     try:
         query = update.callback_query
+        
+        # الأزرار الموقعة فقط، ومن نفس المحادثة التي أُرسلت فيها القائمة
+        callback = services.callbacks.decode(query.data or "")
+        chat = query.message.chat
+        if callback is None or callback.chat_id != chat.id:
+            logger.warning("زر غير صالح أو من قائمة قديمة: %s", query.data)
+            await query.answer("هذه القائمة لم تعد صالحة، استخدم /start من جديد.", show_alert=True)
+            return
+        # قائمة /start تُرسل في المجموعة، فأي عضو يمكنه الضغط عليها: الربط للمشرفين فقط
+        # (من قائمة المشرفين المحفوظة، فلا يضيف التحقق طلباً إلى تيليجرام في كل ضغطة)
+        if chat.type in ['group', 'supergroup'] and not await services.admins.is_admin(
+            context.bot, chat.id, query.from_user.id
+        ):
+            logger.info("المستخدم %s ليس مشرفاً، تم تجاهل الزر", query.from_user.id)
+            await query.answer("عذراً، ربط الصفحات متاح فقط للمشرفين.", show_alert=True)
+            return
         await query.answer()  # نجيب على الضغطة لإزالة علامة التحميل
         
-        logger.info(f"تم الضغط على زر: {query.data}")
+        logger.debug("تم الضغط على زر: %s", query.data)
         
-        if not query.data.startswith("page_"):
-            logger.warning(f"نوع زر غير معروف: {query.data}")
+        chat_id = str(chat.id)
+        thread_id = str(callback.thread_id)
+        page_index = services.for_chat(chat_id).page_index
+        pages = await page_index.get()
+
+        if callback.action == NAV:
+            # التنقل بين صفحات القائمة
+            search_query = context.chat_data.get("page_queries", {}).get(thread_id, "")
+            pages = page_index.filter(search_query)
+            await query.edit_message_reply_markup(build_pages_keyboard(pages, page_index, chat_id, thread_id, callback.value))
+            return
+        
+        if callback.action != BIND:
+            logger.warning("نوع زر غير معروف: %s", callback.action)
             return
             
-        # استخراج معرف التوبيك ومعرف الصفحة
-        _, thread_id, page_id = query.data.split("_")
+        # الصفحة من موضعها في الفهرس، أو ببصمتها إذا تغير ترتيب الفهرس منذ إرسال القائمة
+        entry = find_page(pages, callback.value, callback.fingerprint)
+        if entry is None:
+            await query.edit_message_text("لم تعد هذه الصفحة متاحة. استخدم /start لعرض القائمة من جديد.")
+            return
+        page_id = entry["id"]
+        target = entry["object"]
         
-        # تخزين الربط بين التوبيك والصفحة
-        topic_pages[thread_id] = page_id
-        # حفظ التغييرات في الملف
-        save_topic_pages(topic_pages)
+        # تخزين الربط بين التوبيك والصفحة خارج حلقة الأحداث
+        # الربط يحمل مساحة العمل التي اختيرت منها الصفحة، فتُكتب رسائله بتوكنها
+        workspace = services.bindings.get_chat_workspace(chat_id)
+        # رسالة القائمة تسبق كل رسالة تُحفظ مباشرة، فيتوقف عندها /backfill حتى لا يكرر الرسائل
+        await asyncio.to_thread(
+            services.bindings.bind, chat_id, thread_id, page_id, target, workspace, query.message.message_id
+        )
         
-        logger.info(f"تم ربط المحادثة/التوبيك {thread_id} بالصفحة {page_id}")
-        logger.info(f"قائمة المحادثات المرتبطة: {topic_pages}")
+        logger.info("تم ربط المحادثة/التوبيك %s/%s بالهدف %s (%s)", chat_id, thread_id, page_id, target)
+        logger.info("عدد المحادثات المرتبطة: %s", len(services.bindings))
         
         # تحديث الرسالة
-        await query.edit_message_text("تم ربط المحادثة بالصفحة بنجاح! يمكنك الآن إرسال الرسائل وسيتم حفظها في Notion.")
+        if target == DATABASE:
+            await query.edit_message_text("تم ربط المحادثة بقاعدة البيانات بنجاح! ستُحفظ كل رسالة كصف جديد في Notion.")
+        else:
+            await query.edit_message_text("تم ربط المحادثة بالصفحة بنجاح! يمكنك الآن إرسال الرسائل وسيتم حفظها في Notion.")
         
     except Exception as e:
-        logger.error(f"خطأ في معالجة الضغط على الزر: {str(e)}")
+        logger.error("خطأ في معالجة الضغط على الزر: %s", e)
         await query.edit_message_text("حدث خطأ أثناء ربط المحادثة بالصفحة. الرجاء المحاولة مرة أخرى.")
 
-async def create_media_block(media_obj, media_type: str, caption: str = None) -> dict:
+async def track_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    إنشاء بلوك وسائط لـ Notion
+    تحديد معرف الارتباط للتحديث الحالي قبل باقي المعالجات
     """
-    try:
-        logger.info(f"جاري إنشاء بلوك {media_type}")
-        
-        # إنشاء رابط للملف
-        message_link = f"https://t.me/c/{str(media_obj.file_unique_id)}"
-        
-        # إنشاء نص الرابط
-        link_text = f"{media_type}"
-        if caption:
-            link_text = f"{caption}\n{link_text}"
-            
-        return {
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": link_text + ": ",
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": message_link,
-                            "link": {"url": message_link}
-                        }
-                    }
-                ]
-            }
-        }
-    except Exception as e:
-        logger.error(f"خطأ في إنشاء بلوك الوسائط: {str(e)}")
-        raise
+    set_correlation_id(update.update_id)
+
+async def track_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    تحديث صلاحيات عضو في المجموعة: حذف قائمة المشرفين المحفوظة إذا أصبح مشرفاً أو لم يعد كذلك
+    """
+    services.admins.on_member_update(update.chat_member)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -278,274 +273,605 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = str(message.chat.id)  # تحويل معرف المحادثة إلى نص
         thread_id = str(message.message_thread_id) if message.is_topic_message else chat_id  # تحويل معرف التوبيك إلى نص
         
-        logger.info(f"معالجة رسالة من المحادثة/التوبيك: {thread_id}")
-        logger.info(f"قائمة المحادثات المرتبطة: {topic_pages}")
+        logger.debug("معالجة رسالة من المحادثة/التوبيك: %s", thread_id)
+        
+        # الحصول على معرف الصفحة المرتبطة
+        page_id = services.bindings.get(chat_id, thread_id)
         
         # التحقق من وجود ربط للمحادثة/التوبيك
-        if thread_id not in topic_pages:
-            logger.info("المحادثة/التوبيك غير مرتبط بأي صفحة")
+        if page_id is None:
+            logger.debug("المحادثة/التوبيك غير مرتبط بأي صفحة")
+            metrics.MESSAGES.inc(type="unknown", outcome="unbound")
+            # رابط قديم بنفس معرف التوبيك قد يخص مجموعة أخرى، فنطلب إعادة الربط مرة واحدة بدل تخمين المجموعة
+            if services.bindings.legacy_page(thread_id) is not None and (chat_id, thread_id) not in services.legacy_notified:
+                services.legacy_notified.add((chat_id, thread_id))
+                await message.reply_text(
+                    "هذا التوبيك كان مرتبطاً بصفحة في الإصدار السابق دون تحديد المجموعة، فلم تُحفظ الرسالة. "
+                    "يرجى من المشرف إعادة ربطه باستخدام /start."
+                )
             return
             
-        # الحصول على معرف الصفحة المرتبطة
-        page_id = topic_pages[thread_id]
-        logger.info(f"معرف الصفحة: {page_id}")
+        logger.debug("معرف الصفحة: %s", page_id)
         
-        # إنشاء رابط للرسالة
-        chat_id_str = str(message.chat.id)[4:] if str(message.chat.id).startswith('-100') else str(message.chat.id)
+        # أجزاء الألبوم تُجمع وتُحفظ وتُؤكد مرة واحدة عند اكتمال الألبوم
+        if message.media_group_id:
+            services.album_aggregator.add((page_id, message.media_group_id), message)
+            metrics.MESSAGES.inc(type="album", outcome="album_part")
+            return
         
-        if message.is_topic_message:
-            message_link = f"https://t.me/c/{chat_id_str}/{message.message_thread_id}/{message.message_id}"
-        else:
-            message_link = f"https://t.me/c/{chat_id_str}/{message.message_id}"
-            
-        logger.info(f"رابط الرسالة: {message_link}")
+        # حفظ الألبومات المنتظرة لنفس الصفحة أولاً حتى تبقى الرسائل بترتيبها
+        await services.album_aggregator.flush(lambda key: key[0] == page_id)
         
-        # معالجة أنواع مختلفة من الرسائل
-        content = None
+        # إنشاء رابط للرسالة
+        message_link = build_message_link(message)
         
-        if message.text:
-            # رسالة نصية
-            logger.info(f"رسالة نصية: {message.text}")
-            content = await create_text_block(message.text)
-            
-        elif message.photo:
-            # صورة
-            logger.info("رسالة صورة")
-            content = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": []
-                }
-            }
-            
-            # إضافة الوصف إذا وجد
-            if message.caption:
-                content["paragraph"]["rich_text"].append({
-                    "type": "text",
-                    "text": {
-                        "content": f"{message.caption}\n",
-                    }
-                })
-            
-            # إضافة رابط الصورة
-            content["paragraph"]["rich_text"].append({
-                "type": "text",
-                "text": {
-                    "content": "صورة: ",
-                }
-            })
-            content["paragraph"]["rich_text"].append({
-                "type": "text",
-                "text": {
-                    "content": message_link,
-                    "link": {"url": message_link}
-                }
-            })
-                
-        elif message.video:
-            # فيديو
-            logger.info("رسالة فيديو")
-            content = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": []
-                }
-            }
-            
-            # إضافة الوصف إذا وجد
-            if message.caption:
-                content["paragraph"]["rich_text"].append({
-                    "type": "text",
-                    "text": {
-                        "content": f"{message.caption}\n",
-                    }
-                })
-            
-            # إضافة رابط الفيديو
-            content["paragraph"]["rich_text"].append({
-                "type": "text",
-                "text": {
-                    "content": "فيديو: ",
-                }
-            })
-            content["paragraph"]["rich_text"].append({
-                "type": "text",
-                "text": {
-                    "content": message_link,
-                    "link": {"url": message_link}
-                }
-            })
-                
-        elif message.voice:
-            # رسالة صوتية
-            logger.info("رسالة صوتية")
-            content = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": "رسالة صوتية: ",
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": message_link,
-                                "link": {"url": message_link}
-                            }
-                        }
-                    ]
-                }
-            }
-                
-        elif message.audio:
-            # ملف صوتي
-            logger.info("ملف صوتي")
-            title = message.audio.title if message.audio.title else "بدون عنوان"
-            performer = message.audio.performer if message.audio.performer else "غير معروف"
-            content = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": f"العنوان: {title}\nالمؤدي: {performer}\nملف صوتي: ",
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": message_link,
-                                "link": {"url": message_link}
-                            }
-                        }
-                    ]
-                }
-            }
-                
-        elif message.document:
-            # مستند
-            logger.info("مستند")
-            file_name = message.document.file_name if message.document.file_name else "بدون اسم"
-            content = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": f"اسم الملف: {file_name}\nمستند: ",
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": message_link,
-                                "link": {"url": message_link}
-                            }
-                        }
-                    ]
-                }
-            }
+        # إنشاء كتلة المحتوى حسب نوع الرسالة من جدول الأنواع
+        kind, content = build_content_blocks(message, message_link)
+        logger.debug("نوع الرسالة: %s، طول النص: %s", kind, redact(message.text or message.caption))
+        if content and services.upload_media:
+            content = [create_file_reference(message, block) for block in content]
         
         if content:
             # إضافة المحتوى إلى Notion
-            logger.info("جاري إضافة المحتوى إلى Notion...")
+            logger.debug("جاري إضافة المحتوى إلى Notion...")
             try:
-                # إضافة سطر فارغ قبل المحتوى
-                notion.blocks.children.append(
-                    page_id,
-                    children=[
-                        {
-                            "object": "block",
-                            "type": "paragraph",
-                            "paragraph": {
-                                "rich_text": []
-                            }
-                        },
-                        content,
-                        {
-                            "object": "block",
-                            "type": "paragraph",
-                            "paragraph": {
-                                "rich_text": []
-                            }
-                        }
-                    ]
-                )
-                logger.info("تم إضافة المحتوى بنجاح إلى Notion")
-                await message.reply_text("تم حفظ الرسالة في Notion بنجاح!")
+                # مفتاح الرسالة يمنع تكرارها إذا أعاد تيليجرام إرسال نفس التحديث
+                key = f"{chat_id}:{message.message_id}"
+                if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+                    # صف جديد في قاعدة البيانات، خصائصه تُحسب هنا دون أي طلب
+                    is_new = services.outbox.put(key, page_id, build_row(message, kind, content, message_link), kind=ROW)
+                elif services.bindings.get_digest(chat_id, thread_id) is not None:
+                    # وضع الملخص: الرسالة تنتظر في digest.db حتى يُكتب ملخص فترتها
+                    is_new = services.digest.add(chat_id, thread_id, page_id, message, message_link)
+                    page_id = None
+                else:
+                    # إضافة سطر فارغ قبل المحتوى وبعده، وحفظ الرسالة في الصندوق الصادر
+                    # (الصفحة الفرعية في التوبيكات المقسمة تُحدد عند الإرسال، فلا ننتظر Notion هنا)
+                    blocks = services.rollover.defer(chat_id, thread_id, message.date, build_message_blocks(content))
+                    is_new = services.outbox.put(key, page_id, blocks)
+                if is_new:
+                    if page_id is not None:
+                        services.drainer.notify(page_id)
+                    metrics.TOPIC_MESSAGES.inc(chat_id=chat_id, thread_id=thread_id)
+                metrics.MESSAGES.inc(type=kind, outcome="saved" if is_new else "duplicate")
+                logger.debug("تم حفظ المحتوى في الصندوق الصادر")
+                services.acknowledger.ack(message)
             except Exception as e:
-                logger.error(f"خطأ في إضافة المحتوى إلى Notion: {str(e)}")
+                metrics.MESSAGES.inc(type=kind, outcome="error")
+                logger.error("خطأ في إضافة المحتوى إلى Notion: %s", e)
                 await message.reply_text("حدث خطأ أثناء حفظ الرسالة في Notion. الرجاء المحاولة مرة أخرى.")
         else:
             logger.warning("نوع الرسالة غير مدعوم")
+            metrics.MESSAGES.inc(type="unknown", outcome="unsupported")
             await message.reply_text("عذراً، هذا النوع من الرسائل غير مدعوم حالياً.")
             
     except Exception as e:
-        logger.error(f"حدث خطأ في handle_message: {str(e)}")
+        logger.error("حدث خطأ في handle_message: %s", e)
         await message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
 
-async def create_text_block(text: str) -> dict:
+async def handle_edited_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    إنشاء كتلة نص لـ Notion
-    
+    تعديل كتل الرسالة في Notion عند تعديلها في تيليجرام
+    """
+    try:
+        message = update.edited_message
+        if not message:
+            return
+
+        chat_id = str(message.chat.id)
+        thread_id = str(message.message_thread_id) if message.is_topic_message else chat_id
+        page_id = services.bindings.get(chat_id, thread_id)
+        if page_id is None:
+            return
+
+        if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+            # صفوف قاعدة البيانات لا تُسجل في فهرس الكتل، فلا تُزامن تعديلاتها
+            logger.info("تم تجاهل تعديل الرسالة %s في قاعدة البيانات", message.message_id)
+            return
+
+        if message.media_group_id:
+            # الألبوم محفوظ كإدخال واحد، ولا يمكن تعديل جزء منه بمفرده
+            logger.info("تم تجاهل تعديل جزء من الألبوم %s", message.media_group_id)
+            return
+
+        # رسالة لم يُكتب ملخصها بعد تُعدل في digest.db مباشرة
+        if services.bindings.get_digest(chat_id, thread_id) is not None and services.digest.buffer.update(
+            chat_id, message.message_id, message_summary(message)
+        ):
+            logger.info("تم تعديل الرسالة %s في ملخص التوبيك", message.message_id)
+            return
+
+        kind, content = build_content_blocks(message, build_message_link(message))
+        if not content:
+            return
+        if services.upload_media:
+            content = [create_file_reference(message, block) for block in content]
+
+        # التعديل يُحفظ في طابور الصفحة المرتبطة مع الرسالة الأصلية (حتى في التوبيكات المقسمة)
+        # فيُنفذ بعدها، وفهرس الكتل يحدد الصفحة الفرعية التي كُتبت فيها
+        # كل تعديل له مفتاح مختلف حسب وقت التعديل، وينفذ بعد حفظ الرسالة الأصلية
+        edit_date = int(message.edit_date.timestamp()) if message.edit_date else 0
+        is_new = services.outbox.put(
+            f"{chat_id}:{message.message_id}:edit:{edit_date}",
+            page_id,
+            {"target": f"{chat_id}:{message.message_id}", "blocks": content},
+            kind=EDIT
+        )
+        if is_new:
+            services.drainer.notify(page_id)
+        logger.info("تم حفظ تعديل الرسالة %s في الصندوق الصادر", message.message_id)
+
+    except Exception as e:
+        logger.error("حدث خطأ في handle_edited_message: %s", e)
+
+async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    معالج أمر /delete - يحذف الرسالة التي تم الرد عليها من صفحة Notion
+    """
+    try:
+        message = update.message
+        if not message:
+            return
+
+        chat_id = str(message.chat.id)
+        thread_id = str(message.message_thread_id) if message.is_topic_message else chat_id
+        page_id = services.bindings.get(chat_id, thread_id)
+        if page_id is None:
+            await message.reply_text("عذراً، هذه المحادثة غير مرتبطة بأي صفحة.")
+            return
+        if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+            await message.reply_text("عذراً، الحذف متاح فقط للمحادثات المرتبطة بصفحة. احذف الصف من قاعدة البيانات مباشرة.")
+            return
+
+        # في التوبيكات تكون الرسائل العادية رداً على رسالة إنشاء التوبيك
+        target = message.reply_to_message
+        if target is None or target.forum_topic_created:
+            await message.reply_text("استخدم /delete بالرد على الرسالة التي تريد حذفها من Notion.")
+            return
+
+        # يمكن لصاحب الرسالة أو المشرفين فقط حذفها
+        user = message.from_user
+        if message.chat.type in ['group', 'supergroup'] and not (target.from_user and target.from_user.id == user.id):
+            if not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+                await message.reply_text("عذراً، يمكن حذف الرسالة لصاحبها أو للمشرفين فقط.")
+                return
+
+        target_key = f"{chat_id}:{target.message_id}"
+        is_new = services.outbox.put(f"{target_key}:archive", page_id, {"target": target_key}, kind=ARCHIVE)
+        if is_new:
+            services.drainer.notify(page_id)
+        logger.info("تم طلب حذف الرسالة %s من Notion", target.message_id)
+        await message.reply_text("سيتم حذف الرسالة من Notion.")
+
+    except Exception as e:
+        logger.error("حدث خطأ في delete_message: %s", e)
+        await update.message.reply_text("حدث خطأ أثناء حذف الرسالة. الرجاء المحاولة مرة أخرى.")
+
+async def backfill(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    معالج أمر /backfill - استيراد الرسائل السابقة من ملف تصدير Telegram Desktop (result.json)
+    يُستخدم بالرد على ملف التصدير، أو مع اسم ملف موجود في مجلد BACKFILL_DIR على الخادم
+    """
+    try:
+        message = update.message
+        if not message:
+            return
+
+        chat_id = str(message.chat.id)
+        thread_id = str(message.message_thread_id) if message.is_topic_message else chat_id
+        page_id = services.bindings.get(chat_id, thread_id)
+        if page_id is None:
+            await message.reply_text("عذراً، يجب ربط المحادثة بصفحة باستخدام /start قبل الاستيراد.")
+            return
+        if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+            await message.reply_text("عذراً، الاستيراد متاح فقط للمحادثات المرتبطة بصفحة.")
+            return
+
+        if message.chat.type in ['group', 'supergroup']:
+            user = message.from_user
+            if not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+                logger.info("المستخدم %s ليس مشرفاً", user.id)
+                await message.reply_text("عذراً، هذا الأمر متاح فقط للمشرفين في المجموعات.")
+                return
+
+        key = (chat_id, thread_id)
+        if key in services.backfill_tasks:
+            await message.reply_text("يوجد استيراد جارٍ لهذه المحادثة بالفعل.")
+            return
+
+        os.makedirs(services.backfill_dir, exist_ok=True)
+        target = message.reply_to_message
+        if target is not None and target.document:
+            # اسم الملف ثابت لنفس الملف، فيستكمل الاستيراد من نقطة الحفظ إذا أعيد الأمر
+            path = os.path.join(services.backfill_dir, f"{chat_id}_{thread_id}_{target.document.file_unique_id}.json")
+            if not os.path.exists(path):
+                try:
+                    telegram_file = await target.document.get_file()
+                    await telegram_file.download_to_drive(path)
+                except Exception as e:
+                    logger.error("خطأ في تنزيل ملف التصدير: %s", e)
+                    await message.reply_text(
+                        "تعذر تنزيل الملف (الحد الأقصى لتنزيل البوت 20 ميغابايت).\n"
+                        f"ضع الملف في مجلد {services.backfill_dir} على الخادم ثم استخدم: /backfill اسم_الملف"
+                    )
+                    return
+        elif context.args:
+            path = os.path.join(services.backfill_dir, os.path.basename(" ".join(context.args)))
+            if not os.path.exists(path):
+                await message.reply_text("لم يتم العثور على ملف التصدير.")
+                return
+        else:
+            await message.reply_text(
+                "استخدم /backfill بالرد على ملف result.json المصدّر من Telegram Desktop، "
+                f"أو مع اسم ملف موجود في مجلد {services.backfill_dir}."
+            )
+            return
+
+        status = await message.reply_text("جاري استيراد الرسائل السابقة...")
+        topic = message.message_thread_id if message.is_topic_message else None
+
+        async def progress(imported: int, scanned: int, finished: bool):
+            text = (
+                f"اكتمل الاستيراد: تمت إضافة {imported} رسالة من {scanned}."
+                if finished else
+                f"جاري الاستيراد: تمت إضافة {imported} رسالة من {scanned} حتى الآن..."
+            )
+            try:
+                await status.edit_text(text)
+            except Exception as e:
+                logger.warning("تعذر تحديث رسالة التقدم: %s", e)
+
+        async def run():
+            try:
+                def defer(backfilled, blocks: list):
+                    return services.rollover.defer(chat_id, thread_id, backfilled.date, blocks)
+
+                await services.backfiller.run(
+                    path, message.chat.to_dict(), topic, page_id, progress, defer,
+                    live_from=services.bindings.live_from(chat_id, thread_id),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("خطأ في استيراد الرسائل السابقة: %s", e)
+                await status.edit_text("حدث خطأ أثناء الاستيراد. يمكن إعادة الأمر لاستكماله من حيث توقف.")
+
+        logger.info("بدء استيراد %s إلى الصفحة %s", path, page_id)
+        task = asyncio.get_running_loop().create_task(run())
+        services.backfill_tasks[key] = task
+        task.add_done_callback(lambda done: services.backfill_tasks.pop(key, None))
+
+    except Exception as e:
+        logger.error("حدث خطأ في backfill: %s", e)
+        await update.message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
+
+async def set_rollover(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    معالج أمر /rollover - تقسيم الصفحة المرتبطة إلى صفحات فرعية يومية أو أسبوعية أو كل N كتلة
+    """
+    try:
+        message = update.message
+        if not message:
+            return
+
+        chat_id = str(message.chat.id)
+        thread_id = message_thread(message)
+        if services.bindings.get(chat_id, thread_id) is None:
+            await message.reply_text("عذراً، يجب ربط المحادثة بصفحة باستخدام /start أولاً.")
+            return
+        if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+            await message.reply_text("عذراً، التقسيم متاح فقط للمحادثات المرتبطة بصفحة.")
+            return
+
+        if not context.args:
+            policy = services.bindings.get_rollover(chat_id, thread_id)
+            await message.reply_text(
+                f"سياسة التقسيم الحالية: {policy or 'بدون تقسيم'}\n"
+                "للتغيير: /rollover daily أو weekly أو عدد الكتل (مثل 1000) أو off"
+            )
+            return
+
+        if message.chat.type in ['group', 'supergroup']:
+            user = message.from_user
+            if not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+                logger.info("المستخدم %s ليس مشرفاً", user.id)
+                await message.reply_text("عذراً، هذا الأمر متاح فقط للمشرفين في المجموعات.")
+                return
+
+        try:
+            policy = parse_policy(context.args[0])
+        except ValueError:
+            await message.reply_text("قيمة غير صحيحة. استخدم daily أو weekly أو عدد كتل لا يقل عن 100 أو off.")
+            return
+
+        await asyncio.to_thread(services.bindings.set_rollover, chat_id, thread_id, policy)
+        logger.info("سياسة التقسيم للمحادثة/التوبيك %s/%s: %s", chat_id, thread_id, policy)
+        if policy is None:
+            await message.reply_text("تم إلغاء التقسيم، ستُحفظ الرسائل في الصفحة المرتبطة مباشرة.")
+        else:
+            await message.reply_text(f"تم تفعيل التقسيم ({policy})، ستُحفظ الرسائل في صفحات فرعية تحت الصفحة المرتبطة.")
+
+    except Exception as e:
+        logger.error("حدث خطأ في set_rollover: %s", e)
+        await update.message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
+
+async def set_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    معالج أمر /digest - جمع رسائل التوبيك وكتابتها كملخص واحد كل ساعة أو يوم بدل كتابة كل رسالة فوراً
+    """
+    try:
+        message = update.message
+        if not message:
+            return
+
+        chat_id = str(message.chat.id)
+        thread_id = message_thread(message)
+        if services.bindings.get(chat_id, thread_id) is None:
+            await message.reply_text("عذراً، يجب ربط المحادثة بصفحة باستخدام /start أولاً.")
+            return
+        if services.bindings.get_target(chat_id, thread_id) == DATABASE:
+            await message.reply_text("عذراً، الملخص متاح فقط للمحادثات المرتبطة بصفحة.")
+            return
+
+        if not context.args:
+            period = services.bindings.get_digest(chat_id, thread_id)
+            await message.reply_text(
+                f"وضع الملخص الحالي: {period or 'بدون ملخص'}\n"
+                "للتغيير: /digest hourly أو daily أو off"
+            )
+            return
+
+        if message.chat.type in ['group', 'supergroup']:
+            user = message.from_user
+            if not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+                logger.info("المستخدم %s ليس مشرفاً", user.id)
+                await message.reply_text("عذراً، هذا الأمر متاح فقط للمشرفين في المجموعات.")
+                return
+
+        try:
+            period = parse_period(context.args[0])
+        except ValueError:
+            await message.reply_text("قيمة غير صحيحة. استخدم hourly أو daily أو off.")
+            return
+
+        await asyncio.to_thread(services.bindings.set_digest, chat_id, thread_id, period)
+        logger.info("وضع الملخص للمحادثة/التوبيك %s/%s: %s", chat_id, thread_id, period)
+        if period is None:
+            # الرسائل المنتظرة تُكتب الآن حتى تسبق الرسائل الجديدة في الصفحة
+            await services.digest.flush_due()
+            await message.reply_text("تم إلغاء الملخص، ستُحفظ الرسائل في الصفحة فوراً.")
+        else:
+            await message.reply_text(f"تم تفعيل الملخص ({period})، ستُكتب رسائل كل فترة كقائمة واحدة في نهايتها.")
+
+    except Exception as e:
+        logger.error("حدث خطأ في set_digest: %s", e)
+        await update.message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
+
+async def connect(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    معالج أمر /connect - ربط مجموعة بمساحة عمل Notion أخرى عبر توكن integration خاص بها
+    التوكن سري، فيُقبل فقط في محادثة خاصة مع البوت: /connect معرف_المجموعة secret_xxx
+    بعد التحقق من أن المرسل مشرف في المجموعة. /connect off للعودة إلى مساحة العمل الافتراضية
+    """
+    try:
+        message = update.message
+        if not message:
+            return
+
+        user = message.from_user
+        is_group = message.chat.type in ['group', 'supergroup']
+        if not context.args:
+            chat_id = str(message.chat.id)
+            workspace = services.bindings.get_chat_workspace(chat_id)
+            await message.reply_text(
+                f"مساحة العمل الحالية: {workspace or 'الافتراضية'}\n"
+                f"للتغيير أرسل في محادثة خاصة مع البوت: /connect {chat_id} توكن_الـ_integration\n"
+                "للعودة إلى مساحة العمل الافتراضية: /connect off"
+            )
+            return
+
+        if is_group:
+            chat_id = str(message.chat.id)
+            if context.args[0].lower() != "off":
+                # التوكن ظهر لأعضاء المجموعة، فنحذفه ونطلب إرساله في الخاص (ويُفضل تغييره في Notion)
+                try:
+                    await message.delete()
+                except Exception as e:
+                    logger.warning("تعذر حذف رسالة التوكن: %s", e)
+                await message.chat.send_message(
+                    "لا ترسل التوكن في المجموعة. أرسله في محادثة خاصة مع البوت: "
+                    f"/connect {chat_id} توكن_الـ_integration، ثم أنشئ توكناً جديداً في Notion لأن هذا التوكن ظهر للأعضاء."
+                )
+                return
+            token = services.notion_token
+        elif len(context.args) == 1:
+            # في المحادثة الخاصة بدون معرف مجموعة: ربط المحادثة الخاصة نفسها
+            chat_id = str(message.chat.id)
+            token = context.args[0]
+        else:
+            chat_id, token = context.args[0], context.args[1]
+            try:
+                target = int(chat_id)
+            except ValueError:
+                await message.reply_text("معرف المجموعة غير صحيح. استخدم /connect داخل المجموعة لمعرفته.")
+                return
+            if target != message.chat.id and not await services.admins.is_admin(context.bot, target, user.id):
+                logger.info("المستخدم %s ليس مشرفاً في المحادثة %s", user.id, chat_id)
+                await message.reply_text("عذراً، هذا الأمر متاح فقط لمشرفي المجموعة.")
+                return
+
+        if is_group and not await services.admins.is_admin(context.bot, message.chat.id, user.id):
+            logger.info("المستخدم %s ليس مشرفاً", user.id)
+            await message.reply_text("عذراً، هذا الأمر متاح فقط للمشرفين في المجموعات.")
+            return
+
+        if token.lower() == "off":
+            token = services.notion_token
+        try:
+            name = await services.connect(chat_id, token)
+        except APIResponseError as e:
+            logger.warning("رفض Notion توكن مساحة العمل للمحادثة %s: %s", chat_id, e)
+            await message.reply_text("تعذر الاتصال بـ Notion بهذا التوكن. تأكد من صحته ثم حاول مرة أخرى.")
+            return
+
+        await message.reply_text(
+            f"تم ربط المحادثة بمساحة عمل Notion ({name or 'integration'}). "
+            "استخدم /start لاختيار صفحة منها، وتبقى التوبيكات المرتبطة سابقاً على مساحة عملها."
+        )
+
+    except Exception as e:
+        logger.error("حدث خطأ في connect: %s", e)
+        await update.message.reply_text("حدث خطأ غير متوقع. الرجاء المحاولة مرة أخرى.")
+
+async def post_init(application: Application):
+    """
+    تشغيل المكونات في الخلفية مع فحص الاتصال بـ Notion وإعادة إرسال الرسائل المنتظرة من التشغيل السابق
+    """
+    await services.start(application.bot)
+
+async def flush_digests(context: ContextTypes.DEFAULT_TYPE):
+    """
+    كتابة ملخصات الفترات المنتهية (مهمة دورية في JobQueue)
+    """
+    try:
+        await services.digest.flush_due()
+    except Exception as e:
+        logger.error("خطأ في كتابة الملخصات: %s", e)
+
+async def post_shutdown(application: Application):
+    """
+    إيقاف المكونات عند إيقاف البوت، الرسائل التي لم تُرسل تبقى على القرص وتُرسل عند التشغيل التالي
+    """
+    await services.stop()
+
+# أنواع التحديثات التي يحتاجها البوت فقط، حتى لا يرسل تيليجرام تحديثات لا نعالجها
+# chat_member يصل فقط عندما يكون البوت مشرفاً، ويُستخدم لتحديث قائمة المشرفين المحفوظة فوراً
+ALLOWED_UPDATES = [Update.MESSAGE, Update.EDITED_MESSAGE, Update.CALLBACK_QUERY, Update.CHAT_MEMBER]
+
+def create_application(environ=None, bot_token: str = None) -> Application:
+    """
+    بناء مكونات البوت وتطبيق تيليجرام مع معالجاته
+    لا يتصل بأي خدمة: فحص الاتصال يتم في post_init بعد تشغيل حلقة الأحداث
+
     Args:
-        text (str): النص المراد إضافته
-        
-    Returns:
-        dict: كتلة Notion
-    """
-    return {
-        "object": "block",
-        "type": "paragraph",
-        "paragraph": {
-            "rich_text": [{
-                "type": "text",
-                "text": {
-                    "content": text
-                }
-            }]
-        }
-    }
+        environ: الإعدادات (os.environ افتراضياً)
+        bot_token (str): توكن البوت، أو TELEGRAM_BOT_TOKEN من الإعدادات
+
+    Raises:
+        ValueError: إذا لم يتم تحديد NOTION_TOKEN أو توكن البوت
+    """
+    global services
+    if environ is None:
+        environ = os.environ
+    bot_token = bot_token or environ.get("TELEGRAM_BOT_TOKEN")
+    if not bot_token:
+        raise ValueError("لم يتم العثور على توكن البوت")
+
+    services = BotServices(environ, on_album=save_album)
+
+    # إنشاء تطبيق البوت مع معالجة التحديثات بشكل متزامن
+    # حتى لا تنتظر التوبيكات المختلفة بعضها أثناء الكتابة إلى Notion
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # فحص الملخصات المستحقة دورياً (JobQueue من python-telegram-bot[job-queue])
+    application.job_queue.run_repeating(
+        flush_digests, interval=services.digest.check_interval, first=services.digest.check_interval
+    )
+
+    # معرف التحديث يُضاف إلى كل سطر سجل أثناء معالجته (المجموعة -1 تسبق كل المعالجات)
+    application.add_handler(TypeHandler(Update, track_update), group=-1)
+
+    # إضافة معالج الأمر /start
+    application.add_handler(CommandHandler("start", start))
+
+    # إضافة معالج الأمر /delete لحذف رسالة من Notion
+    application.add_handler(CommandHandler("delete", delete_message))
+
+    # إضافة معالج الأمر /backfill لاستيراد الرسائل السابقة
+    application.add_handler(CommandHandler("backfill", backfill))
+
+    # إضافة معالج الأمر /rollover لتقسيم الصفحة إلى صفحات فرعية
+    application.add_handler(CommandHandler("rollover", set_rollover))
+
+    # إضافة معالج الأمر /digest لكتابة رسائل التوبيك كملخص كل ساعة أو يوم
+    application.add_handler(CommandHandler("digest", set_digest))
+
+    # إضافة معالج الأمر /connect لربط المحادثة بمساحة عمل Notion أخرى
+    application.add_handler(CommandHandler("connect", connect))
+
+    # إضافة معالج تغيير صلاحيات الأعضاء
+    application.add_handler(ChatMemberHandler(track_admins, ChatMemberHandler.CHAT_MEMBER))
+
+    # إضافة معالج الأزرار
+    application.add_handler(CallbackQueryHandler(button))
+
+    # إضافة معالج الرسائل المعدلة ثم معالج الرسائل الجديدة
+    application.add_handler(MessageHandler(filters.UpdateType.EDITED_MESSAGE & ~filters.COMMAND, handle_edited_message))
+    application.add_handler(MessageHandler(filters.UpdateType.MESSAGE & ~filters.COMMAND, handle_message))
+    return application
 
 def main():
     """
     الدالة الرئيسية لتشغيل البوت
     """
+    # تحميل المتغيرات البيئية
+    load_dotenv()
+
+    # إعداد السجلات: LOG_FORMAT=json لسطر JSON لكل سجل، وسطور DEBUG لكل رسالة تُكتب بنسبة LOG_DEBUG_SAMPLE
+    setup_logging(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        json_format=os.getenv("LOG_FORMAT", "text") == "json",
+        debug_sample_rate=float(os.getenv("LOG_DEBUG_SAMPLE", "1")),
+    )
+
+    try:
+        application = create_application()
+    except ValueError as e:
+        logger.error("%s", e)
+        return
+
+    # مع OUTBOX_WORKERS تستقبل هذه العملية الرسائل وتحفظها فقط، ويرسلها العمال إلى Notion
+    workers = start_workers(services.workers) if services.workers > 0 else []
+    if workers:
+        logger.info("تم تشغيل %s عامل لإرسال الرسائل إلى Notion", len(workers))
+
     try:
-        # الحصول على توكن البوت من المتغيرات البيئية
-        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        if not bot_token:
-            logger.error("لم يتم العثور على توكن البوت")
-            return
-            
-        # إنشاء تطبيق البوت
-        application = Application.builder().token(bot_token).build()
-        
-        # إضافة معالج الأمر /start
-        application.add_handler(CommandHandler("start", start))
-        
-        # إضافة معالج الأزرار
-        application.add_handler(CallbackQueryHandler(button))
-        
-        # إضافة معالج الرسائل
-        application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_message))
-        
         # بدء تشغيل البوت
-        logger.info("جاري بدء تشغيل البوت...")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
-        
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if webhook_url:
+            # وضع Webhook: يرسل تيليجرام التحديثات مباشرة إلى البوت دون انتظار الاستطلاع
+            # نسخة واحدة فقط: الروابط والصندوق الصادر وتجميع الألبومات وفهرس الكتل والصفحات
+            # محفوظة في SQLite محلي وذاكرة العملية، فالنسخ المتعددة تفقد الرسائل أو تكررها
+            # (للتوسع استخدم OUTBOX_WORKERS لتوزيع الإرسال على عدة أنوية)
+            webhook_secret = os.getenv("WEBHOOK_SECRET")
+            if not webhook_secret:
+                logger.error("يجب تحديد WEBHOOK_SECRET عند استخدام وضع Webhook")
+                return
+            url_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+            logger.info("جاري بدء تشغيل البوت في وضع Webhook...")
+            application.run_webhook(
+                listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                url_path=url_path,
+                webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+                secret_token=webhook_secret,
+                allowed_updates=ALLOWED_UPDATES,
+            )
+        else:
+            logger.info("جاري بدء تشغيل البوت...")
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
     except Exception as e:
-        logger.error(f"حدث خطأ في main: {str(e)}")
+        logger.error("حدث خطأ في main: %s", e)
+    finally:
+        stop_workers(workers)
 
 # نقطة بداية البرنامج
 if __name__ == "__main__":
@@ -554,4 +880,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("تم إيقاف البوت بواسطة المستخدم")
     except Exception as e:
-        logger.error(f"حدث خطأ غير متوقع: {str(e)}")
+        logger.error("حدث خطأ غير متوقع: %s", e)
@@ -0,0 +1,98 @@
+# بيانات أزرار القائمة (callback_data) بصيغة ثنائية مختصرة وموقعة
+# تيليجرام يحدد callback_data بـ 64 بايت، فبدل "page_{thread_id}_{page_id}" نرسل:
+# نوع الزر، المحادثة، التوبيك، رقم الصفحة في الفهرس مع بصمة قصيرة لمعرفها، ثم HMAC مقتطع
+# كل ذلك بـ base64 في 44 حرفاً، ولا يُقبل أي زر لم يوقعه البوت
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import zlib
+from typing import NamedTuple, Optional
+
+# أنواع الأزرار
+BIND = 1  # ربط التوبيك بالصفحة
+NAV = 2  # التنقل بين شاشات القائمة
+
+# النوع، المحادثة، التوبيك (أو المحادثة في المحادثات المباشرة)، الرقم (موضع الصفحة أو بداية الشاشة)، بصمة الصفحة
+_PAYLOAD = struct.Struct(">BqqII")
+MAC_SIZE = 8  # طول التوقيع المقتطع بالبايت
+
+
+class Callback(NamedTuple):
+    """
+    زر بعد التحقق من توقيعه
+    """
+    action: int
+    chat_id: int
+    thread_id: int
+    value: int  # موضع الصفحة في الفهرس (BIND) أو بداية الشاشة (NAV)
+    fingerprint: int  # بصمة معرف الصفحة (BIND)، أو 0
+
+
+def page_fingerprint(page_id: str) -> int:
+    """
+    بصمة قصيرة لمعرف الصفحة، تكشف تغير ترتيب الفهرس بين إرسال القائمة والضغط عليها
+    """
+    return zlib.crc32(page_id.replace("-", "").encode())
+
+
+def find_page(pages: list, position: int, fingerprint: int) -> Optional[dict]:
+    """
+    الصفحة التي يشير إليها الزر: في موضعها إذا لم يتغير الفهرس، وإلا نبحث عنها ببصمتها
+    """
+    if 0 <= position < len(pages) and page_fingerprint(pages[position]["id"]) == fingerprint:
+        return pages[position]
+    matches = [page for page in pages if page_fingerprint(page["id"]) == fingerprint]
+    return matches[0] if len(matches) == 1 else None
+
+
+class CallbackSigner:
+    """
+    ترميز بيانات الأزرار وتوقيعها والتحقق منها
+    """
+
+    def __init__(self, secret):
+        """
+        Args:
+            secret: سر التوقيع (نص أو bytes)، يجب أن يكون واحداً في كل نسخ البوت
+        """
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self._key = hashlib.sha256(b"callback_data:" + secret).digest()
+
+    def _mac(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+    def encode(self, action: int, chat_id, thread_id, value: int = 0, fingerprint: int = 0) -> str:
+        payload = _PAYLOAD.pack(action, int(chat_id), int(thread_id), value, fingerprint)
+        return base64.urlsafe_b64encode(payload + self._mac(payload)).decode().rstrip("=")
+
+    def bind(self, chat_id, thread_id, position: int, page_id: str) -> str:
+        """
+        زر ربط التوبيك بالصفحة في الموضع position من الفهرس
+        """
+        return self.encode(BIND, chat_id, thread_id, position, page_fingerprint(page_id))
+
+    def nav(self, chat_id, thread_id, offset: int) -> str:
+        """
+        زر الانتقال إلى شاشة القائمة التي تبدأ بـ offset
+        """
+        return self.encode(NAV, chat_id, thread_id, offset)
+
+    def decode(self, data: str) -> Optional[Callback]:
+        """
+        Returns:
+            Callback: بيانات الزر، أو None إذا كان مشوهاً أو غير موقع من البوت
+        """
+        try:
+            raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) != _PAYLOAD.size + MAC_SIZE:
+            return None
+        payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+        # مقارنة بزمن ثابت حتى لا يكشف زمن الرد أي جزء من التوقيع الصحيح
+        if not hmac.compare_digest(mac, self._mac(payload)):
+            return None
+        return Callback(*_PAYLOAD.unpack(payload))
@@ -0,0 +1,172 @@
+# حفظ الرسائل كصفوف في قاعدة بيانات Notion بدل إضافتها ككتل إلى صفحة
+# كل رسالة صف له خصائص (المرسل، التاريخ، الرابط، النوع، الوسوم) ومحتواها داخل الصف
+# الصفوف تمر عبر الصندوق الصادر والمنظم مثل باقي الطلبات
+import asyncio
+import logging
+
+from notion_client.errors import APIErrorCode, APIResponseError
+from telegram import MessageEntity
+
+from blocks import MEDIA_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+# نوع إدخال الصندوق الصادر لصف قاعدة بيانات: {"title", "sender", "date", "link", "type", "tags", "children"}
+ROW = "row"
+
+# خصائص الصف وأسماؤها وأنواعها في Notion، تُضاف إلى قاعدة البيانات إذا لم تكن موجودة
+ROW_PROPERTIES = {
+    "sender": ("المرسل", "rich_text"),
+    "date": ("التاريخ", "date"),
+    "link": ("الرابط", "url"),
+    "type": ("النوع", "select"),
+    "tags": ("الوسوم", "multi_select"),
+}
+
+TITLE_LENGTH = 100  # أقصى طول لعنوان الصف المأخوذ من أول سطر في الرسالة
+MAX_CHILDREN = 100  # أقصى عدد كتل يقبله Notion عند إنشاء الصفحة
+
+_TYPE_LABELS = {"text": "نص", "album": "ألبوم", **{spec.attribute: spec.label for spec in MEDIA_BLOCKS}}
+
+
+def _message_tags(message) -> list:
+    """
+    الوسوم (#hashtag) في نص الرسالة أو وصفها، بدون # وبدون تكرار
+    """
+    if message.text:
+        found = message.parse_entities([MessageEntity.HASHTAG])
+    else:
+        found = message.parse_caption_entities([MessageEntity.HASHTAG])
+    tags = []
+    for tag in found.values():
+        # Notion لا يقبل الفاصلة في أسماء خيارات multi_select
+        name = tag.lstrip("#").replace(",", "")
+        if name and name not in tags:
+            tags.append(name)
+    return tags
+
+
+def _sender_name(message) -> str:
+    if message.from_user:
+        return message.from_user.full_name
+    if message.sender_chat:
+        return message.sender_chat.title or ""
+    return ""
+
+
+def build_row(message, kind: str, content: list, message_link: str) -> dict:
+    """
+    بيانات صف الرسالة كما تُحفظ في الصندوق الصادر (لا تحتاج إلى أي طلب)
+
+    Args:
+        message: الرسالة، أو الجزء الذي يحمل الوصف في الألبوم
+        kind (str): نوع الرسالة كما يعيده build_content_blocks، أو "album"
+        content (list): كتل المحتوى التي تُكتب داخل الصف
+        message_link (str): رابط الرسالة في تيليجرام
+    """
+    label = _TYPE_LABELS.get(kind, kind)
+    text = (message.text or message.caption or "").strip()
+    title = text.split("\n", 1)[0][:TITLE_LENGTH] if text else label
+    return {
+        "title": title,
+        "sender": _sender_name(message),
+        "date": message.date.isoformat() if message.date else None,
+        "link": message_link,
+        "type": label,
+        "tags": _message_tags(message),
+        "children": content[:MAX_CHILDREN],
+    }
+
+
+def _rich_text(content: str) -> list:
+    return [{"type": "text", "text": {"content": content}}] if content else []
+
+
+class DatabaseRows:
+    """
+    إنشاء صفوف الرسائل في قواعد البيانات المرتبطة
+    مخطط كل قاعدة بيانات يُقرأ مرة واحدة ويُحفظ في الذاكرة، وتُضاف الخصائص الناقصة عند أول استخدام
+    """
+
+    def __init__(self, notion, dispatcher, prepare=None):
+        """
+        Args:
+            notion: عميل Notion غير المتزامن
+            dispatcher: المنظم الذي تمر عبره كل الطلبات
+            prepare: دالة غير متزامنة اختيارية تجهز كتل المحتوى قبل الإرسال (مثل رفع الملفات)
+        """
+        self.notion = notion
+        self.dispatcher = dispatcher
+        self.prepare = prepare
+        self._schemas = {}  # database_id -> {"title": اسم خاصية العنوان، field: اسم الخاصية أو None}
+        self._locks = {}
+
+    async def _schema(self, database_id: str) -> dict:
+        schema = self._schemas.get(database_id)
+        if schema is not None:
+            return schema
+
+        lock = self._locks.setdefault(database_id, asyncio.Lock())
+        async with lock:
+            # ربما قرأه صف آخر أثناء الانتظار
+            if database_id in self._schemas:
+                return self._schemas[database_id]
+
+            database = await self.dispatcher.call(self.notion.databases.retrieve, database_id)
+            properties = database["properties"]
+            schema = {"title": next(name for name, prop in properties.items() if prop["type"] == "title")}
+            missing = {}
+            for field, (name, prop_type) in ROW_PROPERTIES.items():
+                if name not in properties:
+                    missing[name] = {prop_type: {}}
+                    schema[field] = name
+                elif properties[name]["type"] == prop_type:
+                    schema[field] = name
+                else:
+                    # خاصية بنفس الاسم ونوع مختلف أنشأها المستخدم، نتركها كما هي
+                    logger.warning("الخاصية %s في قاعدة البيانات %s من نوع مختلف، لن تُملأ", name, database_id)
+                    schema[field] = None
+
+            if missing:
+                await self.dispatcher.call(self.notion.databases.update, database_id, properties=missing)
+                logger.info("تمت إضافة الخصائص %s إلى قاعدة البيانات %s", ", ".join(missing), database_id)
+            self._schemas[database_id] = schema
+            return schema
+
+    def _properties(self, schema: dict, row: dict) -> dict:
+        properties = {schema["title"]: {"title": _rich_text(row["title"])}}
+        values = {
+            "sender": {"rich_text": _rich_text(row["sender"])},
+            "date": {"date": {"start": row["date"]}} if row["date"] else None,
+            "link": {"url": row["link"]},
+            "type": {"select": {"name": row["type"]}},
+            "tags": {"multi_select": [{"name": tag} for tag in row["tags"]]},
+        }
+        for field, value in values.items():
+            if schema.get(field) and value is not None:
+                properties[schema[field]] = value
+        return properties
+
+    async def create(self, database_id: str, row: dict):
+        """
+        إنشاء صف الرسالة في قاعدة البيانات
+        """
+        children = row["children"]
+        if self.prepare is not None:
+            children = await self.prepare(children)
+
+        for attempt in range(2):
+            schema = await self._schema(database_id)
+            try:
+                return await self.dispatcher.call(
+                    self.notion.pages.create,
+                    parent={"database_id": database_id},
+                    properties=self._properties(schema, row),
+                    children=children,
+                )
+            except APIResponseError as e:
+                # ربما عدّل المستخدم خصائص قاعدة البيانات، نعيد قراءتها مرة واحدة
+                if e.code != APIErrorCode.ValidationError or attempt:
+                    raise
+                logger.warning("تعذر إنشاء صف في قاعدة البيانات %s، إعادة قراءة خصائصها: %s", database_id, e)
+                self._schemas.pop(database_id, None)
@@ -0,0 +1,284 @@
+# وضع الملخص: رسائل التوبيكات كثيرة الرسائل تُجمع محلياً وتُكتب كل ساعة أو يوم
+# كعنوان واحد وقائمة نقطية بالرسائل وروابطها، في إدخال واحد في الصندوق الصادر بدل إدخال لكل رسالة
+import asyncio
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from blocks import find_media, link_item, text_item
+from rich_text import NOTION_RICH_TEXT_LIMIT, inline_rich_text
+
+logger = logging.getLogger(__name__)
+
+HOURLY = "hourly"
+DAILY = "daily"
+
+CHECK_INTERVAL = 60.0  # مدة فحص الملخصات المستحقة بالثواني
+
+
+def parse_period(text: str):
+    """
+    تحويل نص الأمر إلى فترة الملخص: hourly أو daily، وoff للإلغاء
+
+    Returns:
+        str: الفترة، أو None للإلغاء
+
+    Raises:
+        ValueError: إذا كانت الفترة غير صحيحة
+    """
+    text = text.strip().lower()
+    if text in ("off", "none"):
+        return None
+    if text in (HOURLY, DAILY):
+        return text
+    raise ValueError(f"فترة ملخص غير صحيحة: {text}")
+
+
+def period_start(period: Optional[str], date: datetime, tz=timezone.utc) -> datetime:
+    """
+    بداية الفترة التي تقع فيها date حسب المنطقة الزمنية
+    """
+    local = date.astimezone(tz)
+    if period == DAILY:
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def digest_title(period: Optional[str], start: datetime) -> str:
+    """
+    عنوان ملخص الفترة التي تبدأ بـ start
+    """
+    if period == DAILY:
+        return f"ملخص {start:%Y-%m-%d}"
+    end = start + timedelta(hours=1)
+    return f"ملخص {start:%Y-%m-%d %H:%M}–{end:%H:%M}"
+
+
+def message_summary(message) -> list:
+    """
+    سطر الرسالة في الملخص كعناصر rich_text: النص بتنسيقه، أو نوع الوسائط مع وصفها
+    """
+    if message.text:
+        return inline_rich_text(message.text, message.entities)
+    spec, _ = find_media(message)
+    label = spec.label if spec else "رسالة"
+    if not message.caption:
+        return [text_item(label)]
+    return [text_item(f"{label}: ")] + inline_rich_text(message.caption, message.caption_entities, NOTION_RICH_TEXT_LIMIT - 1)
+
+
+def album_summary(messages: list) -> list:
+    """
+    سطر الألبوم في الملخص: عدد عناصره ووصفه إن وجد
+    """
+    label = f"ألبوم ({len(messages)} عناصر)"
+    captioned = next((message for message in messages if message.caption), None)
+    if captioned is None:
+        return [text_item(label)]
+    return [text_item(f"{label}: ")] + inline_rich_text(
+        captioned.caption, captioned.caption_entities, NOTION_RICH_TEXT_LIMIT - 1
+    )
+
+
+class DigestItem(NamedTuple):
+    """
+    رسالة تنتظر ملخص فترتها
+    """
+    id: int
+    page_id: str
+    date: datetime
+    rich_text: list
+    link: str
+
+
+def build_digest_blocks(title: str, items: list) -> list:
+    """
+    عنوان الفترة ثم نقطة لكل رسالة تنتهي برابطها
+    """
+    blocks = [{
+        "object": "block",
+        "type": "heading_3",
+        "heading_3": {"rich_text": [text_item(title)]}
+    }]
+    for item in items:
+        # مكان لعنصرين: المسافة والرابط
+        rich_text = item.rich_text[:NOTION_RICH_TEXT_LIMIT - 2] + [text_item(" "), link_item(item.link)]
+        blocks.append({
+            "object": "block",
+            "type": "bulleted_list_item",
+            "bulleted_list_item": {"rich_text": rich_text}
+        })
+    return blocks
+
+
+class DigestBuffer:
+    """
+    رسائل التوبيكات في وضع الملخص بانتظار انتهاء فترتها، محفوظة على القرص حتى لا تضيع عند إعادة التشغيل
+    """
+
+    def __init__(self, path: str = "digest.db"):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS digest (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                page_id TEXT NOT NULL,
+                date REAL NOT NULL,
+                rich_text TEXT NOT NULL,
+                link TEXT NOT NULL,
+                UNIQUE (chat_id, message_id)
+            );
+            CREATE INDEX IF NOT EXISTS digest_topic ON digest (chat_id, thread_id, id);
+            """
+        )
+
+    def add(self, chat_id: str, thread_id: str, message_id: int, page_id: str, date: datetime,
+            rich_text: list, link: str) -> bool:
+        """
+        إضافة رسالة إلى ملخص التوبيك
+
+        Returns:
+            bool: False إذا كانت الرسالة مسجلة مسبقاً
+        """
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO digest (chat_id, thread_id, message_id, page_id, date, rich_text, link) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (chat_id, thread_id, message_id, page_id, date.timestamp(),
+             json.dumps(rich_text, ensure_ascii=False), link)
+        )
+        return cursor.rowcount == 1
+
+    def update(self, chat_id: str, message_id: int, rich_text: list) -> bool:
+        """
+        تعديل رسالة لم يُكتب ملخصها بعد
+
+        Returns:
+            bool: False إذا لم تكن الرسالة في الملخص
+        """
+        cursor = self._db.execute(
+            "UPDATE digest SET rich_text = ? WHERE chat_id = ? AND message_id = ?",
+            (json.dumps(rich_text, ensure_ascii=False), chat_id, message_id)
+        )
+        return cursor.rowcount == 1
+
+    def topics(self) -> list:
+        """
+        التوبيكات التي لديها رسائل منتظرة مع تاريخ أقدم رسالة
+
+        Returns:
+            list: قائمة (chat_id, thread_id, datetime)
+        """
+        rows = self._db.execute("SELECT chat_id, thread_id, MIN(date) FROM digest GROUP BY chat_id, thread_id")
+        return [(chat_id, thread_id, datetime.fromtimestamp(date, timezone.utc)) for chat_id, thread_id, date in rows]
+
+    def items(self, chat_id: str, thread_id: str, before: datetime = None) -> list:
+        """
+        رسائل التوبيك المنتظرة بترتيب وصولها، قبل before فقط إن حُدد
+
+        Returns:
+            list: قائمة DigestItem
+        """
+        before = float("inf") if before is None else before.timestamp()
+        rows = self._db.execute(
+            "SELECT id, page_id, date, rich_text, link FROM digest "
+            "WHERE chat_id = ? AND thread_id = ? AND date < ? ORDER BY id",
+            (chat_id, thread_id, before)
+        )
+        return [
+            DigestItem(row[0], row[1], datetime.fromtimestamp(row[2], timezone.utc), json.loads(row[3]), row[4])
+            for row in rows
+        ]
+
+    def remove(self, ids: list):
+        """
+        حذف الرسائل بعد حفظ ملخصها في الصندوق الصادر
+        """
+        if ids:
+            self._db.execute(f"DELETE FROM digest WHERE id IN ({','.join('?' * len(ids))})", ids)
+
+    def pending_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM digest").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class Digest:
+    """
+    كتابة ملخصات الفترات المنتهية إلى الصندوق الصادر
+    """
+
+    def __init__(self, buffer: DigestBuffer, store, write, tz=timezone.utc, check_interval: float = CHECK_INTERVAL):
+        """
+        Args:
+            buffer (DigestBuffer): الرسائل المنتظرة
+            store (BindingStore): مخزن الروابط الذي يحفظ فترة ملخص كل توبيك
+            write: دالة غير متزامنة (key, chat_id, thread_id, page_id, date, blocks) تحفظ الملخص في الصندوق الصادر
+            tz: المنطقة الزمنية لحدود الساعات والأيام
+            check_interval (float): مدة فحص الملخصات المستحقة بالثواني (مهمة دورية في JobQueue)
+        """
+        self.buffer = buffer
+        self.store = store
+        self.write = write
+        self.tz = tz
+        self.check_interval = check_interval
+        self._lock = asyncio.Lock()
+
+    def add(self, chat_id: str, thread_id: str, page_id: str, message, link: str, rich_text: list = None) -> bool:
+        """
+        إضافة رسالة إلى ملخص التوبيك بدل كتابتها فوراً
+        """
+        return self.buffer.add(
+            chat_id, thread_id, message.message_id, page_id, message.date,
+            message_summary(message) if rich_text is None else rich_text, link
+        )
+
+    async def flush_due(self, now: datetime = None) -> int:
+        """
+        كتابة ملخص كل فترة انتهت، ورسائل التوبيكات التي أُلغي وضع الملخص فيها
+
+        Returns:
+            int: عدد الملخصات المكتوبة
+        """
+        now = now or datetime.now(timezone.utc)
+        written = 0
+        # الفحص الدوري والإيقاف قد يتزامنان، فلا يُكتب نفس الملخص مرتين
+        async with self._lock:
+            for chat_id, thread_id, oldest in self.buffer.topics():
+                period = self.store.get_digest(chat_id, thread_id)
+                if period is None:
+                    before = None
+                else:
+                    before = period_start(period, now, self.tz)
+                    if oldest >= before:
+                        continue
+                items = self.buffer.items(chat_id, thread_id, before)
+                for start, group in self._group(period, items):
+                    await self._write(chat_id, thread_id, period, start, group)
+                    written += 1
+        return written
+
+    def _group(self, period: Optional[str], items: list) -> list:
+        """
+        تقسيم الرسائل حسب فترتها وصفحتها (إذا تأخر الفحص أكثر من فترة، أو تغير الربط)
+        """
+        groups = {}
+        for item in items:
+            groups.setdefault((period_start(period, item.date, self.tz), item.page_id), []).append(item)
+        return [(start, group) for (start, _), group in groups.items()]
+
+    async def _write(self, chat_id: str, thread_id: str, period: Optional[str], start: datetime, items: list):
+        blocks = build_digest_blocks(digest_title(period, start), items)
+        # المفتاح من آخر رسالة في الملخص: إذا توقف البوت قبل الحذف لا يتكرر الملخص عند إعادة الكتابة
+        key = f"{chat_id}:digest:{thread_id}:{items[-1].id}"
+        await self.write(key, chat_id, thread_id, items[0].page_id, items[0].date, blocks)
+        self.buffer.remove([item.id for item in items])
+        logger.info("تم حفظ ملخص التوبيك %s/%s (%s رسالة)", chat_id, thread_id, len(items))
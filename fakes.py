@@ -0,0 +1,430 @@
+# بدائل محلية لـ Notion وتيليجرام لتشغيل البوت والاختبارات وقياس الأداء دون شبكة أو توكنات
+# خادم Notion الوهمي يستقبل طلبات HTTP حقيقية من notion_client، فيمر كل شيء عبر نفس مسار الطلبات
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+
+from telegram import Message, Update
+
+MAX_CHILDREN = 100  # أقصى عدد كتل في طلب واحد كما في Notion
+
+_BLOCK_CHILDREN = re.compile(r"^/v1/blocks/([^/]+)/children$")
+_BLOCK = re.compile(r"^/v1/blocks/([^/]+)$")
+_DATABASE = re.compile(r"^/v1/databases/([^/]+)$")
+
+
+class NotionError(Exception):
+    """
+    خطأ يعيده الخادم الوهمي بنفس صيغة أخطاء Notion
+    """
+
+    def __init__(self, status: int, code: str, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.headers = headers or {}
+
+
+class FakeNotionServer:
+    """
+    خادم Notion وهمي داخل نفس العملية
+
+    يحاكي الطلبات التي يستخدمها البوت (إضافة الكتل وتعديلها وحذفها، الصفحات وقواعد البيانات، البحث)
+    مع تأخير قابل للضبط، وردود 429 عشوائية أو عند تجاوز المعدل، ورفض أكثر من 100 كتلة في الطلب
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle_probability: float = 0.0,
+                 rate_limit: float = None, retry_after: float = 0.5, seed: int = None):
+        """
+        Args:
+            latency (float): متوسط زمن الرد بالثواني
+            jitter (float): تفاوت عشوائي يضاف إلى زمن الرد (من 0 إلى jitter)
+            throttle_probability (float): نسبة الطلبات التي تُرفض بـ 429 عشوائياً
+            rate_limit (float): أقصى عدد طلبات في الثانية قبل الرد بـ 429، أو None بدون حد
+            retry_after (float): قيمة ترويسة Retry-After في ردود 429
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_probability = throttle_probability
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.pages = {}  # page_id -> {"object", "title", "parent", "children": [block_id]}
+        self.blocks = {}  # block_id -> الكتلة كما أرسلت مع id
+        self.requests = Counter()  # "METHOD path-pattern" -> العدد
+        self.throttled = 0
+        self.tokens = Counter()  # توكن الـ integration -> عدد الطلبات التي حملته
+        self.invalid_tokens = set()  # توكنات يُرد عليها بـ 401
+        self.on_append = None  # دالة اختيارية (page_id, children, timestamp) تُستدعى بعد كل إضافة
+        self._window = []  # أوقات الطلبات خلال آخر ثانية لحد المعدل
+        self._server = None
+        self._thread = None
+        self._loop = None
+        self.base_url = None
+
+    # --- البيانات ---
+
+    def add_page(self, title: str = "صفحة", object_type: str = "page", page_id: str = None) -> str:
+        """
+        إضافة صفحة أو قاعدة بيانات يستطيع البوت الوصول إليها
+        """
+        page_id = page_id or str(uuid.uuid4())
+        self.pages[page_id] = {
+            "object": object_type,
+            "title": title,
+            "parent": None,
+            "children": [],
+            "properties": {"Name": {"id": "title", "type": "title", "title": {}}} if object_type == "database" else {},
+            "rows": [],
+            "last_edited_time": _now(),
+        }
+        return page_id
+
+    def children(self, page_id: str) -> list:
+        """
+        كتل الصفحة الحالية (غير المحذوفة) بالترتيب
+        """
+        return [self.blocks[block_id] for block_id in self.pages[page_id]["children"]
+                if not self.blocks[block_id].get("archived")]
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    # --- التشغيل ---
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        تشغيل الخادم في حلقة الأحداث الحالية
+
+        Returns:
+            str: الرابط الذي يُمرر إلى AsyncClient كـ base_url
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self) -> str:
+        """
+        تشغيل الخادم في خيط منفصل بحلقة أحداث خاصة، حتى يبقى متاحاً لأكثر من حلقة أحداث في الاختبارات
+        """
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-notion", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base_url
+
+    def stop_thread(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = json.loads(await reader.readexactly(length)) if length else None
+
+                token = headers.get("authorization", "").removeprefix("Bearer ")
+                status, payload, extra = await self._respond(method, target.split("?")[0], body, token)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                        "Content-Type: application/json", f"Content-Length: {len(data)}"]
+                head.extend(f"{name}: {value}" for name, value in extra.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, path: str, body, token: str = ""):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            self.tokens[token] += 1
+            if token in self.invalid_tokens:
+                raise NotionError(401, "unauthorized", "API token is invalid.")
+            self._check_rate()
+            return 200, self._route(method, path, body or {}), {}
+        except NotionError as e:
+            error = {"object": "error", "status": e.status, "code": e.code, "message": str(e)}
+            return e.status, error, e.headers
+
+    def _check_rate(self):
+        now = time.monotonic()
+        limited = False
+        if self.rate_limit is not None:
+            self._window = [t for t in self._window if now - t < 1.0]
+            limited = len(self._window) >= self.rate_limit
+            if not limited:
+                self._window.append(now)
+        if limited or (self.throttle_probability and self.random.random() < self.throttle_probability):
+            self.throttled += 1
+            raise NotionError(429, "rate_limited", "Rate limited", {"Retry-After": str(self.retry_after)})
+
+    def _route(self, method: str, path: str, body: dict):
+        match = _BLOCK_CHILDREN.match(path)
+        if match and method == "PATCH":
+            self.requests["PATCH /v1/blocks/{id}/children"] += 1
+            return self._append(match.group(1), body)
+        match = _BLOCK.match(path)
+        if match and method in ("PATCH", "DELETE"):
+            self.requests[f"{method} /v1/blocks/{{id}}"] += 1
+            return self._update_block(match.group(1), body, archive=method == "DELETE")
+        match = _DATABASE.match(path)
+        if match and method in ("GET", "PATCH"):
+            self.requests[f"{method} /v1/databases/{{id}}"] += 1
+            return self._database(match.group(1), body if method == "PATCH" else None)
+        if path == "/v1/pages" and method == "POST":
+            self.requests["POST /v1/pages"] += 1
+            return self._create_page(body)
+        if path == "/v1/search" and method == "POST":
+            self.requests["POST /v1/search"] += 1
+            return self._search(body)
+        if path == "/v1/users/me" and method == "GET":
+            self.requests["GET /v1/users/me"] += 1
+            return {"object": "user", "id": "bot", "type": "bot", "bot": {}}
+        raise NotionError(400, "invalid_request_url", f"Invalid request URL: {method} {path}")
+
+    def _store_blocks(self, children: list) -> list:
+        if len(children) > MAX_CHILDREN:
+            raise NotionError(
+                400, "validation_error", f"body.children.length should be ≤ `{MAX_CHILDREN}`, instead was `{len(children)}`."
+            )
+        created = []
+        for child in children:
+            block_type = child.get("type")
+            body = dict(child.get(block_type) or {})
+            nested = body.pop("children", None)
+            block = {"object": "block", "id": str(uuid.uuid4()), "type": block_type, block_type: body,
+                     "has_children": bool(nested), "archived": False}
+            if nested:
+                block["children"] = [item["id"] for item in self._store_blocks(nested)]
+            self.blocks[block["id"]] = block
+            created.append(block)
+        return created
+
+    def _append(self, parent_id: str, body: dict) -> dict:
+        children = body.get("children") or []
+        created = self._store_blocks(children)
+        ids = [block["id"] for block in created]
+        if parent_id in self.pages:
+            order = self.pages[parent_id]["children"]
+        elif parent_id in self.blocks:
+            order = self.blocks[parent_id].setdefault("children", [])
+        else:
+            raise NotionError(404, "object_not_found", f"Could not find block with ID: {parent_id}.")
+        after = body.get("after")
+        if after and after in order:
+            position = order.index(after) + 1
+            order[position:position] = ids
+        else:
+            order.extend(ids)
+        if self.on_append is not None:
+            self.on_append(parent_id, children, time.monotonic())
+        return {"object": "list", "results": created, "has_more": False, "next_cursor": None}
+
+    def _update_block(self, block_id: str, body: dict, archive: bool) -> dict:
+        block = self.blocks.get(block_id)
+        if block is None or block.get("archived"):
+            raise NotionError(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+        if archive:
+            block["archived"] = True
+        else:
+            block_type = block["type"]
+            if block_type in body:
+                block[block_type].update(body[block_type])
+        return block
+
+    def _create_page(self, body: dict) -> dict:
+        parent = body.get("parent") or {}
+        parent_id = parent.get("page_id") or parent.get("database_id")
+        if parent_id not in self.pages:
+            raise NotionError(404, "object_not_found", f"Could not find page with ID: {parent_id}.")
+        created = self._store_blocks(body.get("children") or [])
+        properties = body.get("properties") or {}
+        title = "".join(
+            part.get("text", {}).get("content", "")
+            for prop in properties.values() if "title" in prop for part in prop["title"]
+        )
+        page_id = self.add_page(title)
+        self.pages[page_id].update(parent=parent_id, children=[block["id"] for block in created],
+                                   properties=properties)
+        if parent.get("database_id"):
+            self.pages[parent_id]["rows"].append(page_id)
+        return {"object": "page", "id": page_id, "properties": properties}
+
+    def _database(self, database_id: str, update) -> dict:
+        database = self.pages.get(database_id)
+        if database is None or database["object"] != "database":
+            raise NotionError(404, "object_not_found", f"Could not find database with ID: {database_id}.")
+        if update:
+            for name, prop in (update.get("properties") or {}).items():
+                database["properties"][name] = {"id": name, "type": next(iter(prop)), **prop}
+        return {"object": "database", "id": database_id, "title": _title(database["title"]),
+                "properties": database["properties"]}
+
+    def _search(self, body: dict) -> dict:
+        ordered = sorted(
+            (item for item in self.pages.items() if item[1]["parent"] is None),
+            key=lambda item: item[1]["last_edited_time"], reverse=True
+        )
+        start = int(body.get("start_cursor") or 0)
+        size = int(body.get("page_size") or 100)
+        results = []
+        for page_id, page in ordered[start:start + size]:
+            result = {"object": page["object"], "id": page_id, "last_edited_time": page["last_edited_time"]}
+            if page["object"] == "database":
+                result.update(title=_title(page["title"]), properties=page["properties"])
+            else:
+                result["properties"] = {"title": {"type": "title", "title": _title(page["title"])}}
+            results.append(result)
+        more = start + size < len(ordered)
+        return {"object": "list", "results": results, "has_more": more, "next_cursor": str(start + size) if more else None}
+
+
+def _title(text: str) -> list:
+    return [{"type": "text", "plain_text": text, "text": {"content": text}}]
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+
+class FakeBot:
+    """
+    بوت تيليجرام وهمي يسجل الرسائل والتفاعلات المرسلة بدل إرسالها
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []  # (chat_id, text, kwargs)
+        self.reactions = []  # (chat_id, message_id, reaction)
+        self.answers = []  # (callback_query_id, text, show_alert)
+        self.edited = []  # (chat_id, message_id, text)
+        self.admins = set()  # معرفات المشرفين في كل المحادثات
+        self.admin_requests = 0
+        self._ids = itertools.count(1_000_000)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((chat_id, text, kwargs))
+        return Message.de_json({
+            "message_id": next(self._ids), "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup"}, "text": text,
+        }, self)
+
+    async def set_message_reaction(self, chat_id, message_id, reaction=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.reactions.append((chat_id, message_id, reaction))
+        return True
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None, **kwargs):
+        self.answers.append((callback_query_id, text, show_alert))
+        return True
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edited.append((chat_id, message_id, text))
+        return True
+
+    async def get_chat_member(self, chat_id, user_id):
+        class _Member:
+            status = "administrator" if user_id in self.admins else "member"
+        return _Member()
+
+    async def get_chat_administrators(self, chat_id):
+        self.admin_requests += 1
+        return tuple(SimpleNamespace(status="administrator", user=SimpleNamespace(id=user_id))
+                     for user_id in self.admins)
+
+
+class UpdateGenerator:
+    """
+    توليد تحديثات تيليجرام اصطناعية موزعة على عدة توبيكات في مجموعة واحدة
+    """
+
+    def __init__(self, topics: int, chat_id: int = -1001000000001, bot=None, media_ratio: float = 0.0,
+                 seed: int = None):
+        """
+        Args:
+            topics (int): عدد التوبيكات
+            chat_id (int): معرف المجموعة
+            bot: البوت الذي تُربط به الرسائل (للردود)، مثل FakeBot
+            media_ratio (float): نسبة رسائل الصور بين الرسائل المولدة
+        """
+        self.chat_id = chat_id
+        self.thread_ids = [100 + i for i in range(topics)]
+        self.bot = bot
+        self.media_ratio = media_ratio
+        self.random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._topics = itertools.cycle(self.thread_ids)
+
+    def message(self, thread_id: int = None, text: str = None, **fields) -> Message:
+        """
+        رسالة اصطناعية في توبيك (أو التوبيك التالي بالتناوب)
+        """
+        message_id = next(self._message_ids)
+        thread_id = thread_id if thread_id is not None else next(self._topics)
+        data = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": self.chat_id, "type": "supergroup", "title": "Benchmark", "is_forum": True},
+            "message_thread_id": thread_id,
+            "is_topic_message": True,
+            "from": {"id": 1000 + thread_id, "is_bot": False, "first_name": "مستخدم", "username": "user"},
+        }
+        if fields:
+            data.update(fields)
+        elif self.media_ratio and self.random.random() < self.media_ratio:
+            data["photo"] = [{"file_id": f"photo-{message_id}", "file_unique_id": f"u-{message_id}",
+                              "width": 800, "height": 600}]
+            data["caption"] = text if text is not None else f"صورة رقم {message_id}"
+        else:
+            data["text"] = text if text is not None else f"رسالة اختبار رقم {message_id}"
+        return Message.de_json(data, self.bot)
+
+    def update(self, thread_id: int = None, text: str = None, **fields) -> Update:
+        return Update(next(self._update_ids), message=self.message(thread_id, text, **fields))
@@ -0,0 +1,114 @@
+# إعداد السجلات: نص عادي أو JSON سطر لكل حدث، مع معرف التحديث في كل سطر
+# الرسائل تُنسق بأسلوب % عند الكتابة فقط، فلا تكلف السطور المستبعدة (مثل DEBUG) أي تنسيق
+import json
+import logging
+import random
+import sys
+from contextvars import ContextVar
+
+# معرف التحديث الجاري في تيليجرام، يُضاف إلى كل سطر سجل أثناء معالجته
+# كل تحديث يُعالج في مهمة منفصلة، فلا تختلط المعرفات بين التحديثات المتزامنة
+correlation_id = ContextVar("correlation_id", default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def set_correlation_id(value) -> None:
+    """
+    تحديد معرف الارتباط لباقي معالجة التحديث الحالي
+    """
+    correlation_id.set(None if value is None else str(value))
+
+
+def redact(text) -> str:
+    """
+    استبدال نص الرسالة بطوله فقط حتى لا يظهر محتوى المستخدمين في السجلات
+    """
+    if text is None:
+        return "<none>"
+    return f"<{len(text)} chars>"
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    إضافة معرف التحديث الحالي إلى السجل
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    الاحتفاظ بنسبة فقط من سطور DEBUG لكل رسالة، والسطور الأعلى تمر دائماً
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    سطر JSON واحد لكل سجل، بحقول ثابتة تسهل البحث والتحليل
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        cid = getattr(record, "correlation_id", None)
+        if cid is not None:
+            entry["update_id"] = cid
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        cid = getattr(record, "correlation_id", None)
+        return f"{line} [update {cid}]" if cid is not None else line
+
+
+def setup_logging(level: str = "INFO", json_format: bool = False, debug_sample_rate: float = 1.0):
+    """
+    إعداد السجل الرئيسي للكتابة إلى stdout
+
+    Args:
+        level (str): أقل مستوى يُكتب، مثل INFO أو DEBUG
+        json_format (bool): كتابة سطر JSON لكل سجل بدل النص العادي
+        debug_sample_rate (float): نسبة سطور DEBUG المكتوبة من 0 إلى 1
+    """
+    # الكتابة بترميز UTF-8 حتى تظهر الرسائل العربية على كل الأنظمة، دون استبدال stdout نفسه
+    reconfigure = getattr(sys.stdout, "reconfigure", None)
+    if reconfigure is not None:
+        try:
+            reconfigure(encoding="utf-8")
+        except (ValueError, OSError):
+            pass
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else _TextFormatter(TEXT_FORMAT))
+    handler.addFilter(CorrelationFilter())
+    handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    # سطور httpx لكل طلب كثيرة ولا تضيف شيئاً لمقاييس الطلبات
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("telegram").setLevel(logging.INFO)
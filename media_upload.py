@@ -0,0 +1,265 @@
+# رفع ملفات تيليجرام إلى Notion ككتل أصلية (image/video/audio/file)
+# الملف يُنقل من تيليجرام إلى واجهة file_uploads في Notion كتدفق دون تحميله كاملاً في الذاكرة
+import asyncio
+import logging
+import mimetypes
+import posixpath
+import uuid
+from collections import OrderedDict
+
+import httpx
+from notion_client.errors import HTTPResponseError
+
+from blocks import FILE_REFERENCE, create_file_block
+
+logger = logging.getLogger(__name__)
+
+NOTION_BASE_URL = "https://api.notion.com"
+NOTION_VERSION = "2022-06-28"
+
+# أكبر حجم يقبله Notion في طلب رفع واحد، وما فوقه يُرفع على أجزاء
+SINGLE_PART_LIMIT = 20 * 1024 * 1024
+PART_SIZE = 10 * 1024 * 1024
+
+# الأسماء الافتراضية للملفات التي لا يرسل تيليجرام اسمها
+DEFAULT_FILE_NAMES = {
+    "image": "photo.jpg",
+    "video": "video.mp4",
+    "audio": "audio.ogg",
+    "file": "file.bin",
+}
+
+
+class MediaUploader:
+    """
+    تحويل مراجع ملفات تيليجرام في الكتل إلى كتل Notion أصلية:
+    - عدد محدود من عمليات التنزيل/الرفع المتزامنة
+    - حد أقصى لحجم الملف، وما فوقه يبقى رابطاً للرسالة
+    - عدم رفع نفس الملف مرتين (حسب file_unique_id)
+    """
+
+    def __init__(self, notion, dispatcher, notion_token: str, enabled: bool = False,
+                 max_size: int = SINGLE_PART_LIMIT, concurrency: int = 3, cache_size: int = 10000,
+                 base_url: str = NOTION_BASE_URL):
+        """
+        Args:
+            base_url (str): عنوان Notion API نفسه الذي يستخدمه العميل (NOTION_BASE_URL)،
+                لأن إرسال الملف يتم بطلب HTTP مباشر خارج العميل
+        """
+        self.notion = notion
+        self.dispatcher = dispatcher
+        self.enabled = enabled
+        self.api_url = f"{base_url.rstrip('/')}/v1"
+        self.max_size = max_size
+        self.cache_size = cache_size
+        self._notion_headers = {
+            "Authorization": f"Bearer {notion_token}",
+            "Notion-Version": NOTION_VERSION,
+        }
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._uploads = OrderedDict()  # file_unique_id -> file_upload_id
+        self._inflight = {}  # file_unique_id -> Future
+        self._http = None
+        self.bot = None
+
+    def start(self, bot, http: httpx.AsyncClient = None):
+        """
+        تجهيز الرافع بعد تشغيل البوت
+        """
+        self.bot = bot
+        if http is not None:
+            self._http = http
+        elif self.enabled and self._http is None:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def resolve_blocks(self, blocks: list) -> list:
+        """
+        استبدال مراجع الملفات في قائمة الكتل بكتل Notion جاهزة للإرسال
+        """
+        if not any(_has_reference(block) for block in blocks):
+            return blocks
+        return list(await asyncio.gather(*(self._resolve(block) for block in blocks)))
+
+    async def _resolve(self, block: dict) -> dict:
+        if block.get("type") != FILE_REFERENCE:
+            # الكتل المتداخلة مثل toggle الألبوم تحمل مراجعها داخل children
+            body = block.get(block.get("type"))
+            if isinstance(body, dict) and body.get("children"):
+                return {**block, block["type"]: {**body, "children": await self.resolve_blocks(body["children"])}}
+            return block
+        if not self.enabled or self.bot is None:
+            return block["fallback"]
+
+        reference = block[FILE_REFERENCE]
+        file_size = reference.get("file_size")
+        if file_size and file_size > self.max_size:
+            logger.info("الملف أكبر من الحد المسموح (%s بايت)، سيتم حفظ الرابط فقط", file_size)
+            return block["fallback"]
+
+        try:
+            file_upload_id = await self._upload_once(reference)
+        except Exception as e:
+            logger.error("خطأ في رفع الملف %s إلى Notion: %s", reference['file_unique_id'], e)
+            return block["fallback"]
+        return create_file_block(block, file_upload_id)
+
+    async def _upload_once(self, reference: dict) -> str:
+        """
+        رفع الملف أو إعادة استخدام رفع سابق لنفس الملف
+        """
+        key = reference["file_unique_id"]
+        if key in self._uploads:
+            self._uploads.move_to_end(key)
+            return self._uploads[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self._semaphore:
+                file_upload_id = await self._upload(reference)
+            self._uploads[key] = file_upload_id
+            if len(self._uploads) > self.cache_size:
+                self._uploads.popitem(last=False)
+            future.set_result(file_upload_id)
+            return file_upload_id
+        except Exception as e:
+            future.set_exception(e)
+            # نتجنب تحذير "exception was never retrieved" إذا لم ينتظر أحد هذا الرفع
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _upload(self, reference: dict) -> str:
+        """
+        تنزيل الملف من تيليجرام ورفعه إلى Notion جزءاً بجزء
+        """
+        telegram_file = await self.bot.get_file(reference["file_id"])
+        file_size = telegram_file.file_size or reference.get("file_size")
+        if not file_size:
+            raise ValueError("حجم الملف غير معروف")
+        if file_size > self.max_size:
+            raise ValueError(f"الملف أكبر من الحد المسموح ({file_size} بايت)")
+
+        file_name = (
+            reference.get("file_name")
+            or posixpath.basename(telegram_file.file_path or "")
+            or DEFAULT_FILE_NAMES[reference["notion_type"]]
+        )
+        mime_type = (
+            reference.get("mime_type")
+            or mimetypes.guess_type(file_name)[0]
+            or "application/octet-stream"
+        )
+
+        parts = 1 if file_size <= SINGLE_PART_LIMIT else -(-file_size // PART_SIZE)
+        body = {"filename": file_name, "content_type": mime_type}
+        if parts == 1:
+            body["mode"] = "single_part"
+        else:
+            body.update({"mode": "multi_part", "number_of_parts": parts})
+        file_upload = await self.dispatcher.call(self.notion.request, path="file_uploads", method="POST", body=body)
+        file_upload_id = file_upload["id"]
+
+        async with self._http.stream("GET", telegram_file.file_path) as download:
+            download.raise_for_status()
+            reader = _ExactReader(download.aiter_bytes())
+            remaining = file_size
+            for part_number in range(1, parts + 1):
+                size = min(remaining, SINGLE_PART_LIMIT if parts == 1 else PART_SIZE)
+                await self._send_part(file_upload_id, file_name, mime_type, reader, size,
+                                      part_number if parts > 1 else None)
+                remaining -= size
+
+        if parts > 1:
+            await self.dispatcher.call(
+                self.notion.request, path=f"file_uploads/{file_upload_id}/complete", method="POST", body={}
+            )
+
+        logger.info("تم رفع الملف %s (%s بايت) إلى Notion", file_name, file_size)
+        return file_upload_id
+
+    async def _send_part(self, file_upload_id: str, file_name: str, mime_type: str,
+                         reader, size: int, part_number):
+        """
+        إرسال جزء من الملف كـ multipart/form-data مع طول معروف مسبقاً
+        حتى تمر البيانات من التنزيل إلى الرفع مباشرة
+        """
+        boundary = uuid.uuid4().hex
+        safe_name = file_name.replace('"', "'")
+        head = b""
+        if part_number is not None:
+            head += (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="part_number"\r\n\r\n'
+                f'{part_number}\r\n'
+            ).encode()
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+            f'Content-Type: {mime_type}\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+
+        async def content():
+            yield head
+            async for chunk in reader.read(size):
+                yield chunk
+            yield tail
+
+        # الطلبات المتدفقة لا يمكن إعادتها، لذلك نستخدم الدلو لتنظيم المعدل فقط
+        await self.dispatcher.bucket.acquire()
+        response = await self._http.post(
+            f"{self.api_url}/file_uploads/{file_upload_id}/send",
+            content=content(),
+            headers={
+                **self._notion_headers,
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Content-Length": str(len(head) + size + len(tail)),
+            },
+        )
+        if response.is_error:
+            raise HTTPResponseError(response)
+
+
+def _has_reference(block: dict) -> bool:
+    """
+    هل تحتوي الكتلة أو أبناؤها على مرجع ملف لم يُرفع بعد
+    """
+    if block.get("type") == FILE_REFERENCE:
+        return True
+    body = block.get(block.get("type"))
+    return isinstance(body, dict) and any(_has_reference(child) for child in body.get("children", ()))
+
+
+class _ExactReader:
+    """
+    قراءة عدد محدد من البايتات من تدفق التنزيل مع الاحتفاظ بالباقي للجزء التالي
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._leftover = b""
+
+    async def read(self, size: int):
+        remaining = size
+        if self._leftover:
+            chunk, self._leftover = self._leftover[:remaining], self._leftover[remaining:]
+            remaining -= len(chunk)
+            yield chunk
+        while remaining > 0:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                raise ValueError("انتهى الملف قبل الحجم المتوقع")
+            if len(chunk) > remaining:
+                chunk, self._leftover = chunk[:remaining], chunk[remaining:]
+            remaining -= len(chunk)
+            yield chunk
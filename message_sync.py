@@ -0,0 +1,126 @@
+# مزامنة تعديل الرسائل وحذفها مع كتلها في Notion
+# التعديلات والحذف تمر عبر الصندوق الصادر مثل الرسائل الجديدة، فتُنفذ بعد إضافة الرسالة الأصلية وبترتيبها
+import logging
+
+from notion_client.errors import APIErrorCode, APIResponseError
+
+from block_index import BlockIndex, IndexedMessage
+from blocks import EMPTY_PARAGRAPH, FILE_REFERENCE
+
+logger = logging.getLogger(__name__)
+
+# أنواع عمليات الصندوق الصادر
+EDIT = "edit"  # تعديل كتل رسالة: {"target": مفتاح الرسالة، "blocks": كتل المحتوى الجديدة}
+ARCHIVE = "archive"  # حذف كتل رسالة: {"target": مفتاح الرسالة}
+
+
+def created_block_ids(response: dict, count: int):
+    """
+    معرفات الكتل التي أنشأها blocks.children.append بنفس ترتيب الإرسال
+
+    Returns:
+        list: المعرفات، أو None إذا لم يطابق عددها عدد الكتل المرسلة
+    """
+    ids = [block["id"] for block in (response or {}).get("results", [])]
+    return ids if len(ids) == count else None
+
+
+class MessageSync:
+    """
+    تسجيل كتل كل رسالة بعد إرسالها، وتنفيذ عمليات التعديل والحذف عليها
+    """
+
+    def __init__(self, notion, dispatcher, index: BlockIndex):
+        self.notion = notion
+        self.dispatcher = dispatcher
+        self.index = index
+
+    def record(self, message_key: str, page_id: str, blocks: list, block_ids: list):
+        """
+        حفظ معرفات كتل الرسالة في الفهرس بعد إضافتها إلى Notion
+        """
+        if not block_ids or None in block_ids:
+            return
+        content = []
+        padding = []
+        for block, block_id in zip(blocks, block_ids):
+            if block == EMPTY_PARAGRAPH:
+                padding.append(block_id)
+            else:
+                content.append([block_id, block["type"]])
+        self.index.put(message_key, IndexedMessage(page_id, content, padding))
+
+    async def apply(self, page_id: str, kind: str, payload: dict):
+        """
+        تنفيذ عملية تعديل أو حذف من الصندوق الصادر
+        """
+        target = payload["target"]
+        entry = self.index.get(target)
+        if entry is None:
+            # الرسالة حُفظت قبل تفعيل الفهرس أو لم تُحفظ أصلاً
+            logger.info("الرسالة %s غير موجودة في فهرس الكتل، تم تجاهل العملية", target)
+            return
+        if kind == ARCHIVE:
+            await self._archive([block_id for block_id, _ in entry.content] + entry.padding)
+            self.index.remove(target)
+            logger.info("تم حذف الرسالة %s من Notion", target)
+        elif kind == EDIT:
+            await self._edit(target, entry, payload["blocks"])
+            logger.info("تم تعديل الرسالة %s في Notion", target)
+        else:
+            raise ValueError(f"عملية غير معروفة: {kind}")
+
+    async def _edit(self, target: str, entry: IndexedMessage, blocks: list):
+        """
+        تعديل الكتل في مكانها إذا بقيت أنواعها كما هي، وإلا إضافة الكتل الجديدة بعد القديمة وحذف القديمة
+        """
+        old_types = [block_type for _, block_type in entry.content]
+        updates = [
+            _edit_block(block, old_types[i] if i < len(old_types) else None)
+            for i, block in enumerate(blocks)
+        ]
+
+        if [block["type"] for block in updates] == old_types:
+            for (block_id, block_type), block in zip(entry.content, updates):
+                body = {key: value for key, value in block[block_type].items() if key != "children"}
+                await self.dispatcher.call(self.notion.blocks.update, block_id, **{block_type: body})
+            return
+
+        # لا يمكن تغيير نوع كتلة موجودة، فنضع المحتوى الجديد مكان القديم
+        blocks = [block["fallback"] if block["type"] == FILE_REFERENCE else block for block in blocks]
+        anchors = [block_id for block_id, _ in entry.content] or entry.padding[:1]
+        position = {"after": anchors[-1]} if anchors else {}
+        response = await self.dispatcher.call(
+            self.notion.blocks.children.append, entry.page_id, children=blocks, **position
+        )
+
+        # نحدّث الفهرس قبل حذف الكتل القديمة حتى لا تُضاف الكتل الجديدة مرتين إذا أعيدت المحاولة
+        block_ids = created_block_ids(response, len(blocks))
+        if block_ids is None:
+            self.index.remove(target)
+        else:
+            content = [[block_id, block["type"]] for block_id, block in zip(block_ids, blocks)]
+            self.index.put(target, IndexedMessage(entry.page_id, content, entry.padding))
+        await self._archive([block_id for block_id, _ in entry.content])
+
+    async def _archive(self, block_ids: list):
+        for block_id in block_ids:
+            try:
+                await self.dispatcher.call(self.notion.blocks.delete, block_id)
+            except APIResponseError as e:
+                # الكتلة حُذفت يدوياً من Notion
+                if e.code != APIErrorCode.ObjectNotFound:
+                    raise
+
+
+def _edit_block(block: dict, old_type):
+    """
+    تجهيز كتلة المحتوى الجديدة للتعديل:
+    الملف المرفوع سابقاً يبقى كما هو ويُعدل وصفه فقط، وإلا تُستخدم كتلة الرابط البديلة
+    """
+    if block["type"] != FILE_REFERENCE:
+        return block
+    notion_type = block[FILE_REFERENCE]["notion_type"]
+    if old_type == notion_type:
+        return {"type": notion_type, notion_type: {"caption": block["fallback"]["paragraph"]["rich_text"]}}
+    return block["fallback"]
@@ -0,0 +1,271 @@
+# مقاييس تشغيل البوت بصيغة Prometheus النصية (تقرؤها Prometheus وأدوات OpenMetrics)
+# التسجيل في الذاكرة فقط وبدون أي طلب، ونقطة HTTP الاختيارية تعرض القيم عند الطلب
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# حدود فترات المدد بالثواني: من طلبات Notion السريعة حتى تأخر الرسائل عند تعطل Notion
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Counter(_Metric):
+    """
+    عداد متزايد فقط، مثل عدد الرسائل حسب النوع والنتيجة
+    """
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    قيمة حالية، تُحدد مباشرة أو تُقرأ من دالة عند كل طلب للمقاييس
+    """
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """
+        قراءة القيمة من دالة بدون معاملات عند عرض المقاييس
+        """
+        self.function = function
+
+    def _samples(self) -> list:
+        if self.function is not None:
+            try:
+                self._values[()] = self.function()
+            except Exception as e:
+                logger.warning("تعذر قراءة المقياس %s: %s", self.name, e)
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """
+    توزيع المدد في فترات ثابتة، تُحسب منها النسب المئوية (p50، p99) في Prometheus
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # عدد كل فترة (بدون تراكم)، ثم المجموع والعدد الكلي
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        قياس مدة تنفيذ الكتلة، بما في ذلك الكتل التي تنتهي بخطأ
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> list:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    مجموعة المقاييس المعروضة في نقطة /metrics
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"المقياس {metric.name} مسجل مسبقاً")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    نقطة HTTP بسيطة تعرض المقاييس على GET /metrics
+    """
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9090):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("نقطة المقاييس متاحة على http://%s:%s/metrics", self.host, self.port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            # نقرأ الترويسات ونتجاهلها
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+# مقاييس البوت: تُسجل دائماً (تكلفتها عملية في الذاكرة) وتُعرض فقط عند تفعيل METRICS_PORT
+registry = Registry()
+
+NOTION_REQUEST_SECONDS = registry.register(Histogram(
+    "notion_request_duration_seconds", "Notion API request latency per attempt", ("method",)
+))
+NOTION_REQUESTS = registry.register(Counter(
+    "notion_requests_total", "Notion API request attempts by outcome", ("method", "outcome")
+))
+TELEGRAM_REPLY_SECONDS = registry.register(Histogram(
+    "telegram_reply_duration_seconds", "Telegram acknowledgement send latency", ("mode",)
+))
+MESSAGE_LAG_SECONDS = registry.register(Histogram(
+    "message_to_notion_lag_seconds", "Time from receiving a message until it is written to Notion", ("kind",)
+))
+MESSAGES = registry.register(Counter(
+    "messages_total", "Messages handled by type and outcome", ("type", "outcome")
+))
+TOPIC_MESSAGES = registry.register(Counter(
+    "topic_messages_total", "Messages saved per bound topic", ("chat_id", "thread_id")
+))
+BOUND_TOPICS = registry.register(Gauge("bound_topics", "Number of topics bound to Notion"))
+OUTBOX_PENDING = registry.register(Gauge("outbox_pending", "Outbox entries waiting to be written to Notion"))
+ACK_QUEUE = registry.register(Gauge("ack_queue_size", "Acknowledgements waiting to be sent"))
+DIGEST_PENDING = registry.register(Gauge("digest_pending", "Messages waiting for their topic digest"))
+
+
+_method_names = {}
+
+
+def method_name(fn) -> str:
+    """
+    اسم طلب Notion للمقاييس، مثل notion.blocks.children.append
+    """
+    owner = getattr(fn, "__self__", None)
+    if owner is None:
+        # بعض الطلبات كائنات قابلة للاستدعاء مباشرة، مثل notion.search
+        owner, name = fn, None
+    else:
+        name = fn.__name__
+    key = (type(owner), name)
+    if key not in _method_names:
+        if hasattr(owner, "parent"):
+            path = _endpoint_path(owner)
+            _method_names[key] = f"notion.{path}.{name}" if name else f"notion.{path}"
+        else:
+            _method_names[key] = f"notion.{name or 'call'}"
+    return _method_names[key]
+
+
+def _endpoint_path(endpoint) -> str:
+    # أسماء الفئات في notion_client مثل BlocksChildrenEndpoint
+    class_name = type(endpoint).__name__.replace("Endpoint", "")
+    words = []
+    for char in class_name:
+        if char.isupper() and words:
+            words.append(".")
+        words.append(char.lower())
+    return "".join(words)
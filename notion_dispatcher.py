@@ -0,0 +1,164 @@
+# موزع مركزي لكل طلبات Notion
+# ينظم معدل الطلبات بخوارزمية دلو الرموز (token bucket) ويعيد المحاولة عند أخطاء الحد والخادم
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from metrics import NOTION_REQUEST_SECONDS, NOTION_REQUESTS, method_name
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    دلو رموز بسيط: يسمح بعدد rate من الطلبات في الثانية مع دفعة أولية بحجم capacity
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        # دفعة من رمز واحد على الأقل، وإلا لا يُسمح بأي طلب عندما يكون المعدل أقل من 1
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()  # يضمن خدمة الطلبات المنتظرة بترتيب وصولها
+
+    def pause(self, seconds: float):
+        """
+        إيقاف كل الطلبات مؤقتاً (عند استلام 429 من Notion)
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> float:
+        """
+        انتظار رمز متاح
+
+        Returns:
+            float: مدة الانتظار بالثواني
+        """
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - started
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NotionDispatcher:
+    """
+    تمرير كل طلبات Notion عبر نقطة واحدة:
+    - تنظيم المعدل بدلو رموز (حوالي 3 طلبات في الثانية لكل integration)
+    - احترام ترويسة Retry-After عند 429
+    - إعادة المحاولة عند أخطاء 5xx وانتهاء المهلة مع تأخير أسي عشوائي
+    """
+
+    def __init__(self, rate: float = 3.0, burst: float = None, max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # عدادات لمراقبة الضغط على Notion
+        self.stats = {
+            "calls": 0,  # عدد الطلبات المنفذة
+            "throttled": 0,  # عدد ردود 429
+            "retried": 0,  # عدد مرات إعادة المحاولة
+            "failed": 0,  # عدد الطلبات التي فشلت نهائياً
+        }
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        تنفيذ طلب Notion مع تنظيم المعدل وإعادة المحاولة
+
+        Args:
+            fn: دالة غير متزامنة من عميل Notion، مثل notion.blocks.children.append
+
+        Returns:
+            نتيجة الطلب كما يعيدها Notion
+        """
+        attempt = 0
+        method = method_name(fn)
+        while True:
+            await self.bucket.acquire()
+            self.stats["calls"] += 1
+            started = time.monotonic()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                NOTION_REQUEST_SECONDS.observe(time.monotonic() - started, method=method)
+                NOTION_REQUESTS.inc(method=method, outcome=_outcome(e))
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                attempt += 1
+                self.stats["retried"] += 1
+                logger.warning(
+                    "إعادة محاولة طلب Notion (%s/%s) بعد %.2f ثانية: %s", attempt, self.max_retries, delay, e
+                )
+                await asyncio.sleep(delay)
+            else:
+                NOTION_REQUEST_SECONDS.observe(time.monotonic() - started, method=method)
+                NOTION_REQUESTS.inc(method=method, outcome="ok")
+                return result
+
+    def _retry_delay(self, error: Exception, attempt: int):
+        """
+        تحديد مدة الانتظار قبل إعادة المحاولة، أو None إذا كان الخطأ غير قابل لإعادة المحاولة
+        """
+        if isinstance(error, HTTPResponseError):
+            if error.status == 429:
+                self.stats["throttled"] += 1
+                delay = _parse_retry_after(error.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self._backoff(attempt)
+                # الحد مشترك لكل الطلبات، لذلك نوقف الدلو بالكامل
+                self.bucket.pause(delay)
+                return delay
+            if error.status >= 500:
+                return self._backoff(attempt)
+            return None
+        if isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+            return self._backoff(attempt)
+        return None
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        تأخير أسي مع عشوائية كاملة لتجنب تزامن إعادة المحاولات
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def _outcome(error: Exception) -> str:
+    """
+    تصنيف الخطأ لمقياس نتائج الطلبات: throttled أو HTTP status أو timeout أو error
+    """
+    if isinstance(error, HTTPResponseError):
+        return "throttled" if error.status == 429 else str(error.status)
+    if isinstance(error, (RequestTimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    return "error"
+
+
+def _parse_retry_after(value):
+    """
+    قراءة قيمة Retry-After بالثواني
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,391 @@
+# صندوق صادر دائم على القرص (SQLite)
+# كل رسالة تُكتب هنا قبل تأكيد استلامها، ثم يرسلها المُفرِّغ إلى Notion بالترتيب
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from typing import NamedTuple
+
+from notion_client.errors import HTTPResponseError
+
+from metrics import MESSAGE_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# حالات الإدخال في الصندوق
+PENDING = 0  # بانتظار الإرسال
+DELIVERED = 1  # تم إرساله إلى Notion
+DEAD = 2  # رفضه Notion نهائياً (خطأ في محتوى الطلب)
+
+# نوع الإدخال الافتراضي: كتل تضاف إلى نهاية الصفحة
+# الأنواع الأخرى (مثل تعديل رسالة) ينفذها المُفرِّغ عبر الدالة apply بنفس ترتيب الصفحة
+APPEND = "append"
+
+RETENTION = 24 * 60 * 60  # مدة الاحتفاظ بالرسائل المرسلة لمنع تكرارها (بالثواني)
+PURGE_INTERVAL = 10 * 60  # أقل مدة بين عمليتي حذف للرسائل المرسلة القديمة (بالثواني)
+
+
+def shard_of(page_id: str, count: int) -> int:
+    """
+    رقم العامل المسؤول عن الصفحة من بين count عامل، ثابت بين العمليات والتشغيلات
+    كل رسائل الصفحة يرسلها عامل واحد فيبقى ترتيبها، والصفحات المختلفة تتوزع على العمال
+    """
+    return zlib.crc32(page_id.encode()) % count
+
+
+class OutboxEntry(NamedTuple):
+    """
+    إدخال منتظر في الصندوق
+    """
+    id: int
+    key: str
+    kind: str
+    blocks: object  # قائمة الكتل في APPEND، أو بيانات العملية في الأنواع الأخرى
+    created_at: float = 0.0  # وقت الإضافة إلى الصندوق (time.time)
+
+
+class Outbox:
+    """
+    سجل إلحاقي للرسائل المنتظرة، مرتب حسب وقت الاستلام لكل صفحة
+    """
+
+    def __init__(self, path: str = "outbox.db"):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                page_id TEXT NOT NULL,
+                blocks TEXT NOT NULL,
+                status INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_pending
+                ON outbox (page_id, id) WHERE status = 0;
+            """
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(outbox)")]
+        if "kind" not in columns:
+            self._db.execute(f"ALTER TABLE outbox ADD COLUMN kind TEXT NOT NULL DEFAULT '{APPEND}'")
+
+    def put(self, idempotency_key: str, page_id: str, blocks, kind: str = APPEND) -> bool:
+        """
+        إضافة كتل رسالة (أو عملية على رسالة سابقة) إلى الصندوق
+
+        Returns:
+            bool: False إذا كانت الرسالة مسجلة مسبقاً بنفس المفتاح
+        """
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO outbox (idempotency_key, page_id, kind, blocks, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (idempotency_key, page_id, kind, json.dumps(blocks, ensure_ascii=False), now, now)
+        )
+        return cursor.rowcount == 1
+
+    def pending_pages(self) -> list:
+        """
+        الصفحات التي لديها رسائل بانتظار الإرسال
+        """
+        rows = self._db.execute("SELECT DISTINCT page_id FROM outbox WHERE status = 0")
+        return [row[0] for row in rows]
+
+    def pending(self, page_id: str, limit: int = 100) -> list:
+        """
+        أقدم الرسائل المنتظرة لصفحة معينة
+
+        Returns:
+            list: قائمة OutboxEntry بترتيب الاستلام
+        """
+        rows = self._db.execute(
+            "SELECT id, idempotency_key, kind, blocks, created_at FROM outbox "
+            "WHERE status = 0 AND page_id = ? ORDER BY id LIMIT ?",
+            (page_id, limit)
+        )
+        return [OutboxEntry(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+
+    def pending_count(self, page_id: str = None) -> int:
+        """
+        عدد الرسائل المنتظرة لصفحة معينة، أو لكل الصفحات
+        """
+        if page_id is None:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 0").fetchone()[0]
+        row = self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 0 AND page_id = ?", (page_id,)).fetchone()
+        return row[0]
+
+    def mark_delivered(self, ids: list):
+        """
+        تعليم الرسائل كمرسلة
+        """
+        self._set_status(ids, DELIVERED, None)
+
+    def mark_dead(self, ids: list, error: str):
+        """
+        تعليم الرسائل كمرفوضة نهائياً مع حفظ سبب الرفض
+        """
+        self._set_status(ids, DEAD, error)
+
+    def record_failure(self, ids: list, error: str):
+        """
+        تسجيل محاولة فاشلة مع إبقاء الرسائل في الانتظار
+        """
+        self._db.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?",
+            [(error, time.time(), entry_id) for entry_id in ids]
+        )
+
+    def _set_status(self, ids: list, status: int, error):
+        now = time.time()
+        self._db.executemany(
+            "UPDATE outbox SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            [(status, error, now, entry_id) for entry_id in ids]
+        )
+
+    def purge_delivered(self, older_than: float):
+        """
+        حذف الرسائل المرسلة الأقدم من المدة المحددة (بالثواني) مع إبقاء مفاتيحها الحديثة لمنع التكرار
+        """
+        self._db.execute(
+            "DELETE FROM outbox WHERE status = 1 AND updated_at < ?",
+            (time.time() - older_than,)
+        )
+
+    def close(self):
+        self._db.close()
+
+
+class OutboxDrainer:
+    """
+    مُفرِّغ في الخلفية يرسل رسائل الصندوق إلى Notion بترتيبها، صفحة بصفحة
+    """
+
+    def __init__(self, outbox: Outbox, write_buffer, batch_size: int = 33,
+                 min_retry_delay: float = 1.0, max_retry_delay: float = 60.0, prepare=None,
+                 on_delivered=None, apply=None, parallel_kinds=(), owns=None, route=None,
+                 retention: float = RETENTION, purge_interval: float = PURGE_INTERVAL):
+        """
+        Args:
+            outbox (Outbox): صندوق الرسائل
+            write_buffer: مخزن الكتابة الذي يجمع الرسائل في طلبات إضافة
+            batch_size (int): عدد الرسائل المقروءة من الصندوق في كل دورة
+            prepare: دالة غير متزامنة اختيارية (page_id, blocks) تجهز كتل كل رسالة قبل إرسالها (مثل رفع الملفات)
+            on_delivered: دالة اختيارية (key, page_id, blocks, block_ids) تُستدعى بعد إضافة كل رسالة
+            apply: دالة غير متزامنة اختيارية (page_id, kind, blocks) تنفذ الإدخالات من غير نوع APPEND
+            parallel_kinds: أنواع الإدخالات المستقلة عن بعضها (مثل صفوف قاعدة البيانات)،
+                فتُنفذ الإدخالات المتتالية منها معاً بدل واحد تلو الآخر
+            owns: دالة اختيارية (page_id) -> bool تحدد الصفحات التي يرسلها هذا المُفرِّغ
+                عندما يتوزع الصندوق على عدة عمليات، وبدونها يرسل كل الصفحات
+            route: دالة غير متزامنة اختيارية (page_id, blocks) -> (page_id, blocks) تحدد الصفحة
+                التي تُضاف إليها كتل كل رسالة (مثل الصفحة الفرعية في التوبيكات المقسمة)
+            retention (float): مدة الاحتفاظ بالرسائل المرسلة بالثواني قبل حذفها
+            purge_interval (float): أقل مدة بين عمليتي حذف بالثواني
+        """
+        self.outbox = outbox
+        self.write_buffer = write_buffer
+        self.prepare = prepare
+        self.on_delivered = on_delivered
+        self.apply = apply
+        self.parallel_kinds = frozenset(parallel_kinds)
+        self.owns = owns
+        self.route = route
+        self.batch_size = batch_size
+        self.min_retry_delay = min_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._workers = {}
+        self._retry_delays = {}
+        self._timers = {}
+        self._stopping = False
+
+    def start(self):
+        """
+        إعادة تشغيل الرسائل المنتظرة من التشغيل السابق
+        """
+        self._stopping = False
+        self._purge()
+        pages = self.outbox.pending_pages()
+        if pages:
+            logger.info("إعادة إرسال رسائل منتظرة لـ %s صفحة", len(pages))
+        for page_id in pages:
+            self.notify(page_id)
+
+    def notify(self, page_id: str):
+        """
+        تنبيه المُفرِّغ بوجود رسائل جديدة لصفحة
+        """
+        if self._stopping or page_id in self._workers or page_id in self._timers:
+            return
+        if self.owns is not None and not self.owns(page_id):
+            return
+        # المُفرِّغ يخدم رسائل تحديثات كثيرة، فيعمل في سياق فارغ حتى لا يحمل معرف التحديث الذي نبّهه
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._drain(page_id))
+        self._workers[page_id] = task
+        task.add_done_callback(lambda done: self._worker_done(page_id, done))
+
+    def _worker_done(self, page_id: str, task: asyncio.Task):
+        if self._workers.get(page_id) is task:
+            del self._workers[page_id]
+
+    async def _drain(self, page_id: str):
+        """
+        إرسال رسائل الصفحة حتى يفرغ الصندوق أو يفشل الإرسال
+        """
+        isolate = False  # إرسال رسالة واحدة في كل مرة لتحديد الرسالة المرفوضة
+        while not self._stopping:
+            entries = self.outbox.pending(page_id, 1 if isolate else self.batch_size)
+            if not entries:
+                # نزيل العامل قبل العودة حتى يبدأ notify عاملاً جديداً للرسائل التي تصل بعد ذلك
+                self._retry_delays.pop(page_id, None)
+                self._workers.pop(page_id, None)
+                return
+
+            if entries[0].kind != APPEND:
+                kind = entries[0].kind
+                batch = entries[:1]
+                if kind in self.parallel_kinds:
+                    batch = list(itertools.takewhile(lambda entry: entry.kind == kind, entries))
+                errors = await asyncio.gather(*(self._apply(page_id, entry) for entry in batch))
+                errors = [error for error in errors if error is not None]
+                if errors:
+                    self._schedule_retry(page_id, errors[0])
+                    return
+                continue
+            # الإضافات المتتالية تُرسل معاً، وأي عملية أخرى تنتظر حتى تنتهي الإضافات التي قبلها
+            for count, entry in enumerate(entries):
+                if entry.kind != APPEND:
+                    entries = entries[:count]
+                    break
+
+            # الصفحة تُحدد لكل رسالة بترتيبها، فقد تنشئ رسالة صفحة فرعية تكتب فيها الرسائل بعدها
+            if self.route is not None:
+                routed = [await self.route(page_id, entry.blocks) for entry in entries]
+            else:
+                routed = [(page_id, entry.blocks) for entry in entries]
+            targets = [target for target, _ in routed]
+
+            if self.prepare is not None:
+                prepared = await asyncio.gather(*(self.prepare(target, blocks) for target, blocks in routed))
+            else:
+                prepared = [blocks for _, blocks in routed]
+
+            results = await asyncio.gather(
+                *(self.write_buffer.add(target, blocks) for target, blocks in zip(targets, prepared)),
+                return_exceptions=True
+            )
+            delivered = []
+            failed = []
+            now = time.time()
+            for entry, target, blocks, result in zip(entries, targets, prepared, results):
+                if isinstance(result, BaseException):
+                    failed.append((entry.id, result))
+                    continue
+                delivered.append(entry.id)
+                MESSAGE_LAG_SECONDS.observe(now - entry.created_at, kind=entry.kind)
+                if self.on_delivered is not None:
+                    try:
+                        self.on_delivered(entry.key, target, blocks, result)
+                    except Exception as e:
+                        logger.error("خطأ في تسجيل كتل الرسالة %s: %s", entry.key, e)
+            self.outbox.mark_delivered(delivered)
+            self._purge()
+
+            if not failed:
+                isolate = False
+                continue
+
+            error = failed[0][1]
+            if _is_permanent(error):
+                if len(failed) > 1:
+                    # الدفعة رُفضت بالكامل، نعيد إرسال رسائلها واحدة تلو الأخرى
+                    isolate = True
+                    continue
+                # نستبعد الرسالة المرفوضة فقط حتى لا تعطل الرسائل التي بعدها
+                logger.error("رفض Notion الرسالة %s نهائياً: %s", failed[0][0], error)
+                self.outbox.mark_dead([failed[0][0]], str(error))
+                continue
+
+            self.outbox.record_failure([entry_id for entry_id, _ in failed], str(error))
+            self._schedule_retry(page_id, error)
+            return
+
+    async def _apply(self, page_id: str, entry: OutboxEntry):
+        """
+        تنفيذ إدخال من غير نوع APPEND
+
+        Returns:
+            Exception: الخطأ المؤقت إذا يجب إيقاف التفريغ وإعادة المحاولة لاحقاً، وإلا None
+        """
+        try:
+            if self.apply is None:
+                raise ValueError(f"لا يوجد منفذ لإدخالات {entry.kind}")
+            await self.apply(page_id, entry.kind, entry.blocks)
+        except Exception as error:
+            if _is_permanent(error) or isinstance(error, ValueError):
+                logger.error("رفض Notion العملية %s نهائياً: %s", entry.id, error)
+                self.outbox.mark_dead([entry.id], str(error))
+                return None
+            self.outbox.record_failure([entry.id], str(error))
+            return error
+        self.outbox.mark_delivered([entry.id])
+        MESSAGE_LAG_SECONDS.observe(time.time() - entry.created_at, kind=entry.kind)
+        return None
+
+    def _purge(self):
+        """
+        حذف الرسائل المرسلة القديمة أثناء التشغيل، حتى لا يكبر الصندوق بلا حد
+        كل عملية تُفرّغ الصندوق (البوت أو العمال) تحذف بنفسها، والحذف المتكرر من عمليتين لا يضر
+        """
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        try:
+            self.outbox.purge_delivered(self.retention)
+        except sqlite3.Error as e:
+            logger.warning("تعذر حذف الرسائل المرسلة القديمة: %s", e)
+
+    def _schedule_retry(self, page_id: str, error: Exception):
+        """
+        إعادة المحاولة لاحقاً مع تأخير متزايد عند تعطل Notion
+        """
+        delay = self._retry_delays.get(page_id, self.min_retry_delay)
+        self._retry_delays[page_id] = min(delay * 2, self.max_retry_delay)
+        logger.warning("تعذر إرسال رسائل الصفحة %s، إعادة المحاولة بعد %.0f ثانية: %s", page_id, delay, error)
+
+        def retry():
+            self._timers.pop(page_id, None)
+            self.notify(page_id)
+
+        self._timers[page_id] = asyncio.get_running_loop().call_later(delay, retry)
+
+    async def stop(self):
+        """
+        إيقاف المُفرِّغ بعد انتهاء الدفعات الجارية، وتبقى الرسائل غير المرسلة على القرص
+        """
+        self._stopping = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await self.write_buffer.flush_all()
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    هل الخطأ ناتج عن محتوى الطلب نفسه بحيث لن تنجح إعادة المحاولة؟
+    """
+    return isinstance(error, HTTPResponseError) and error.status == 400
@@ -0,0 +1,222 @@
+# فهرس مؤقت لصفحات وقواعد بيانات Notion المتاحة للـ integration
+# يُستخدم لعرض قائمة الصفحات في /start فوراً دون بحث كامل في كل مرة
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# العنوان المستخدم للصفحات التي لا تحتوي على عنوان
+UNTITLED = "صفحة بدون عنوان"
+
+
+def get_page_title(page: dict) -> str:
+    """
+    الحصول على عنوان صفحة Notion من خصائصها (أو عنوان قاعدة البيانات)
+    """
+    page_title = None
+
+    # قواعد البيانات تحمل عنوانها مباشرة وليس ضمن الخصائص
+    if page.get("object") == "database":
+        title_items = page.get("title") or []
+        if title_items:
+            page_title = "".join(item.get("plain_text", "") for item in title_items)
+
+    # محاولة الحصول على العنوان من خصائص الصفحة
+    elif "properties" in page:
+        title_property = page["properties"].get("title", {})
+        if title_property and "title" in title_property:
+            title_items = title_property["title"]
+            if title_items:
+                page_title = title_items[0].get("plain_text", "")
+
+    # إذا لم نجد العنوان، نستخدم عنواناً افتراضياً
+    if not page_title:
+        page_title = UNTITLED
+
+    return page_title
+
+
+class PageIndex:
+    """
+    فهرس الصفحات مع مدة صلاحية (TTL) وتحديث تدريجي:
+    - التحديث التدريجي يجلب فقط الصفحات المعدلة بعد آخر تحديث
+    - التحديث الكامل الدوري يزيل الصفحات المحذوفة أو التي لم تعد مشاركة
+    - صفوف قواعد البيانات وصفحات التقسيم التي ينشئها البوت لا تظهر في القائمة
+    """
+
+    def __init__(self, search, ttl: float = 300.0, full_refresh_every: int = 12, hidden_pages=None,
+                 max_full_requests: int = 10):
+        """
+        Args:
+            search: دالة غير متزامنة تستقبل معاملات notion.search وتعيد الرد
+            ttl (float): مدة صلاحية الفهرس بالثواني
+            full_refresh_every (int): عدد التحديثات التدريجية بين كل تحديث كامل
+            hidden_pages: دالة اختيارية تعيد معرفات الصفحات التي لا تظهر في القائمة
+                (صفحات التقسيم التي ينشئها البوت تحت الصفحات المرتبطة)
+            max_full_requests (int): أقصى عدد طلبات بحث في التحديث الكامل، حتى لا يستهلك
+                المرور على آلاف الصفوف حصة الطلبات المشتركة مع كتابة الرسائل
+        """
+        self._search = search
+        self.ttl = ttl
+        self.full_refresh_every = full_refresh_every
+        self.hidden_pages = hidden_pages
+        self.max_full_requests = max_full_requests
+        self._pages = {}  # page_id -> {"id", "object", "title", "title_key", "last_edited_time"}
+        self._ordered = []  # الصفحات مرتبة من الأحدث تعديلاً
+        self._positions = {}  # page_id -> موضعها في _ordered
+        self._watermark = None  # أحدث last_edited_time تمت رؤيته
+        self._refreshed_at = None
+        self._refreshes = 0
+        self._lock = asyncio.Lock()
+        self._background = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at is not None
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self._refreshed_at >= self.ttl
+
+    async def get(self) -> list:
+        """
+        الحصول على الصفحات: يُنتظر التحميل الأول فقط، وبعده يُعاد الفهرس الحالي فوراً
+        ويُحدَّث في الخلفية إذا انتهت صلاحيته
+        """
+        if not self.loaded:
+            await self.refresh()
+        elif self.is_stale():
+            self._refresh_in_background()
+        return self._ordered
+
+    def lookup(self, page_id: str):
+        """
+        بيانات صفحة أو قاعدة بيانات من الفهرس، أو None
+        """
+        return self._pages.get(page_id)
+
+    def position(self, page_id: str):
+        """
+        موضع الصفحة في الفهرس المرتب (كما يعيده get)، أو None
+        """
+        return self._positions.get(page_id)
+
+    def filter(self, query: str) -> list:
+        """
+        تصفية الصفحات حسب جزء من العنوان (دون تمييز حالة الأحرف)
+        """
+        query = query.strip().casefold()
+        if not query:
+            return self._ordered
+        return [page for page in self._ordered if query in page["title_key"]]
+
+    def _refresh_in_background(self):
+        if self._background is None or self._background.done():
+            self._background = asyncio.get_running_loop().create_task(self._safe_refresh())
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error("خطأ في تحديث فهرس الصفحات: %s", e)
+
+    async def refresh(self, full: bool = None):
+        """
+        تحديث الفهرس من Notion
+
+        Args:
+            full (bool): إجبار تحديث كامل بدلاً من التحديث التدريجي
+        """
+        async with self._lock:
+            if full is None and not self.is_stale():
+                # تم التحديث أثناء انتظار القفل
+                return
+            if full is None:
+                full = self._watermark is None or self._refreshes % self.full_refresh_every == 0
+            seen = {} if full else None
+            newest = self._watermark
+            oldest = None  # أقدم last_edited_time وصل إليه البحث
+            cursor = None
+            requests = 0
+
+            while True:
+                # البحث دون فلتر يعيد الصفحات وقواعد البيانات معاً
+                params = {
+                    "sort": {
+                        "direction": "descending",
+                        "timestamp": "last_edited_time"
+                    },
+                    "page_size": 100,
+                }
+                if cursor:
+                    params["start_cursor"] = cursor
+                response = await self._search(**params)
+                requests += 1
+
+                reached_known = False
+                for page in response.get("results", []):
+                    edited = page.get("last_edited_time", "")
+                    # النتائج مرتبة تنازلياً، فعند الوصول لصفحة أقدم من آخر تحديث نتوقف
+                    if not full and self._watermark and edited < self._watermark:
+                        reached_known = True
+                        break
+                    if newest is None or edited > newest:
+                        newest = edited
+                    oldest = edited
+                    # صفوف قواعد البيانات (ومنها الصفوف التي ينشئها البوت لكل رسالة) ليست أهدافاً للربط
+                    if (page.get("parent") or {}).get("type") == "database_id":
+                        continue
+                    try:
+                        entry = self._entry(page)
+                    except Exception as e:
+                        logger.error("خطأ في معالجة الصفحة %s: %s", page.get('id', 'unknown'), e)
+                        continue
+                    if full:
+                        seen[entry["id"]] = entry
+                    else:
+                        self._pages[entry["id"]] = entry
+
+                cursor = response.get("next_cursor")
+                if reached_known or not response.get("has_more") or not cursor:
+                    break
+                if full and requests >= self.max_full_requests:
+                    # الصفحات الأقدم من نهاية البحث تبقى كما هي، والأحدث منها التي لم تظهر حُذفت
+                    logger.info("توقف التحديث الكامل بعد %s طلب بحث", requests)
+                    seen = {
+                        **{page_id: entry for page_id, entry in self._pages.items()
+                           if oldest is not None and entry["last_edited_time"] < oldest},
+                        **seen,
+                    }
+                    break
+
+            if full:
+                self._pages = seen
+            if self.hidden_pages is not None:
+                # صفحة التقسيم قد تُحفظ بعد فهرستها، فيُعاد الفحص مع كل تحديث
+                hidden = self.hidden_pages()
+                self._pages = {page_id: entry for page_id, entry in self._pages.items() if page_id not in hidden}
+            self._ordered = sorted(self._pages.values(), key=lambda p: p["last_edited_time"], reverse=True)
+            self._positions = {page["id"]: position for position, page in enumerate(self._ordered)}
+            self._watermark = newest
+            self._refreshed_at = time.monotonic()
+            self._refreshes += 1
+            logger.info("تم تحديث فهرس الصفحات (%s): %s صفحة", "كامل" if full else "تدريجي", len(self._ordered))
+
+    @staticmethod
+    def _entry(page: dict) -> dict:
+        title = get_page_title(page)
+        return {
+            "id": page["id"],
+            "object": page.get("object", "page"),
+            "title": title,
+            "title_key": title.casefold(),
+            "last_edited_time": page.get("last_edited_time", ""),
+        }
+
+    async def keep_warm(self):
+        """
+        إبقاء الفهرس محدثاً في الخلفية طوال تشغيل البوت
+        """
+        while True:
+            await self._safe_refresh()
+            await asyncio.sleep(self.ttl)
@@ -0,0 +1,321 @@
+# تحويل نصوص تيليجرام وتنسيقاتها (entities) إلى rich_text وكتل Notion
+# مواضع التنسيقات في تيليجرام محسوبة بوحدات UTF-16، ويتم التحويل في مرور خطي واحد
+import re
+from typing import NamedTuple, Optional
+
+# حدود Notion: عدد الأحرف في عنصر rich_text واحد، وعدد العناصر في كتلة واحدة
+NOTION_TEXT_LIMIT = 2000
+NOTION_RICH_TEXT_LIMIT = 100
+
+# اللغات التي يقبلها Notion في كتل الكود (الباقي يظهر كنص عادي)
+NOTION_CODE_LANGUAGES = {
+    "bash", "c", "c#", "c++", "css", "dart", "diff", "docker", "go", "graphql", "haskell",
+    "html", "java", "javascript", "json", "kotlin", "lua", "makefile", "markdown", "php",
+    "plain text", "powershell", "python", "ruby", "rust", "scala", "shell", "sql", "swift",
+    "typescript", "xml", "yaml",
+}
+_LANGUAGE_ALIASES = {
+    "py": "python", "js": "javascript", "ts": "typescript", "sh": "shell", "cpp": "c++",
+    "cs": "c#", "csharp": "c#", "yml": "yaml", "md": "markdown", "dockerfile": "docker",
+}
+
+_BULLET = re.compile(r"^[-•*]\s+")
+_NUMBERED = re.compile(r"^\d{1,3}[.)]\s+")
+
+
+class Style(NamedTuple):
+    """
+    تنسيق جزء من النص
+    """
+    bold: bool = False
+    italic: bool = False
+    strikethrough: bool = False
+    underline: bool = False
+    code: bool = False
+    link: Optional[str] = None
+    pre: Optional[str] = None  # لغة كتلة الكود إذا كان الجزء داخل pre
+    quote: bool = False
+
+
+PLAIN = Style()
+
+_FLAGS = {
+    "bold": "bold",
+    "italic": "italic",
+    "strikethrough": "strikethrough",
+    "underline": "underline",
+    "code": "code",
+}
+
+
+def utf16_len(text: str) -> int:
+    """
+    طول النص بوحدات UTF-16 كما يحسبه تيليجرام وNotion
+    """
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _entity_link(entity, entity_text: str):
+    """
+    الرابط الذي يمثله التنسيق، إن وجد
+    """
+    if entity.type == "text_link":
+        return entity.url
+    if entity.type == "url":
+        return entity_text if "://" in entity_text else f"https://{entity_text}"
+    if entity.type == "mention":
+        return f"https://t.me/{entity_text.lstrip('@')}"
+    if entity.type == "email":
+        return f"mailto:{entity_text}"
+    return None
+
+
+def text_runs(text: str, entities) -> list:
+    """
+    تقسيم النص إلى أجزاء متتالية لكل منها تنسيق واحد
+
+    Returns:
+        list: قائمة (النص، Style)
+    """
+    if not entities:
+        return [(text, PLAIN)] if text else []
+
+    encoded = text.encode("utf-16-le")
+    total = len(encoded) // 2
+    points = {0, total}
+    for entity in entities:
+        points.add(min(entity.offset, total))
+        points.add(min(entity.offset + entity.length, total))
+    points = sorted(points)
+
+    ordered = sorted(entities, key=lambda e: e.offset)
+    # نحسب رابط كل تنسيق من نصه الكامل مرة واحدة، لأن الجزء قد يكون مقطوعاً بتنسيق متداخل
+    links = {}
+    for entity in ordered:
+        entity_text = encoded[entity.offset * 2:(entity.offset + entity.length) * 2].decode("utf-16-le", "ignore")
+        links[id(entity)] = _entity_link(entity, entity_text)
+
+    runs = []
+    active = []
+    next_entity = 0
+    for start, end in zip(points, points[1:]):
+        while next_entity < len(ordered) and ordered[next_entity].offset <= start:
+            active.append(ordered[next_entity])
+            next_entity += 1
+        active = [entity for entity in active if entity.offset + entity.length > start]
+
+        style = {}
+        for entity in active:
+            if entity.type in _FLAGS:
+                style[_FLAGS[entity.type]] = True
+            elif entity.type == "pre":
+                style["pre"] = entity.language or ""
+            elif entity.type in ("blockquote", "expandable_blockquote"):
+                style["quote"] = True
+            link = links[id(entity)]
+            if link:
+                style["link"] = link
+
+        segment = encoded[start * 2:end * 2].decode("utf-16-le", "ignore")
+        if segment:
+            runs.append((segment, Style(**style) if style else PLAIN))
+    return runs
+
+
+def _split(text: str, limit: int = NOTION_TEXT_LIMIT) -> list:
+    """
+    تقسيم النص إلى أجزاء لا يتجاوز طول كل منها الحد بوحدات UTF-16 دون كسر الأحرف
+    """
+    if len(text) <= limit // 2 or utf16_len(text) <= limit:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + limit, len(text))
+        while utf16_len(text[start:end]) > limit:
+            end -= (utf16_len(text[start:end]) - limit + 1) // 2 or 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def rich_text_items(runs: list) -> list:
+    """
+    تحويل الأجزاء إلى عناصر rich_text مع دمج الأجزاء المتجاورة ذات التنسيق الواحد
+    """
+    items = []
+    merged_text = None
+    merged_style = None
+    for text, style in runs:
+        if style == merged_style:
+            merged_text.append(text)
+            continue
+        if merged_text:
+            items.extend(_items("".join(merged_text), merged_style))
+        merged_text, merged_style = [text], style
+    if merged_text:
+        items.extend(_items("".join(merged_text), merged_style))
+    return items
+
+
+def _items(text: str, style: Style) -> list:
+    annotations = {
+        name: True for name in ("bold", "italic", "strikethrough", "underline", "code")
+        if getattr(style, name)
+    }
+    items = []
+    for chunk in _split(text):
+        item = {"type": "text", "text": {"content": chunk}}
+        if style.link:
+            item["text"]["link"] = {"url": style.link}
+        if annotations:
+            item["annotations"] = annotations
+        items.append(item)
+    return items
+
+
+def _blocks(block_type: str, items: list, **extra) -> list:
+    """
+    إنشاء كتلة أو أكثر من نفس النوع بحيث لا تتجاوز كل كتلة 100 عنصر rich_text
+    """
+    blocks = []
+    for start in range(0, max(len(items), 1), NOTION_RICH_TEXT_LIMIT):
+        body = {"rich_text": items[start:start + NOTION_RICH_TEXT_LIMIT]}
+        body.update(extra)
+        blocks.append({"object": "block", "type": block_type, block_type: body})
+    return blocks
+
+
+def _code_language(language: str) -> str:
+    language = (language or "").strip().lower()
+    language = _LANGUAGE_ALIASES.get(language, language)
+    return language if language in NOTION_CODE_LANGUAGES else "plain text"
+
+
+def _strip_prefix(line: list, pattern) -> Optional[list]:
+    """
+    إزالة علامة القائمة من بداية السطر إن وجدت
+    """
+    if not line:
+        return None
+    first_text, first_style = line[0]
+    match = pattern.match(first_text)
+    if not match:
+        return None
+    rest = first_text[match.end():]
+    return ([(rest, first_style)] if rest else []) + line[1:]
+
+
+def text_to_blocks(text: str, entities=None) -> list:
+    """
+    تحويل نص رسالة تيليجرام إلى كتل Notion:
+    - pre يصبح كتلة code
+    - الأسطر التي تبدأ بـ "-" أو "•" تصبح عناصر قائمة نقطية، و"1." عناصر قائمة مرقمة
+    - الاقتباسات تصبح كتل quote
+    - باقي الأسطر المتتالية تبقى في فقرة واحدة
+    """
+    blocks = []
+    paragraph = []  # أجزاء الفقرة الحالية
+    quote = []  # أجزاء الاقتباس الحالي
+    code = []  # أجزاء كتلة الكود الحالية
+    code_language = None
+    line = []
+
+    def flush_paragraph():
+        if paragraph:
+            # الأسطر الفارغة في بداية الفقرة ونهايتها لا تظهر في Notion
+            while paragraph and paragraph[-1][0] == "\n":
+                paragraph.pop()
+            while paragraph and paragraph[0][0] == "\n":
+                paragraph.pop(0)
+            if paragraph:
+                blocks.extend(_blocks("paragraph", rich_text_items(paragraph)))
+            paragraph.clear()
+
+    def flush_quote():
+        if quote:
+            blocks.extend(_blocks("quote", rich_text_items(quote[:-1] if quote[-1][0] == "\n" else quote)))
+            quote.clear()
+
+    def flush_code():
+        nonlocal code_language
+        if code:
+            plain = [(text, PLAIN) for text, _ in code]
+            blocks.extend(_blocks("code", rich_text_items(plain), language=_code_language(code_language)))
+            code.clear()
+            code_language = None
+
+    def end_line():
+        items = list(line)
+        line.clear()
+        bullet = _strip_prefix(items, _BULLET)
+        if bullet is not None:
+            flush_paragraph()
+            flush_quote()
+            blocks.extend(_blocks("bulleted_list_item", rich_text_items(bullet)))
+            return
+        numbered = _strip_prefix(items, _NUMBERED)
+        if numbered is not None:
+            flush_paragraph()
+            flush_quote()
+            blocks.extend(_blocks("numbered_list_item", rich_text_items(numbered)))
+            return
+        if items and all(style.quote for _, style in items):
+            flush_paragraph()
+            quote.extend(items)
+            quote.append(("\n", PLAIN))
+            return
+        flush_quote()
+        paragraph.extend(items)
+        paragraph.append(("\n", PLAIN))
+
+    for text, style in text_runs(text, entities):
+        if style.pre is not None:
+            if line:
+                end_line()
+            flush_paragraph()
+            flush_quote()
+            if code and code_language != style.pre:
+                flush_code()
+            code_language = style.pre
+            code.append((text, style))
+            continue
+        if code:
+            flush_code()
+            # سطر جديد بعد كتلة الكود مباشرة لا يحمل محتوى
+            if text.startswith("\n"):
+                text = text[1:]
+                if not text:
+                    continue
+
+        parts = text.split("\n")
+        for index, part in enumerate(parts):
+            if index > 0:
+                end_line()
+            if part:
+                line.append((part, style))
+
+    if line:
+        end_line()
+    flush_code()
+    flush_quote()
+    flush_paragraph()
+    return blocks
+
+
+def inline_rich_text(text: str, entities=None, limit: int = NOTION_RICH_TEXT_LIMIT) -> list:
+    """
+    تحويل نص قصير (مثل وصف الوسائط) إلى عناصر rich_text فقط دون كتل
+    العناصر الزائدة عن الحد تُدمج في آخر عنصر كنص عادي
+    """
+    runs = [
+        (text_part, style._replace(code=style.code or style.pre is not None, pre=None, quote=False))
+        for text_part, style in text_runs(text, entities)
+    ]
+    items = rich_text_items(runs)
+    if len(items) > limit:
+        overflow = "".join(item["text"]["content"] for item in items[limit - 1:])
+        items = items[:limit - 1] + _items(overflow, PLAIN)[:1]
+    return items
@@ -0,0 +1,173 @@
+# تقسيم الصفحة المرتبطة إلى صفحات فرعية حسب اليوم أو الأسبوع أو عدد الكتل
+# حتى لا تكبر صفحة واحدة إلى عشرات آلاف الكتل فيبطأ فتحها والإضافة إليها
+# الرسائل تُحفظ في الصندوق الصادر تحت الصفحة المرتبطة، والصفحة الفرعية تُحدد (وتُنشأ) عند الإرسال،
+# فلا ينتظر استقبال الرسالة Notion، وتبقى الرسائل وتعديلاتها وحذفها في طابور صفحة واحد بترتيبها
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from binding_store import BindingStore, Shard
+
+logger = logging.getLogger(__name__)
+
+DAILY = "daily"
+WEEKLY = "weekly"
+BLOCKS_PREFIX = "blocks:"  # السياسة blocks:N تنشئ صفحة جديدة كل N كتلة
+
+MIN_SHARD_BLOCKS = 100
+
+# بادئة مفتاح الصفحة الفرعية لكل نوع سياسة، حتى لا تختلط الصفحات عند تغيير السياسة
+_KEY_PREFIXES = {DAILY: "d:", WEEKLY: "w:"}
+_BLOCKS_KEY = "n:"
+
+
+def parse_policy(text: str):
+    """
+    تحويل نص الأمر إلى سياسة: daily أو weekly أو عدد كتل، وoff للإلغاء
+
+    Returns:
+        str: السياسة، أو None للإلغاء
+
+    Raises:
+        ValueError: إذا كانت السياسة غير صحيحة
+    """
+    text = text.strip().lower()
+    if text in ("off", "none"):
+        return None
+    if text in (DAILY, WEEKLY):
+        return text
+    if text.isdigit() and int(text) >= MIN_SHARD_BLOCKS:
+        return f"{BLOCKS_PREFIX}{int(text)}"
+    raise ValueError(f"سياسة تقسيم غير صحيحة: {text}")
+
+
+class RolloverRouter:
+    """
+    تحديد الصفحة التي تُكتب فيها الرسالة حسب سياسة التوبيك
+    الصفحة الفرعية الحالية لكل صفحة محفوظة في الذاكرة، فلا يحتاج المسار المعتاد إلى أي طلب
+    """
+
+    def defer(self, chat_id: str, thread_id: str, date: datetime, blocks: list):
+        """
+        كتل الرسالة كما تُحفظ في الصندوق الصادر تحت الصفحة المرتبطة:
+        في التوبيكات المقسمة تُحفظ معها بيانات اختيار صفحتها الفرعية، وتُختار عند الإرسال في route
+        """
+        if self.store.get_rollover(chat_id, thread_id) is None:
+            return blocks
+        return {"rollover": [chat_id, thread_id, date.timestamp() if date else None], "blocks": blocks}
+
+    async def route(self, page_id: str, payload):
+        """
+        الصفحة الفرعية لإدخال إضافة من الصندوق الصادر وكتله (يستدعيها المُفرِّغ قبل الإرسال)
+
+        Returns:
+            tuple: (page_id, blocks)
+        """
+        if not isinstance(payload, dict) or "rollover" not in payload:
+            return page_id, payload
+        chat_id, thread_id, timestamp = payload["rollover"]
+        blocks = payload["blocks"]
+        date = datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+        return await self.resolve(chat_id, thread_id, page_id, date, len(blocks)), blocks
+
+    def __init__(self, store: BindingStore, create_page, tz=timezone.utc, retry_after: float = 60.0):
+        """
+        Args:
+            store (BindingStore): مخزن الروابط الذي يحفظ السياسات والصفحات الفرعية
+            create_page: دالة غير متزامنة (parent_page_id, title) تنشئ صفحة فرعية وتعيد معرفها
+            tz: المنطقة الزمنية لحدود الأيام والأسابيع
+            retry_after (float): مدة الانتظار بالثواني قبل إعادة محاولة إنشاء صفحة فشل إنشاؤها
+        """
+        self.store = store
+        self.create_page = create_page
+        self.tz = tz
+        self.retry_after = retry_after
+        self._current = {}  # (parent_page_id, prefix) -> Shard
+        self._locks = {}
+        self._failed_until = {}
+
+    async def resolve(self, chat_id: str, thread_id: str, parent_page_id: str, date: datetime,
+                      block_count: int) -> str:
+        """
+        الصفحة التي تُكتب فيها رسالة بتاريخ date وعدد كتل block_count، مع إنشائها إذا لزم
+        """
+        policy = self.store.get_rollover(chat_id, thread_id)
+        if policy is None:
+            return parent_page_id
+
+        if policy.startswith(BLOCKS_PREFIX):
+            prefix = _BLOCKS_KEY
+            current = self._get_current(parent_page_id, prefix)
+            limit = int(policy[len(BLOCKS_PREFIX):])
+            if current is not None and current.blocks + block_count <= limit:
+                return self._count(parent_page_id, prefix, current, block_count)
+            number = int(current.key[len(prefix):]) + 1 if current else 1
+            key = f"{prefix}{number:06d}"
+            title = f"جزء {number}"
+        else:
+            prefix = _KEY_PREFIXES[policy]
+            local = (date or datetime.now(timezone.utc)).astimezone(self.tz)
+            if policy == DAILY:
+                period = local.strftime("%Y-%m-%d")
+                title = period
+            else:
+                year, week, _ = local.isocalendar()
+                period = f"{year}-W{week:02d}"
+                title = f"أسبوع {period}"
+            key = f"{prefix}{period}"
+            current = self._get_current(parent_page_id, prefix)
+            if current is not None and current.key == key:
+                return self._count(parent_page_id, prefix, current, block_count)
+            # رسالة من فترة سابقة (تعديل أو استيراد) تُكتب في صفحة فترتها إن وجدت
+            shard = self.store.get_shard(parent_page_id, key)
+            if shard is not None:
+                return self._count(parent_page_id, prefix, shard, block_count)
+
+        return await self._create(parent_page_id, prefix, key, title, block_count)
+
+    def _get_current(self, parent_page_id: str, prefix: str):
+        cache_key = (parent_page_id, prefix)
+        if cache_key not in self._current:
+            self._current[cache_key] = self.store.latest_shard(parent_page_id, prefix)
+        return self._current[cache_key]
+
+    def _count(self, parent_page_id: str, prefix: str, shard: Shard, block_count: int) -> str:
+        """
+        إضافة عدد الكتل إلى الصفحة الفرعية (مطلوب فقط لسياسة عدد الكتل)
+        """
+        if prefix == _BLOCKS_KEY and block_count:
+            shard = shard._replace(blocks=shard.blocks + block_count)
+            self.store.save_shard(parent_page_id, shard)
+        current = self._current.get((parent_page_id, prefix))
+        if current is None or shard.key >= current.key:
+            self._current[(parent_page_id, prefix)] = shard
+        return shard.page_id
+
+    async def _create(self, parent_page_id: str, prefix: str, key: str, title: str, block_count: int) -> str:
+        """
+        إنشاء صفحة فرعية جديدة مرة واحدة حتى لو وصلت عدة رسائل في نفس الوقت
+        """
+        lock = self._locks.setdefault(parent_page_id, asyncio.Lock())
+        async with lock:
+            # ربما أنشأتها رسالة أخرى أثناء الانتظار
+            shard = self.store.get_shard(parent_page_id, key)
+            if shard is not None:
+                return self._count(parent_page_id, prefix, shard, block_count)
+
+            current = self._current.get((parent_page_id, prefix))
+            fallback = current.page_id if current is not None else parent_page_id
+            if time.monotonic() < self._failed_until.get(parent_page_id, 0):
+                return fallback
+            try:
+                page_id = await self.create_page(parent_page_id, title)
+            except Exception as e:
+                # لا نفقد الرسالة: تُكتب في الصفحة الحالية ونعيد المحاولة لاحقاً
+                logger.error("خطأ في إنشاء صفحة فرعية للصفحة %s: %s", parent_page_id, e)
+                self._failed_until[parent_page_id] = time.monotonic() + self.retry_after
+                return fallback
+
+            logger.info("تم إنشاء صفحة فرعية جديدة (%s) تحت الصفحة %s", title, parent_page_id)
+            shard = Shard(key, page_id, 0)
+            self.store.save_shard(parent_page_id, shard)
+            return self._count(parent_page_id, prefix, shard, block_count)
@@ -0,0 +1,309 @@
+# مكونات البوت (عميل Notion، الصندوق الصادر، الروابط، ...) تُنشأ هنا عند الطلب وليس عند استيراد الوحدات
+# حتى يكون استيراد المعالجات سريعاً وبدون أي أثر جانبي، ويمكن بناء أكثر من نسخة في الاختبارات وقياس الأداء
+import asyncio
+import logging
+import os
+from zoneinfo import ZoneInfo
+
+from notion_client.errors import APIErrorCode, APIResponseError
+
+import metrics
+from ack import Acknowledger
+from admin_cache import AdminCache
+from album import AlbumAggregator
+from backfill import Backfill
+from binding_store import DEFAULT_WORKSPACE, BindingStore
+from block_index import BlockIndex
+from callback_data import CallbackSigner
+from database_rows import ROW
+from digest import Digest, DigestBuffer
+from outbox import Outbox, OutboxDrainer, shard_of
+from rollover import RolloverRouter
+from workspaces import Workspace, WorkspacePool, workspace_id
+from write_buffer import PageWriteBuffer
+
+logger = logging.getLogger(__name__)
+
+class BotServices:
+    """
+    كل مكونات البوت مبنية من الإعدادات (متغيرات البيئة)، مع تشغيلها وإيقافها بالترتيب الصحيح
+    """
+
+    def __init__(self, environ, on_album=None, shard: tuple = None):
+        """
+        Args:
+            environ: الإعدادات، مثل os.environ
+            on_album: دالة غير متزامنة (key, messages) تحفظ الألبوم المكتمل
+            shard (tuple): (رقم العامل، عدد العمال) لعامل الصندوق الصادر (workers.py)
+                بدونها ومع OUTBOX_WORKERS > 0 تكون هذه عملية الاستقبال، فلا ترسل أي صفحة بنفسها
+
+        Raises:
+            ValueError: إذا لم يتم تحديد NOTION_TOKEN
+        """
+        env = environ.get
+        self.notion_token = env("NOTION_TOKEN")
+        if not self.notion_token:
+            raise ValueError("لم يتم العثور على NOTION_TOKEN في ملف .env")
+
+        # فهرس كتل الرسائل: يُستخدم لتعديل الكتل عند تعديل الرسالة في تيليجرام ولحذفها بأمر /delete
+        self.block_index = BlockIndex(env("BLOCK_INDEX_PATH", "block_index.db"))
+
+        # مخزن الروابط بين كل (محادثة، توبيك) وصفحة Notion ومساحة عملها
+        # يتم نقل الروابط من topic_pages.json تلقائياً عند أول تشغيل
+        self.bindings = BindingStore(env("BINDINGS_PATH", "bindings.db"))
+        self.legacy_notified = set()  # التوبيكات القديمة التي طُلب من مشرفيها إعادة ربطها
+
+        # رفع الوسائط (اختياري): تُحفظ في الصندوق كمراجع لملفات تيليجرام
+        # وتُرفع إلى Notion عند الإرسال، فلا يتأخر التأكيد ولا يختل ترتيب الرسائل
+        self.upload_media = env("NOTION_UPLOAD_MEDIA", "0") == "1"
+        media = {
+            "enabled": self.upload_media,
+            "max_size": int(float(env("MEDIA_MAX_SIZE_MB", "20")) * 1024 * 1024),
+            "concurrency": int(env("MEDIA_UPLOAD_CONCURRENCY", "3")),
+        }
+
+        # لكل توكن (NOTION_TOKEN ومساحات العمل المضافة بـ /connect) عميل Notion دائم
+        # ومنظم بحد معدله الخاص، حتى لا يتجاوز أي توكن حد Notion ولا ينتظر توكناً آخر
+        # NOTION_BASE_URL يوجه الطلبات إلى خادم آخر، مثل خادم Notion الوهمي في fakes.py
+        # مع عمال الإرسال تستخدم كل عملية (البوت وكل عامل) نفس التوكنات، فلكل منها جزء متساوٍ من الحد
+        # حتى لا يتجاوز مجموع طلبات التوكن NOTION_RATE_LIMIT
+        processes = (shard[1] if shard is not None else int(env("OUTBOX_WORKERS", "0"))) + 1
+        notion_rate = float(env("NOTION_RATE_LIMIT", "3")) / processes
+
+        def open_workspace(workspace: str, token: str) -> Workspace:
+            return Workspace(
+                workspace,
+                token,
+                self.block_index,
+                base_url=env("NOTION_BASE_URL", "https://api.notion.com"),
+                rate=notion_rate,
+                max_retries=int(env("NOTION_MAX_RETRIES", "5")),
+                page_index_ttl=float(env("PAGE_INDEX_TTL", "300")),
+                media=media,
+                hidden_pages=self.bindings.shard_pages,
+            )
+
+        self.workspaces = WorkspacePool(open_workspace)
+        self.default_workspace = self.workspaces.get(self.notion_token, DEFAULT_WORKSPACE)
+
+        # مخزن الكتابة المؤجلة: يجمع رسائل نفس الصفحة خلال نافذة زمنية قصيرة
+        # ويحافظ على ترتيبها بينما تُكتب الصفحات المختلفة بالتوازي
+        self.write_buffer = PageWriteBuffer(
+            self.append_blocks,
+            flush_interval=float(env("NOTION_FLUSH_INTERVAL", "0.5")),
+            max_blocks=int(env("NOTION_FLUSH_MAX_BLOCKS", "100")),
+        )
+
+        # الصندوق الصادر: تُحفظ كل رسالة على القرص قبل تأكيد استلامها
+        # ويرسلها المُفرِّغ في الخلفية حتى لا يعتمد الاستقبال على توفر Notion
+        self.outbox = Outbox(env("OUTBOX_PATH", "outbox.db"))
+
+        # مع OUTBOX_WORKERS يرسل الصندوقَ عمالٌ في عمليات منفصلة، لكل منهم جزء ثابت من الصفحات
+        self.workers = int(env("OUTBOX_WORKERS", "0"))
+        if shard is not None:
+            index, count = shard
+            owns = lambda page_id: shard_of(page_id, count) == index
+        elif self.workers > 0:
+            owns = lambda page_id: False
+        else:
+            owns = None
+
+        # تقسيم الصفحات (اختياري لكل توبيك عبر /rollover): الصفحة الفرعية الحالية محفوظة في الذاكرة
+        # وتُحدد عند الإرسال، فالرسائل تبقى في الصندوق تحت الصفحة المرتبطة
+        self.rollover = RolloverRouter(self.bindings, self.create_child_page, tz=ZoneInfo(env("ROLLOVER_TZ", "UTC")))
+
+        # صفوف قواعد البيانات مستقلة عن بعضها، فتُنشأ صفوف الدفعة معاً عبر نفس المنظم
+        self.drainer = OutboxDrainer(
+            self.outbox,
+            self.write_buffer,
+            prepare=self.resolve_blocks,
+            on_delivered=self.default_workspace.message_sync.record,
+            apply=self.apply_operation,
+            parallel_kinds=(ROW,),
+            owns=owns,
+            route=self.rollover.route,
+            retention=float(env("OUTBOX_RETENTION", "86400")),
+        )
+
+        # استيراد السجل السابق: ملفات التصدير تُحفظ في هذا المجلد مع ملف تقدم لكل منها
+        self.backfill_dir = env("BACKFILL_DIR", "backfill")
+        self.backfiller = Backfill(self.outbox, self.drainer)
+        self.backfill_tasks = {}  # (chat_id, thread_id) -> مهمة الاستيراد الجارية
+
+        # وضع الملخص (اختياري لكل توبيك عبر /digest): الرسائل تُجمع في digest.db
+        # ويُكتب ملخص كل ساعة أو يوم كإدخال واحد في الصندوق الصادر
+        self.digest = Digest(
+            DigestBuffer(env("DIGEST_PATH", "digest.db")),
+            self.bindings,
+            self.write_digest,
+            tz=ZoneInfo(env("DIGEST_TZ", env("ROLLOVER_TZ", "UTC"))),
+            check_interval=float(env("DIGEST_CHECK_INTERVAL", "60")),
+        )
+
+        # تأكيدات الحفظ: رد أو تفاعل أو ملخص لكل توبيك أو بدون تأكيد
+        # تُرسل في الخلفية حتى لا ينتظر استقبال الرسائل حدود الإرسال في تيليجرام
+        self.acknowledger = Acknowledger(
+            mode=env("ACK_MODE", "reply"),
+            window=float(env("ACK_WINDOW", "5")),
+            rate=float(env("ACK_RATE", "20")),
+            chat_rate=float(env("ACK_CHAT_RATE", "20")),
+        )
+
+        # مشرفو كل مجموعة: تُجلب القائمة بطلب واحد وتُحفظ حتى انتهاء المدة أو تغير صلاحيات أحد الأعضاء
+        self.admins = AdminCache(ttl=float(env("ADMIN_CACHE_TTL", "300")))
+
+        # توقيع أزرار قائمة /start: السر يجب أن يبقى ثابتاً بين مرات التشغيل حتى تعمل القوائم المعروضة
+        # فيُشتق افتراضياً من توكن البوت، وبدونه يُولَّد لكل تشغيل
+        self.callbacks = CallbackSigner(
+            env("CALLBACK_SECRET") or env("TELEGRAM_BOT_TOKEN") or os.urandom(32)
+        )
+
+        # أجزاء الألبوم تصل كتحديثات منفصلة، فتُجمع خلال نافذة قصيرة ثم تُحفظ معاً
+        self.album_aggregator = AlbumAggregator(on_album, window=float(env("ALBUM_WINDOW", "1.0")))
+
+        # نقطة المقاييس (اختيارية): تُفعّل بتحديد METRICS_PORT
+        metrics_port = env("METRICS_PORT")
+        self.metrics_server = metrics.MetricsServer(
+            metrics.registry, env("METRICS_HOST", "127.0.0.1"), int(metrics_port)
+        ) if metrics_port else None
+        metrics.BOUND_TOPICS.set_function(lambda: len(self.bindings))
+        metrics.OUTBOX_PENDING.set_function(self.outbox.pending_count)
+        metrics.ACK_QUEUE.set_function(self.acknowledger.pending)
+        metrics.DIGEST_PENDING.set_function(self.digest.buffer.pending_count)
+
+    def for_page(self, page_id: str) -> Workspace:
+        """
+        مساحة العمل التي تُكتب بها الصفحة (الصفحة المرتبطة أو صفحاتها الفرعية)
+        """
+        return self._open(self.bindings.page_workspace(page_id))
+
+    def for_chat(self, chat_id: str) -> Workspace:
+        """
+        مساحة العمل التي تُختار منها صفحات المحادثة في /start
+        """
+        return self._open(self.bindings.get_chat_workspace(chat_id))
+
+    def _open(self, workspace: str) -> Workspace:
+        if workspace == DEFAULT_WORKSPACE:
+            return self.default_workspace
+        token = self.bindings.workspace_token(workspace)
+        if token is None:
+            # لا يحدث إلا إذا حُذف التوكن من قاعدة البيانات يدوياً
+            logger.warning("مساحة العمل %s غير مسجلة، استخدام المساحة الافتراضية", workspace)
+            return self.default_workspace
+        return self.workspaces.get(token, workspace)
+
+    async def connect(self, chat_id: str, token: str) -> str:
+        """
+        التحقق من توكن integration وربط المحادثة بمساحة عمله
+
+        Returns:
+            str: اسم الـ integration في Notion
+
+        Raises:
+            APIResponseError: إذا رفض Notion التوكن
+        """
+        workspace = DEFAULT_WORKSPACE if token == self.notion_token else workspace_id(token)
+        is_new = workspace != DEFAULT_WORKSPACE and self.bindings.workspace_token(workspace) is None
+        connection = self.workspaces.get(token, workspace)
+        try:
+            user = await connection.check()
+        except APIResponseError:
+            if is_new:
+                await self.workspaces.discard(token)
+            raise
+        name = user.get("name") or ""
+        if workspace == DEFAULT_WORKSPACE:
+            await asyncio.to_thread(self.bindings.set_chat_workspace, chat_id, DEFAULT_WORKSPACE)
+        else:
+            await asyncio.to_thread(self.bindings.set_chat_workspace, chat_id, workspace, token, name)
+        logger.info("تم ربط المحادثة %s بمساحة العمل %s", chat_id, workspace or "الافتراضية")
+        return name
+
+    async def append_blocks(self, page_id: str, children: list):
+        """
+        إضافة دفعة من الكتل إلى صفحة Notion بتوكن مساحة عملها
+        """
+        return await self.for_page(page_id).append_blocks(page_id, children)
+
+    async def resolve_blocks(self, page_id: str, blocks: list) -> list:
+        """
+        رفع ملفات الرسالة إلى مساحة عمل الصفحة قبل إرسالها
+        """
+        return await self.for_page(page_id).media_uploader.resolve_blocks(blocks)
+
+    async def apply_operation(self, page_id: str, kind: str, payload):
+        """
+        تنفيذ إدخالات الصندوق الصادر من غير الإضافة إلى الصفحة
+        """
+        await self.for_page(page_id).apply(page_id, kind, payload)
+
+    async def create_child_page(self, parent_page_id: str, title: str) -> str:
+        """
+        إنشاء صفحة فرعية تحت الصفحة المرتبطة
+        """
+        return await self.for_page(parent_page_id).create_child_page(parent_page_id, title)
+
+    async def write_digest(self, key: str, chat_id: str, thread_id: str, page_id: str, date, blocks: list):
+        """
+        حفظ ملخص توبيك في الصندوق الصادر، في صفحته الفرعية إذا كان التوبيك مقسماً
+        """
+        if self.outbox.put(key, page_id, self.rollover.defer(chat_id, thread_id, date, blocks)):
+            self.drainer.notify(page_id)
+
+    async def start(self, bot):
+        """
+        تشغيل المكونات في الخلفية ثم فحص الاتصال بـ Notion وتشغيل نقطة المقاييس معاً
+        الرسائل المنتظرة وتحميل فهرس الصفحات يبدآن فوراً دون انتظار الفحوص
+        مساحات العمل المضافة بـ /connect تُفتح عند أول رسالة لها
+        """
+        self.workspaces.start(bot)
+        self.acknowledger.start(bot)
+        self.drainer.start()
+
+        # الفحوص مستقلة عن بعضها، فتعمل بالتوازي حتى لا يطول بدء التشغيل
+        checks = [self._check_notion()]
+        if self.metrics_server is not None:
+            checks.append(self.metrics_server.start())
+        results = await asyncio.gather(*checks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, APIResponseError) and result.code == APIErrorCode.Unauthorized:
+                raise result
+        for result in results[1:]:
+            if isinstance(result, BaseException):
+                logger.warning("تعذر إكمال التهيئة: %s", result)
+
+    async def _check_notion(self):
+        try:
+            await self.default_workspace.check()
+            logger.info("تم الاتصال بـ Notion بنجاح")
+        except APIResponseError as e:
+            if e.code == APIErrorCode.Unauthorized:
+                logger.error("فشل الاتصال بـ Notion: %s", e)
+                raise
+            logger.warning("Notion غير متاح حالياً، سيتم حفظ الرسائل وإرسالها لاحقاً: %s", e)
+        except Exception as e:
+            logger.warning("Notion غير متاح حالياً، سيتم حفظ الرسائل وإرسالها لاحقاً: %s", e)
+
+    async def stop(self):
+        """
+        إيقاف المُفرِّغ ثم إغلاق الصندوق الصادر واتصالات Notion
+        الرسائل التي لم تُرسل تبقى على القرص وتُرسل عند التشغيل التالي
+        """
+        logger.info("جاري تفريغ الرسائل المنتظرة قبل الإيقاف...")
+        # الاستيراد يُستكمل من نقطة الحفظ عند إعادة الأمر بعد التشغيل التالي
+        for task in list(self.backfill_tasks.values()):
+            task.cancel()
+        await self.album_aggregator.flush()
+        await self.acknowledger.stop()
+        await self.drainer.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        for connection in self.workspaces:
+            logger.info("إحصائيات طلبات Notion لمساحة العمل %s: %s", connection.workspace or "الافتراضية",
+                        connection.dispatcher.stats)
+        self.outbox.close()
+        self.digest.buffer.close()
+        self.bindings.close()
+        self.block_index.close()
+        await self.workspaces.close()
@@ -0,0 +1,97 @@
+import asyncio
+
+from telegram import Message
+from telegram.error import RetryAfter
+
+from ack import Acknowledger
+
+
+class FakeBot:
+    """
+    بوت وهمي يسجل الرسائل والتفاعلات المرسلة
+    """
+
+    def __init__(self, retry_after: int = 0, limited_chat=None):
+        self.sent = []
+        self.reactions = []
+        self.retry_after = retry_after
+        self.limited_chat = limited_chat
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == self.limited_chat:
+            raise RetryAfter(30)
+        if self.retry_after:
+            retry_after, self.retry_after = self.retry_after, 0
+            raise RetryAfter(retry_after)
+        self.sent.append((chat_id, kwargs.get("message_thread_id"), text))
+
+    async def set_message_reaction(self, chat_id, message_id, reaction):
+        self.reactions.append((chat_id, message_id, reaction))
+
+
+def make_message(message_id: int, thread_id: int = 4, chat_id: int = -1001234) -> Message:
+    return Message.de_json({
+        'message_id': message_id,
+        'date': 1234567890,
+        'chat': {'id': chat_id, 'type': 'supergroup', 'is_forum': True},
+        'message_thread_id': thread_id,
+        'is_topic_message': True,
+    }, None)
+
+
+def run_acks(acknowledger: Acknowledger, bot: FakeBot, messages: list, wait: float = 0.0, timeout: float = 5.0):
+    async def run():
+        acknowledger.start(bot)
+        for message in messages:
+            acknowledger.ack(message)
+        await asyncio.sleep(wait)
+        await acknowledger.stop(timeout)
+
+    asyncio.run(run())
+
+
+def test_summary_is_one_message_per_topic():
+    """
+    اختبار أن وضع summary يرسل رسالة واحدة لكل توبيك
+    """
+    bot = FakeBot()
+    messages = [make_message(i) for i in range(14)] + [make_message(100, thread_id=9)]
+    run_acks(Acknowledger("summary", window=0.05, rate=100, chat_rate=6000), bot, messages, wait=0.1)
+    assert sorted(bot.sent) == [
+        (-1001234, 4, "تم حفظ 14 رسائل في Notion"),
+        (-1001234, 9, "تم حفظ الرسالة في Notion بنجاح!"),
+    ]
+
+
+def test_reaction_and_silent_modes():
+    """
+    اختبار وضعي التفاعل والصمت
+    """
+    bot = FakeBot()
+    run_acks(Acknowledger("reaction", rate=100), bot, [make_message(7)])
+    assert bot.reactions == [(-1001234, 7, "👍")] and bot.sent == []
+
+    bot = FakeBot()
+    run_acks(Acknowledger("silent", rate=100), bot, [make_message(7)])
+    assert bot.reactions == [] and bot.sent == []
+
+
+def test_retry_after_is_respected():
+    """
+    اختبار إعادة إرسال التأكيد بعد RetryAfter
+    """
+    bot = FakeBot(retry_after=1)
+    run_acks(Acknowledger("reply", rate=100, chat_rate=6000), bot, [make_message(7)])
+    assert bot.sent == [(-1001234, 4, "تم حفظ الرسالة في Notion بنجاح!")]
+
+
+def test_busy_chat_does_not_delay_other_chats():
+    """
+    اختبار أن كل محادثة تُرسل بمعدلها، وأن RetryAfter يوقف المحادثة التي تلقته فقط
+    """
+    bot = FakeBot(limited_chat=-1009)
+    messages = [make_message(i, chat_id=-1009) for i in range(3)] + [make_message(i, chat_id=-1001) for i in range(3)]
+    acknowledger = Acknowledger("reply", rate=100, chat_rate=60)
+    run_acks(acknowledger, bot, messages, wait=0.1, timeout=0.1)
+    # 60 في الدقيقة: رسالة واحدة فوراً ثم واحدة كل ثانية
+    assert bot.sent == [(-1001, 4, "تم حفظ الرسالة في Notion بنجاح!")]
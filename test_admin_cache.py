@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+from admin_cache import AdminCache
+from fakes import FakeBot
+
+
+def member_update(chat_id: int, old: str, new: str):
+    return SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id),
+        old_chat_member=SimpleNamespace(status=old),
+        new_chat_member=SimpleNamespace(status=new),
+    )
+
+
+def test_admins_are_fetched_once_per_ttl():
+    """
+    اختبار أن قائمة المشرفين تُجلب بطلب واحد للطلبات المتزامنة وتبقى حتى انتهاء صلاحيتها
+    """
+    async def run():
+        bot = FakeBot()
+        bot.admins = {7}
+        cache = AdminCache(ttl=0.05)
+        results = await asyncio.gather(*(cache.is_admin(bot, -1001, user_id) for user_id in (7, 8, 7, 8)))
+        assert results == [True, False, True, False]
+        assert bot.admin_requests == 1
+
+        await asyncio.sleep(0.06)
+        assert await cache.is_admin(bot, -1001, 7)
+        assert bot.admin_requests == 2
+
+    asyncio.run(run())
+
+
+def test_member_update_invalidates_only_on_admin_change():
+    """
+    اختبار حذف القائمة عند ترقية عضو أو إزالة مشرف فقط
+    """
+    async def run():
+        bot = FakeBot()
+        cache = AdminCache(ttl=300)
+        assert not await cache.is_admin(bot, -1001, 8)
+
+        bot.admins = {8}
+        cache.on_member_update(member_update(-1001, "member", "restricted"))
+        assert not await cache.is_admin(bot, -1001, 8)
+        assert bot.admin_requests == 1
+
+        cache.on_member_update(member_update(-1001, "member", "administrator"))
+        assert await cache.is_admin(bot, -1001, 8)
+        assert bot.admin_requests == 2
+
+    asyncio.run(run())
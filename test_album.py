@@ -0,0 +1,44 @@
+import asyncio
+
+from album import AlbumAggregator
+
+
+def test_parts_are_delivered_together():
+    """
+    اختبار أن أجزاء الألبوم الواحد تُسلم معاً مرة واحدة وبترتيب وصولها
+    """
+    delivered = []
+
+    async def on_album(key, items):
+        delivered.append((key, items))
+
+    async def run():
+        aggregator = AlbumAggregator(on_album, window=0.05)
+        for i in range(10):
+            aggregator.add(("page", "g1"), i)
+        aggregator.add(("page", "g2"), "x")
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert sorted(delivered) == [(("page", "g1"), list(range(10))), (("page", "g2"), ["x"])]
+
+
+def test_flush_delivers_matching_albums_only():
+    """
+    اختبار تسليم ألبومات صفحة واحدة فوراً دون انتظار النافذة
+    """
+    delivered = []
+
+    async def on_album(key, items):
+        delivered.append(key)
+
+    async def run():
+        aggregator = AlbumAggregator(on_album, window=10)
+        aggregator.add(("a", "g1"), 1)
+        aggregator.add(("b", "g2"), 2)
+        await aggregator.flush(lambda key: key[0] == "a")
+        assert delivered == [("a", "g1")]
+        await aggregator.flush()
+
+    asyncio.run(run())
+    assert delivered == [("a", "g1"), ("b", "g2")]
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+from backfill import Backfill, export_to_message, iter_export_messages
+from outbox import Outbox
+
+CHAT = {'id': -1001234, 'type': 'supergroup', 'is_forum': True}
+
+
+def write_export(path, messages: list):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"name": "messages", "type": "private_supergroup", "id": 1234, "messages": messages}, f,
+                  ensure_ascii=False, indent=1)
+
+
+def text_message(message_id: int, text: str, reply_to: int = 4) -> dict:
+    return {"id": message_id, "type": "message", "date_unixtime": "1700000000",
+            "reply_to_message_id": reply_to, "text": text,
+            "text_entities": [{"type": "plain", "text": text}]}
+
+
+def test_messages_are_streamed_in_small_chunks(tmp_path):
+    """
+    اختبار قراءة الرسائل كتدفق حتى لو انقسمت بين أجزاء القراءة
+    """
+    path = tmp_path / "result.json"
+    write_export(path, [text_message(i, f"نص {i} ] , }}") for i in range(1, 50)])
+    ids = [item["id"] for item in iter_export_messages(str(path), chunk_size=7)]
+    assert ids == list(range(1, 50))
+
+
+def test_export_entities_become_bot_api_entities():
+    """
+    اختبار تحويل أجزاء النص المنسقة في التصدير إلى تنسيقات Bot API
+    """
+    data = {"id": 7, "type": "message", "date_unixtime": "1700000000", "text_entities": [
+        {"type": "plain", "text": "😀 "},
+        {"type": "bold", "text": "مهم"},
+        {"type": "text_link", "text": " رابط", "href": "https://example.com"},
+    ]}
+    message = export_to_message(data, CHAT, 4)
+    assert message.text == "😀 مهم رابط"
+    assert [(e.type, e.offset, e.length) for e in message.entities] == [("bold", 3, 3), ("text_link", 6, 5)]
+    assert message.entities[1].url == "https://example.com"
+    assert export_to_message({"id": 8, "type": "service", "action": "topic_created"}, CHAT, 4) is None
+
+
+def test_resume_from_checkpoint(tmp_path):
+    """
+    اختبار استيراد رسائل التوبيك فقط، واستكمال الاستيراد دون تكرار بعد التوقف
+    """
+    path = tmp_path / "result.json"
+    messages = [text_message(i, f"m{i}") for i in range(5, 15)]
+    messages.append(text_message(20, "توبيك آخر", reply_to=99))
+    messages.append(text_message(21, "رد داخل التوبيك", reply_to=14))
+    write_export(path, messages[:6])
+
+    class Drainer:
+        def notify(self, page_id):
+            pass
+
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    backfill = Backfill(outbox, Drainer())
+    assert asyncio.run(backfill.run(str(path), CHAT, 4, "page")) == 6
+
+    # تصدير أحدث لنفس المحادثة يحتوي الرسائل السابقة والجديدة
+    write_export(path, messages)
+    assert asyncio.run(backfill.run(str(path), CHAT, 4, "page")) == 11
+    assert outbox.pending_count("page") == 11
+    outbox.close()
+
+
+def test_import_stops_where_live_saving_started(tmp_path):
+    """
+    اختبار توقف الاستيراد عند رسالة الربط، فلا تتكرر الرسائل والألبومات التي حُفظت مباشرة
+    """
+    path = tmp_path / "result.json"
+    write_export(path, [text_message(i, f"m{i}") for i in range(5, 15)])
+
+    class Drainer:
+        def notify(self, page_id):
+            pass
+
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    backfill = Backfill(outbox, Drainer())
+    assert asyncio.run(backfill.run(str(path), CHAT, 4, "page", live_from=10)) == 5
+    assert [entry.key for entry in outbox.pending("page")][-1] == f"{CHAT['id']}:9"
+    outbox.close()
+
+
+def test_sparse_topic_yields_and_ignores_other_backlogs(tmp_path):
+    """
+    اختبار أن الاستيراد يترك حلقة الأحداث أثناء قراءة رسائل التوبيكات الأخرى،
+    ولا ينتظر الرسائل المنتظرة لصفحات أخرى
+    """
+    path = tmp_path / "result.json"
+    messages = [text_message(i, f"m{i}", reply_to=99) for i in range(5, 1600)]
+    messages.append(text_message(2000, "داخل التوبيك"))
+    write_export(path, messages)
+
+    class Drainer:
+        def notify(self, page_id):
+            pass
+
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    for number in range(20):
+        outbox.put(f"other:{number}", "other", [])
+    backfill = Backfill(outbox, Drainer(), max_pending=5)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        started = ticks
+        imported = await asyncio.wait_for(backfill.run(str(path), CHAT, 4, "page"), 5)
+        ticker.cancel()
+        return imported, ticks - started
+
+    imported, ticks = asyncio.run(run())
+    assert imported == 1
+    assert ticks >= 3
+    outbox.close()
@@ -0,0 +1,124 @@
+import json
+
+from binding_store import DEFAULT_WORKSPACE, BindingStore, Shard
+
+
+def test_bindings_are_scoped_by_chat_and_persisted(tmp_path):
+    """
+    اختبار أن نفس معرف التوبيك في مجموعتين لا يتعارض، وأن الروابط تبقى بعد إعادة الفتح
+    """
+    path = str(tmp_path / "bindings.db")
+    store = BindingStore(path, legacy_path=None)
+    store.bind("-1001", "4", "page-a")
+    store.bind("-1002", "4", "page-b")
+    store.close()
+
+    store = BindingStore(path, legacy_path=None)
+    assert store.get("-1001", "4") == "page-a"
+    assert store.get("-1002", "4") == "page-b"
+    assert store.get("-1003", "4") is None
+    assert len(store) == 2
+
+
+def test_legacy_file_is_migrated_once_and_claimed(tmp_path):
+    """
+    اختبار نقل topic_pages.json مرة واحدة، وربط المحادثات الخاصة بمفتاحها نفسه
+    دون ربط التوبيكات القديمة بأول مجموعة تستخدم معرفها، وحذفها عند إعادة ربطها
+    """
+    legacy = tmp_path / "topic_pages.json"
+    legacy.write_text(json.dumps({"4": "page-old", "777": "page-private"}), encoding="utf-8")
+    path = str(tmp_path / "bindings.db")
+
+    store = BindingStore(path, legacy_path=str(legacy))
+    assert store.get("777", "777") == "page-private"
+    assert store.get("-1001", "4") is None
+    assert store.get("-1002", "4") is None
+    assert store.legacy_page("4") == "page-old"
+    store.close()
+
+    # تعديل الملف القديم بعد النقل لا يؤثر على المخزن
+    legacy.write_text(json.dumps({"4": "page-new", "5": "page-5"}), encoding="utf-8")
+    store = BindingStore(path, legacy_path=str(legacy))
+    assert store.get("777", "777") == "page-private"
+    assert store.legacy_page("4") == "page-old"
+    assert store.legacy_page("5") is None
+
+    # إعادة ربط التوبيك تحذف رابطه القديم، فلا يُطلب من المجموعات الأخرى إعادة الربط
+    store.bind("-1001", "4", "page-new")
+    assert store.legacy_page("4") is None
+    store.close()
+    store = BindingStore(path, legacy_path=str(legacy))
+    assert store.legacy_page("4") is None
+    assert store.get("-1001", "4") == "page-new"
+
+
+def test_database_target_is_persisted(tmp_path):
+    """
+    اختبار حفظ نوع الهدف (صفحة أو قاعدة بيانات) وبقائه بعد إعادة الفتح
+    """
+    path = str(tmp_path / "bindings.db")
+    store = BindingStore(path, legacy_path=None)
+    store.bind("-1001", "4", "db", target="database")
+    store.bind("-1001", "5", "page")
+    store.close()
+
+    store = BindingStore(path, legacy_path=None)
+    assert store.get_target("-1001", "4") == "database"
+    assert store.get_target("-1001", "5") == "page"
+    store.bind("-1001", "4", "page-2")
+    assert store.get_target("-1001", "4") == "page"
+
+
+def test_workspaces_are_persisted(tmp_path):
+    """
+    اختبار حفظ مساحة عمل المحادثة وتوكنها ومساحة عمل كل ربط وصفحاته الفرعية
+    """
+    path = str(tmp_path / "bindings.db")
+    store = BindingStore(path, legacy_path=None)
+    store.set_chat_workspace("-1001", "team", token="secret_team", name="Team")
+    store.bind("-1001", "4", "page", workspace=store.get_chat_workspace("-1001"))
+    store.bind("-1002", "4", "other")
+    store.save_shard("page", Shard("day:2024-01-01", "child", 0))
+    store.close()
+
+    store = BindingStore(path, legacy_path=None)
+    assert store.get_chat_workspace("-1001") == "team"
+    assert store.get_chat_workspace("-1002") == DEFAULT_WORKSPACE
+    assert store.workspace_token("team") == "secret_team"
+    assert store.get_workspace("-1001", "4") == "team"
+    assert store.page_workspace("page") == store.page_workspace("child") == "team"
+    assert store.page_workspace("other") == DEFAULT_WORKSPACE
+
+    store.set_chat_workspace("-1001", DEFAULT_WORKSPACE)
+    assert store.get_chat_workspace("-1001") == DEFAULT_WORKSPACE
+    assert store.get_workspace("-1001", "4") == "team"
+
+
+def test_live_from_survives_rebinding_same_page(tmp_path):
+    """
+    اختبار حفظ معرف رسالة الربط، وبقاء الأول عند إعادة الربط بنفس الصفحة
+    """
+    store = BindingStore(str(tmp_path / "bindings.db"), legacy_path=None)
+    store.bind("-1", "4", "page", live_from=50)
+    store.bind("-1", "4", "page", live_from=80)
+    assert store.live_from("-1", "4") == 50
+    store.bind("-1", "4", "other", live_from=90)
+    assert store.live_from("-1", "4") == 90
+    assert store.live_from("-1", "5") is None
+
+
+def test_shard_pages_include_other_processes(tmp_path):
+    """
+    اختبار أن صفحات التقسيم التي يحفظها عامل آخر تظهر في shard_pages دون إعادة فتح المخزن
+    """
+    path = str(tmp_path / "bindings.db")
+    store = BindingStore(path, legacy_path=None)
+    worker = BindingStore(path, legacy_path=None)
+    store.bind("-1", "4", "page")
+    store.save_shard("page", Shard("day:2024-01-01", "first", 0))
+    assert set(store.shard_pages()) == {"first"}
+
+    worker.save_shard("page", Shard("day:2024-01-02", "second", 0))
+    assert set(store.shard_pages()) == {"first", "second"}
+    worker.close()
+    store.close()
@@ -0,0 +1,20 @@
+from block_index import BlockIndex, IndexedMessage
+
+
+def test_entries_survive_cache_eviction_and_restart(tmp_path):
+    """
+    اختبار أن الفهرس يبقى على القرص بعد خروج الرسائل من الذاكرة المؤقتة وبعد إعادة التشغيل
+    """
+    path = str(tmp_path / "block_index.db")
+    index = BlockIndex(path, cache_size=2)
+    for i in range(5):
+        index.put(f"1:{i}", IndexedMessage("page", [[f"b{i}", "paragraph"]], [f"p{i}"]))
+    assert len(index._cache) == 2
+    assert index.get("1:0") == IndexedMessage("page", [["b0", "paragraph"]], ["p0"])
+    index.remove("1:1")
+    index.close()
+
+    index = BlockIndex(path)
+    assert index.get("1:1") is None
+    assert index.get("1:4").content == [["b4", "paragraph"]]
+    index.close()
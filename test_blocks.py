@@ -0,0 +1,116 @@
+from telegram import Message
+
+from blocks import build_album_blocks, build_content_blocks, build_message_blocks, build_message_link, EMPTY_PARAGRAPH
+
+
+def make_message(**fields) -> Message:
+    """
+    إنشاء رسالة توبيك وهمية مع الحقول المطلوبة
+    """
+    data = {
+        'message_id': 7,
+        'date': 1234567890,
+        'chat': {'id': -1001234, 'type': 'supergroup', 'is_forum': True},
+        'message_thread_id': 4,
+        'is_topic_message': True,
+    }
+    data.update(fields)
+    return Message.de_json(data, None)
+
+
+def plain_text(block: dict) -> str:
+    """
+    النص الكامل لكتلة فقرة
+    """
+    return "".join(part["text"]["content"] for part in block["paragraph"]["rich_text"])
+
+
+LINK = "https://t.me/c/1234/4/7"
+
+
+def test_message_link():
+    """
+    اختبار رابط رسالة التوبيك
+    """
+    assert build_message_link(make_message(text="x")) == LINK
+
+
+def test_text_message():
+    """
+    اختبار كتلة الرسالة النصية
+    """
+    kind, [block] = build_content_blocks(make_message(text="مرحبا"), LINK)
+    assert kind == "text"
+    assert plain_text(block) == "مرحبا"
+
+
+def test_photo_with_caption():
+    """
+    اختبار كتلة الصورة مع الوصف والرابط
+    """
+    photo = [{'file_id': 'f', 'file_unique_id': 'u', 'width': 1, 'height': 1}]
+    kind, [block] = build_content_blocks(make_message(photo=photo, caption="وصف"), LINK)
+    assert kind == "photo"
+    assert plain_text(block) == f"وصف\nصورة: {LINK}"
+    assert block["paragraph"]["rich_text"][-1]["text"]["link"] == {"url": LINK}
+
+
+def test_audio_metadata():
+    """
+    اختبار البيانات الوصفية للملف الصوتي
+    """
+    audio = {'file_id': 'f', 'file_unique_id': 'u', 'duration': 3, 'title': 'Song'}
+    _, [block] = build_content_blocks(make_message(audio=audio), LINK)
+    assert plain_text(block) == f"العنوان: Song\nالمؤدي: غير معروف\nملف صوتي: {LINK}"
+
+
+def test_animation_takes_precedence_over_document():
+    """
+    اختبار أن الصورة المتحركة لا تُعامل كمستند
+    """
+    animation = {'file_id': 'f', 'file_unique_id': 'u', 'width': 1, 'height': 1, 'duration': 1}
+    document = {'file_id': 'f', 'file_unique_id': 'u', 'file_name': 'a.mp4'}
+    kind, _ = build_content_blocks(make_message(animation=animation, document=document), LINK)
+    assert kind == "animation"
+
+
+def test_caption_entities_are_kept():
+    """
+    اختبار الحفاظ على تنسيق الوصف
+    """
+    photo = [{'file_id': 'f', 'file_unique_id': 'u', 'width': 1, 'height': 1}]
+    entities = [{'type': 'bold', 'offset': 0, 'length': 4}]
+    _, [block] = build_content_blocks(make_message(photo=photo, caption="وصف مهم", caption_entities=entities), LINK)
+    assert block["paragraph"]["rich_text"][0]["annotations"] == {"bold": True}
+    assert plain_text(block) == f"وصف مهم\nصورة: {LINK}"
+
+
+def test_unsupported_message():
+    """
+    اختبار الرسائل غير المدعومة
+    """
+    assert build_content_blocks(make_message(), LINK) == (None, None)
+
+
+def test_message_blocks_are_padded():
+    """
+    اختبار إحاطة المحتوى بسطرين فارغين
+    """
+    _, [block] = build_content_blocks(make_message(text="x"), LINK)
+    assert build_message_blocks([block]) == [EMPTY_PARAGRAPH, block, EMPTY_PARAGRAPH]
+
+
+def test_album_is_one_entry():
+    """
+    اختبار بناء الألبوم كوصف ثم toggle يضم كل الوسائط
+    """
+    photo = [{'file_id': 'f', 'file_unique_id': 'u', 'width': 1, 'height': 1}]
+    messages = [
+        make_message(message_id=7 + i, media_group_id="g", photo=photo, caption="رحلة" if i == 0 else None)
+        for i in range(3)
+    ]
+    caption, toggle = build_album_blocks(messages)
+    assert plain_text(caption) == "رحلة"
+    assert toggle["type"] == "toggle"
+    children = toggle["toggle"]["children"]
+    assert [plain_text(child) for child in children] == [f"صورة: https://t.me/c/1234/4/{7 + i}" for i in range(3)]
@@ -1,169 +1,278 @@
+# اختبار مسار الرسائل كاملاً دون شبكة: handle_message ثم الصندوق الصادر ثم خادم Notion الوهمي
 import asyncio
-import logging
 import os
-from telegram import Update, Message, Video, Bot
-from telegram.ext import ContextTypes, Application
-from bot import handle_message, topic_pages
-from dotenv import load_dotenv
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
-# تحميل المتغيرات البيئية
-load_dotenv()
-bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+import pytest
+from notion_client.errors import APIResponseError
+from telegram import Message, Update
 
-# إعداد السجلات
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    encoding='utf-8'
-)
-logger = logging.getLogger(__name__)
+from benchmark import create_bot, run_benchmark
+from fakes import FakeBot, FakeNotionServer, UpdateGenerator
 
-async def close_bot(bot):
+# الخادم يعمل في خيط منفصل، والبوت يُبنى مرة واحدة موجهاً إليه
+server = FakeNotionServer()
+server.start_in_thread()
+data_dir = tempfile.mkdtemp()
+bot, application = create_bot(server.base_url, data_dir)
+
+# كائنات البوت (عميل Notion والأقفال) مرتبطة بحلقة أحداث واحدة طوال الاختبارات
+loop = asyncio.new_event_loop()
+telegram_bot = FakeBot()
+loop.run_until_complete(bot.services.start(telegram_bot))
+
+
+def wait_for_blocks(page_id: str, count: int, timeout: float = 5.0) -> list:
     """
-    إغلاق جلسة البوت بأمان
+    انتظار وصول الكتل إلى الصفحة في الخادم الوهمي
     """
+    async def wait():
+        deadline = time.monotonic() + timeout
+        while len(server.children(page_id)) < count and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        return server.children(page_id)
+
+    return loop.run_until_complete(wait())
+
+
+def block_text(block: dict) -> str:
+    body = block[block["type"]]
+    return "".join(part["text"]["content"] for part in body.get("rich_text", []) + body.get("caption", []))
+
+
+def test_text_message():
+    """
+    اختبار حفظ رسالة نصية في الصفحة المرتبطة بالتوبيك
+    """
+    generator = UpdateGenerator(1, chat_id=-1001, bot=telegram_bot)
+    page_id = server.add_page("مذكرات")
+    bot.services.bindings.bind("-1001", "100", page_id)
+
+    loop.run_until_complete(bot.handle_message(generator.update(text="هذه رسالة اختبار"), None))
+    blocks = wait_for_blocks(page_id, 3)
+    assert [block["type"] for block in blocks] == ["paragraph", "paragraph", "paragraph"]
+    assert block_text(blocks[1]) == "هذه رسالة اختبار"
+
+
+def test_video_message():
+    """
+    اختبار حفظ رسالة فيديو مع وصفها
+    """
+    generator = UpdateGenerator(1, chat_id=-1002, bot=telegram_bot)
+    page_id = server.add_page("فيديوهات")
+    bot.services.bindings.bind("-1002", "100", page_id)
+
+    update = generator.update(
+        video={"file_id": "video", "file_unique_id": "video", "width": 1280, "height": 720, "duration": 30},
+        caption="هذا فيديو اختباري",
+    )
+    loop.run_until_complete(bot.handle_message(update, None))
+    blocks = wait_for_blocks(page_id, 3)
+    assert "هذا فيديو اختباري" in block_text(blocks[1])
+
+
+def test_concurrent_messages_keep_page_order():
+    """
+    اختبار أن الرسائل المتداخلة لتوبيكين تُعالج بالتوازي وتصل إلى كل صفحة بترتيب إرسالها
+    رغم تفاوت زمن رد Notion
+    """
+    generator = UpdateGenerator(2, chat_id=-1007, bot=telegram_bot)
+    pages = {100: server.add_page("أول"), 101: server.add_page("ثان")}
+    for thread_id, page_id in pages.items():
+        bot.services.bindings.bind("-1007", str(thread_id), page_id)
+
+    updates = [generator.update(thread_id, text=f"{thread_id}-{number}") for number in range(20) for thread_id in pages]
+    server.jitter = 0.02
     try:
-        await bot.close()
-    except Exception as e:
-        logger.warning(f"حدث خطأ أثناء إغلاق البوت: {str(e)}")
-
-async def test_text_message():
-    """
-    اختبار معالجة الرسائل النصية
-    """
-    # إنشاء تطبيق البوت
-    application = Application.builder().token(bot_token).build()
-    
-    # إنشاء رسالة وهمية
-    message_dict = {
-        'message_id': 1,
-        'date': 1234567890,
-        'chat': {
-            'id': 123456789,
-            'type': 'supergroup',
-            'title': 'Test Group',
-            'is_forum': True  # تفعيل المنتدى للتوبيكات
-        },
-        'message_thread_id': 1,  # معرف التوبيك
-        'is_topic_message': True,  # تأكيد أن الرسالة من توبيك
-        'from': {
-            'id': 123456789,
-            'is_bot': False,
-            'first_name': 'Test',
-            'username': 'test_user'
-        },
-        'text': 'هذه رسالة اختبار'
-    }
-    
-    # إضافة توبيك وهمي للاختبار
-    topic_pages[1] = "1285eaef-55e9-8002-bcbf-cd2f71e42c9f"
-    
-    # إنشاء كائن Update وهمي
-    bot = Bot(token=bot_token)
-    message = Message.de_json(message_dict, bot)
-    update = Update(1, message=message)
-    
-    # إنشاء سياق وهمي
-    context = ContextTypes.DEFAULT_TYPE(application=application)
-    
-    try:
-        # اختبار معالجة الرسالة
-        logger.info("بدء اختبار معالجة الرسالة النصية...")
-        await handle_message(update, context)
-        logger.info("انتهى اختبار معالجة الرسالة النصية")
-    finally:
-        # إغلاق جلسة البوت
-        await close_bot(bot)
-
-async def test_video_message():
-    """
-    اختبار معالجة رسائل الفيديو
-    """
-    # إنشاء تطبيق البوت
-    application = Application.builder().token(bot_token).build()
-    
-    # إنشاء فيديو وهمي
-    video_dict = {
-        'file_id': 'test_file_id',
-        'file_unique_id': 'test_unique_id',
-        'width': 1280,
-        'height': 720,
-        'duration': 30,
-        'file_name': 'test_video.mp4',
-        'mime_type': 'video/mp4',
-        'file_size': 1024,
-        'file_path': 'https://example.com/test_video.mp4'
-    }
-    
-    # إنشاء رسالة وهمية
-    message_dict = {
-        'message_id': 2,
-        'date': 1234567890,
-        'chat': {
-            'id': 123456789,
-            'type': 'supergroup',
-            'title': 'Test Group',
-            'is_forum': True
-        },
-        'message_thread_id': 1,
-        'is_topic_message': True,
-        'from': {
-            'id': 123456789,
-            'is_bot': False,
-            'first_name': 'Test',
-            'username': 'test_user'
-        },
-        'video': video_dict,
-        'caption': 'هذا فيديو اختباري'  # إضافة وصف للفيديو
-    }
-    
-    # إضافة توبيك وهمي للاختبار
-    topic_pages[1] = "1285eaef-55e9-8002-bcbf-cd2f71e42c9f"
-    
-    # إنشاء كائن Update وهمي
-    bot = Bot(token=bot_token)
-    message = Message.de_json(message_dict, bot)
-    update = Update(2, message=message)
-    
-    # إنشاء سياق وهمي
-    context = ContextTypes.DEFAULT_TYPE(application=application)
-    
-    try:
-        # اختبار معالجة الرسالة
-        logger.info("بدء اختبار معالجة رسالة الفيديو...")
-        await handle_message(update, context)
-        logger.info("انتهى اختبار معالجة رسالة الفيديو")
+        async def send():
+            await asyncio.gather(*(bot.handle_message(update, None) for update in updates))
+        loop.run_until_complete(send())
+        for thread_id, page_id in pages.items():
+            blocks = wait_for_blocks(page_id, 60)
+            texts = [block_text(block) for block in blocks if block_text(block)]
+            assert texts == [f"{thread_id}-{number}" for number in range(20)]
     finally:
-        # إغلاق جلسة البوت
-        await close_bot(bot)
+        server.jitter = 0.0
+
 
-async def run_tests():
+def test_rollover_topic_edits_reach_the_shard():
     """
-    تشغيل جميع الاختبارات
+    اختبار كتابة رسائل التوبيك المقسم في صفحته الفرعية عند الإرسال، ووصول تعديلها إلى نفس الصفحة
     """
-    logger.info("بدء تشغيل الاختبارات...")
-    
-    try:
-        # اختبار الرسائل النصية
-        await test_text_message()
-        
-        # انتظار قليلاً بين الاختبارات
-        await asyncio.sleep(1)
-        
-        # اختبار رسائل الفيديو
-        await test_video_message()
-        
-        logger.info("انتهت جميع الاختبارات")
-    except Exception as e:
-        logger.error(f"حدث خطأ أثناء تشغيل الاختبارات: {str(e)}")
-        raise
-
-if __name__ == "__main__":
-    try:
-        # تشغيل الاختبارات
-        asyncio.run(run_tests())
-    except KeyboardInterrupt:
-        logger.info("تم إيقاف الاختبارات بواسطة المستخدم")
-    except Exception as e:
-        logger.error(f"حدث خطأ غير متوقع: {str(e)}")
-        raise
+    generator = UpdateGenerator(1, chat_id=-1008, bot=telegram_bot)
+    page_id = server.add_page("يوميات")
+    bot.services.bindings.bind("-1008", "100", page_id)
+    bot.services.bindings.set_rollover("-1008", "100", "daily")
+
+    update = generator.update(text="قبل التعديل")
+    loop.run_until_complete(bot.handle_message(update, None))
+    # الرسالة محفوظة تحت الصفحة المرتبطة، والصفحة الفرعية تُنشأ عند الإرسال
+    shards = []
+    deadline = time.monotonic() + 5
+    while not shards and time.monotonic() < deadline:
+        loop.run_until_complete(asyncio.sleep(0.02))
+        shards = [shard for shard, page in list(server.pages.items()) if page.get("parent") == page_id]
+    assert len(wait_for_blocks(shards[0], 3)) == 3
+
+    edited = update.message.to_dict()
+    edited.update(text="بعد التعديل", edit_date=edited["date"] + 60)
+    edited = Update(update.update_id + 1000, edited_message=Message.de_json(edited, telegram_bot))
+    loop.run_until_complete(bot.handle_edited_message(edited, None))
+    deadline = time.monotonic() + 5
+    while block_text(server.children(shards[0])[1]) != "بعد التعديل" and time.monotonic() < deadline:
+        loop.run_until_complete(asyncio.sleep(0.02))
+    assert block_text(server.children(shards[0])[1]) == "بعد التعديل"
+    assert server.children(page_id) == []
+
+
+def test_unbound_topic_is_ignored():
+    """
+    اختبار أن رسائل التوبيكات غير المرتبطة لا تصل إلى Notion
+    """
+    before = server.total_requests
+    generator = UpdateGenerator(1, chat_id=-1003, bot=telegram_bot)
+    loop.run_until_complete(bot.handle_message(generator.update(), None))
+    loop.run_until_complete(asyncio.sleep(0.1))
+    assert server.total_requests == before
+
+
+def test_digest_mode_writes_one_batch():
+    """
+    اختبار أن رسائل التوبيك في وضع الملخص تُكتب كعنوان وقائمة نقطية في طلب إضافة واحد
+    """
+    generator = UpdateGenerator(1, chat_id=-1006, bot=telegram_bot)
+    page_id = server.add_page("ملخصات")
+    bot.services.bindings.bind("-1006", "100", page_id)
+    bot.services.bindings.set_digest("-1006", "100", "hourly")
+
+    for number in range(5):
+        loop.run_until_complete(bot.handle_message(generator.update(text=f"رسالة {number}"), None))
+    loop.run_until_complete(asyncio.sleep(0.1))
+    assert server.children(page_id) == []
+
+    before = server.total_requests
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    assert loop.run_until_complete(bot.services.digest.flush_due(now=later)) == 1
+    blocks = wait_for_blocks(page_id, 6)
+    assert [block["type"] for block in blocks] == ["heading_3"] + ["bulleted_list_item"] * 5
+    assert block_text(blocks[1]).startswith("رسالة 0")
+    assert server.total_requests - before == 1
+
+
+def test_connected_workspace_uses_its_token():
+    """
+    اختبار أن توبيكات المحادثة المرتبطة بمساحة عمل أخرى تُكتب بتوكنها
+    وأن التوكن المرفوض لا يغير مساحة عمل المحادثة
+    """
+    server.invalid_tokens.add("secret_invalid")
+    with pytest.raises(APIResponseError):
+        loop.run_until_complete(bot.services.connect("-1004", "secret_invalid"))
+    assert bot.services.bindings.get_chat_workspace("-1004") == ""
+
+    loop.run_until_complete(bot.services.connect("-1004", "secret_team"))
+    workspace = bot.services.bindings.get_chat_workspace("-1004")
+    assert workspace and bot.services.for_chat("-1004") is not bot.services.default_workspace
+
+    generator = UpdateGenerator(1, chat_id=-1004, bot=telegram_bot)
+    page_id = server.add_page("فريق")
+    bot.services.bindings.bind("-1004", "100", page_id, workspace=workspace)
+    before = server.tokens["secret_team"]
+    loop.run_until_complete(bot.handle_message(generator.update(text="رسالة الفريق"), None))
+    wait_for_blocks(page_id, 3)
+    assert server.tokens["secret_team"] > before
+
+
+def test_connect_accepts_tokens_only_in_private():
+    """
+    اختبار رفض التوكن المرسل في المجموعة، وقبوله في المحادثة الخاصة من مشرف المجموعة فقط
+    """
+    telegram = FakeBot()
+    telegram.admins = {7}
+
+    def command(chat: dict, user_id: int, *args):
+        update = Update.de_json({
+            "update_id": user_id,
+            "message": {
+                "message_id": 1, "date": int(time.time()), "chat": chat, "text": " ".join(("/connect",) + args),
+                "from": {"id": user_id, "is_bot": False, "first_name": "مستخدم"},
+            },
+        }, telegram)
+        loop.run_until_complete(bot.connect(update, SimpleNamespace(bot=telegram, args=list(args))))
+
+    group = {"id": -1009, "type": "supergroup"}
+    command(group, 7, "secret_group")
+    assert bot.services.bindings.get_chat_workspace("-1009") == ""
+    assert "محادثة خاصة" in telegram.sent[-1][1]
+
+    command({"id": 8, "type": "private"}, 8, "-1009", "secret_group")
+    assert bot.services.bindings.get_chat_workspace("-1009") == ""
+
+    command({"id": 7, "type": "private"}, 7, "-1009", "secret_group")
+    assert bot.services.bindings.get_chat_workspace("-1009")
+    assert telegram.sent[-1][0] == 7
+
+
+def test_only_admins_can_bind_from_buttons():
+    """
+    اختبار أن الضغط على زر ربط الصفحة يُرفض لغير المشرفين ويُقبل للمشرفين
+    """
+    page_id = server.add_page("مشرفون")
+    page_index = bot.services.for_chat("-1005").page_index
+    loop.run_until_complete(page_index.refresh(full=True))
+    data = bot.services.callbacks.bind(-1005, 100, page_index.position(page_id), page_id)
+    message = {"message_id": 1, "date": int(time.time()), "chat": {"id": -1005, "type": "supergroup"}, "text": "اختر"}
+
+    def click(user_id: int):
+        update = Update.de_json({
+            "update_id": user_id,
+            "callback_query": {
+                "id": str(user_id), "chat_instance": "1", "data": data, "message": message,
+                "from": {"id": user_id, "is_bot": False, "first_name": "مستخدم"},
+            },
+        }, telegram_bot)
+        loop.run_until_complete(bot.button(update, SimpleNamespace(bot=telegram_bot)))
+
+    telegram_bot.admins = {1}
+    click(2)
+    assert bot.services.bindings.get("-1005", "100") is None
+    assert telegram_bot.answers[-1][2] is True
+
+    click(1)
+    assert bot.services.bindings.get("-1005", "100") == page_id
+    assert telegram_bot.admin_requests == 1
+
+
+def test_benchmark_smoke():
+    """
+    اختبار تشغيل قصير لأداة قياس الأداء
+    """
+    result = loop.run_until_complete(run_benchmark(bot, server, telegram_bot, rate=100, topics=4, duration=0.3))
+    assert result["delivered"] == result["messages"] == 30
+    assert 0 < result["requests_per_message"] < 1
+
+
+def test_import_has_no_side_effects():
+    """
+    اختبار أن استيراد وحدة البوت لا يحتاج إلى التوكنات ولا ينشئ قواعد البيانات
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        environ = {key: value for key, value in os.environ.items() if key not in ("NOTION_TOKEN", "TELEGRAM_BOT_TOKEN")}
+        environ["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run([sys.executable, "-c", "import bot; assert bot.services is None"], cwd=cwd, env=environ)
+        assert result.returncode == 0
+        assert os.listdir(cwd) == []
+
+
+def test_application_handlers():
+    """
+    اختبار أن create_application يسجل معالجات الأوامر والرسائل
+    """
+    commands = {command for handler in application.handlers[0] for command in getattr(handler, "commands", ())}
+    assert {"start", "delete", "backfill", "rollover", "digest", "connect"} <= commands
+    assert [job.callback for job in application.job_queue.jobs()] == [bot.flush_digests]
+    assert len(application.handlers[-1]) == 1
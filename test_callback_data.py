@@ -0,0 +1,47 @@
+from callback_data import BIND, NAV, CallbackSigner, find_page, page_fingerprint
+
+PAGE_ID = "1a2b3c4d-5e6f-4789-8abc-def012345678"
+
+
+def test_round_trip_fits_telegram_limit():
+    """
+    اختبار ترميز الأزرار وفكها ضمن حد 64 بايت حتى مع معرفات كبيرة
+    """
+    signer = CallbackSigner("secret")
+    data = signer.bind(-1001234567890123, 2 ** 31, 42, PAGE_ID)
+    assert len(data.encode()) <= 64
+
+    callback = signer.decode(data)
+    assert callback.action == BIND
+    assert (callback.chat_id, callback.thread_id, callback.value) == (-1001234567890123, 2 ** 31, 42)
+    assert callback.fingerprint == page_fingerprint(PAGE_ID)
+
+    callback = signer.decode(signer.nav(-1005, -1005, 20))
+    assert (callback.action, callback.value, callback.fingerprint) == (NAV, 20, 0)
+
+
+def test_forged_callbacks_are_rejected():
+    """
+    اختبار رفض الأزرار المعدلة أو الموقعة بسر آخر أو المشوهة
+    """
+    signer = CallbackSigner("secret")
+    data = signer.bind(-1005, 100, 3, PAGE_ID)
+
+    tampered = ("B" if data[5] == "A" else "A").join((data[:5], data[6:]))
+    assert signer.decode(tampered) is None
+    assert CallbackSigner("other").decode(data) is None
+    for garbage in ("", "page_100_abc", "!!!!", data[:-4]):
+        assert signer.decode(garbage) is None
+
+
+def test_find_page_survives_index_reordering():
+    """
+    اختبار إيجاد الصفحة ببصمتها إذا تغير موضعها في الفهرس، ورفضها إذا حُذفت
+    """
+    pages = [{"id": f"page-{number}"} for number in range(5)]
+    fingerprint = page_fingerprint("page-3")
+    assert find_page(pages, 3, fingerprint) is pages[3]
+
+    reordered = pages[3:] + pages[:3]
+    assert find_page(reordered, 3, fingerprint)["id"] == "page-3"
+    assert find_page(pages[:3], 3, fingerprint) is None
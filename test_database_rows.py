@@ -0,0 +1,105 @@
+import asyncio
+import re
+from datetime import datetime, timezone
+
+import httpx
+from notion_client.errors import APIResponseError
+from telegram import Message
+
+from database_rows import DatabaseRows, build_row
+
+
+class FakeDispatcher:
+    async def call(self, method, *args, **kwargs):
+        return await method(*args, **kwargs)
+
+
+class FakeNotion:
+    """
+    عميل Notion وهمي يحفظ مخطط قاعدة البيانات والصفوف المنشأة
+    """
+
+    def __init__(self, properties: dict):
+        self.properties = properties
+        self.retrieved = 0
+        self.rows = []
+        self.reject = 0
+        self.databases = self
+        self.pages = self
+
+    async def retrieve(self, database_id):
+        self.retrieved += 1
+        return {"id": database_id, "properties": dict(self.properties)}
+
+    async def update(self, database_id, properties):
+        for name, body in properties.items():
+            self.properties[name] = {"type": next(iter(body))}
+
+    async def create(self, parent, properties, children):
+        if self.reject:
+            self.reject -= 1
+            raise APIResponseError(httpx.Response(400), "invalid property", "validation_error")
+        self.rows.append((parent["database_id"], properties, children))
+        return {"id": f"row-{len(self.rows)}"}
+
+
+def message(text: str) -> Message:
+    return Message.de_json({
+        "message_id": 7,
+        "date": int(datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()),
+        "chat": {"id": -1001, "type": "supergroup"},
+        "from": {"id": 1, "is_bot": False, "first_name": "سارة", "last_name": "علي"},
+        "text": text,
+        "entities": [
+            {"type": "hashtag", "offset": match.start(), "length": len(match.group())}
+            for match in re.finditer(r"#\w+", text)
+        ],
+    }, None)
+
+
+def test_build_row_properties():
+    """
+    اختبار أن خصائص الصف تُستخرج من الرسالة: العنوان والمرسل والتاريخ والوسوم
+    """
+    row = build_row(message("فكرة جديدة\nمع #عمل، #مهم"), "text", [{"type": "paragraph"}], "https://t.me/c/1/7")
+    assert row["title"] == "فكرة جديدة"
+    assert row["sender"] == "سارة علي"
+    assert row["date"].startswith("2024-05-01")
+    assert row["type"] == "نص"
+    assert row["tags"] == ["عمل", "مهم"]
+    assert row["children"] == [{"type": "paragraph"}]
+
+
+def test_missing_properties_are_added_once():
+    """
+    اختبار إضافة الخصائص الناقصة مرة واحدة فقط، وترك الخاصية ذات النوع المختلف
+    """
+    notion = FakeNotion({"الاسم": {"type": "title"}, "الرابط": {"type": "rich_text"}})
+    rows = DatabaseRows(notion, FakeDispatcher())
+    row = build_row(message("فكرة جديدة\nمع #عمل، #مهم"), "text", [], "https://t.me/c/1/7")
+
+    async def run():
+        await asyncio.gather(rows.create("db", row), rows.create("db", row))
+
+    asyncio.run(run())
+    assert notion.retrieved == 1
+    assert len(notion.rows) == 2
+    _, properties, _ = notion.rows[0]
+    assert properties["الاسم"]["title"][0]["text"]["content"] == "فكرة جديدة"
+    assert properties["الوسوم"] == {"multi_select": [{"name": "عمل"}, {"name": "مهم"}]}
+    assert properties["النوع"] == {"select": {"name": "نص"}}
+    assert "الرابط" not in properties
+
+
+def test_schema_is_reloaded_after_validation_error():
+    """
+    اختبار إعادة قراءة الخصائص مرة واحدة إذا رفض Notion الصف بعد تعديل قاعدة البيانات
+    """
+    notion = FakeNotion({"Name": {"type": "title"}})
+    rows = DatabaseRows(notion, FakeDispatcher())
+    row = build_row(message("نص #عمل #مهم"), "text", [], "https://t.me/c/1/7")
+    asyncio.run(rows.create("db", row))
+    notion.reject = 1
+    asyncio.run(rows.create("db", row))
+    assert notion.retrieved == 2
+    assert len(notion.rows) == 2
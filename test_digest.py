@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timezone
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+from binding_store import BindingStore
+from digest import Digest, DigestBuffer, build_digest_blocks, parse_period
+
+
+def at(hour: int, minute: int = 0, day: int = 17) -> datetime:
+    return datetime(2026, 10, day, hour, minute, tzinfo=timezone.utc)
+
+
+def make_digest(tmp_path, period: str):
+    store = BindingStore(str(tmp_path / "bindings.db"), legacy_path=None)
+    store.bind("-1001", "100", "page")
+    store.set_digest("-1001", "100", period)
+    written = []
+
+    async def write(key, chat_id, thread_id, page_id, date, blocks):
+        written.append((key, page_id, blocks))
+
+    return Digest(DigestBuffer(str(tmp_path / "digest.db")), store, write), written
+
+
+message_ids = count(1)
+
+
+def text_message(date: datetime, text: str):
+    return SimpleNamespace(message_id=next(message_ids), date=date, text=text, entities=())
+
+
+def add(digest: Digest, date: datetime, text: str):
+    message = text_message(date, text)
+    return digest.add("-1001", "100", "page", message, f"https://t.me/c/1/100/{message.message_id}")
+
+
+def test_parse_period():
+    """
+    اختبار قراءة فترة الملخص من الأمر
+    """
+    assert parse_period("Hourly") == "hourly"
+    assert parse_period("daily") == "daily"
+    assert parse_period("off") is None
+    with pytest.raises(ValueError):
+        parse_period("weekly")
+
+
+def test_hourly_digest_flushes_finished_hours_only(tmp_path):
+    """
+    اختبار كتابة ملخص لكل ساعة منتهية في إدخال واحد، وبقاء رسائل الساعة الحالية
+    """
+    digest, written = make_digest(tmp_path, "hourly")
+    for minute in (5, 30, 59):
+        assert add(digest, at(9, minute), f"رسالة {minute}")
+    add(digest, at(10, 15), "الساعة التالية")
+    add(digest, at(11, 1), "الساعة الحالية")
+
+    assert asyncio.run(digest.flush_due(now=at(11, 2))) == 2
+    assert [len(blocks) for _, _, blocks in written] == [4, 2]
+    heading, *bullets = written[0][2]
+    assert heading["type"] == "heading_3"
+    assert heading["heading_3"]["rich_text"][0]["text"]["content"] == "ملخص 2026-10-17 09:00–10:00"
+    assert [bullet["type"] for bullet in bullets] == ["bulleted_list_item"] * 3
+    assert bullets[0]["bulleted_list_item"]["rich_text"][-1]["text"]["link"]["url"].startswith("https://t.me/")
+    assert digest.buffer.pending_count() == 1
+
+    # لا شيء مستحق حتى تنتهي الساعة الحالية
+    assert asyncio.run(digest.flush_due(now=at(11, 59))) == 0
+
+
+def test_disabled_digest_flushes_everything(tmp_path):
+    """
+    اختبار كتابة كل الرسائل المنتظرة فور إلغاء وضع الملخص
+    """
+    digest, written = make_digest(tmp_path, "daily")
+    add(digest, at(9), "أولى")
+    add(digest, at(11), "ثانية")
+    assert asyncio.run(digest.flush_due(now=at(12))) == 0
+
+    digest.store.set_digest("-1001", "100", None)
+    asyncio.run(digest.flush_due(now=at(12)))
+    assert sum(len(blocks) - 1 for _, _, blocks in written) == 2
+    assert digest.buffer.pending_count() == 0
+
+
+def test_edits_and_duplicates_before_flush(tmp_path):
+    """
+    اختبار تعديل رسالة منتظرة وتجاهل تكرارها، وثبات مفتاح الملخص عند إعادة كتابته
+    """
+    digest, written = make_digest(tmp_path, "hourly")
+    message = text_message(at(9), "قبل التعديل")
+    assert digest.add("-1001", "100", "page", message, "https://t.me/c/1/100/1")
+    assert not digest.add("-1001", "100", "page", message, "https://t.me/c/1/100/1")
+    assert digest.buffer.update("-1001", message.message_id, [{"type": "text", "text": {"content": "بعد التعديل"}}])
+
+    items = digest.buffer.items("-1001", "100")
+    blocks = build_digest_blocks("ملخص", items)
+    assert blocks[1]["bulleted_list_item"]["rich_text"][0]["text"]["content"] == "بعد التعديل"
+
+    asyncio.run(digest.flush_due(now=at(10)))
+    assert written[0][0] == f"-1001:digest:100:{items[-1].id}"
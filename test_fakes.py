@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from notion_client import AsyncClient
+from notion_client.errors import APIErrorCode, APIResponseError
+
+from fakes import FakeBot, FakeNotionServer, UpdateGenerator
+from notion_dispatcher import NotionDispatcher
+
+
+def paragraph(text: str) -> dict:
+    return {"object": "block", "type": "paragraph",
+            "paragraph": {"rich_text": [{"type": "text", "text": {"content": text}}]}}
+
+
+def test_append_enforces_children_limit():
+    """
+    اختبار أن الخادم الوهمي يضيف الكتل بالترتيب ويرفض أكثر من 100 كتلة كما يفعل Notion
+    """
+    async def run():
+        server = FakeNotionServer()
+        await server.start()
+        notion = AsyncClient(auth="secret", base_url=server.base_url)
+        page_id = server.add_page("مذكرات")
+        try:
+            response = await notion.blocks.children.append(page_id, children=[paragraph("1"), paragraph("2")])
+            with pytest.raises(APIResponseError) as error:
+                await notion.blocks.children.append(page_id, children=[paragraph("x")] * 101)
+            return server, page_id, response, error.value
+        finally:
+            await notion.aclose()
+            await server.stop()
+
+    server, page_id, response, error = asyncio.run(run())
+    assert [block["id"] for block in response["results"]] == server.pages[page_id]["children"]
+    assert error.code == APIErrorCode.ValidationError
+    assert len(server.children(page_id)) == 2
+    assert server.requests["PATCH /v1/blocks/{id}/children"] == 2
+
+
+def test_throttling_goes_through_dispatcher_retries():
+    """
+    اختبار أن ردود 429 المحقونة تصل كأخطاء Notion حقيقية ويعيد المنظم المحاولة بعدها
+    """
+    async def run():
+        server = FakeNotionServer(throttle_probability=0.5, retry_after=0.01, seed=1)
+        await server.start()
+        notion = AsyncClient(auth="secret", base_url=server.base_url)
+        dispatcher = NotionDispatcher(rate=100, max_retries=10)
+        page_id = server.add_page("مذكرات")
+        try:
+            await asyncio.gather(*(
+                dispatcher.call(notion.blocks.children.append, page_id, children=[paragraph(str(i))])
+                for i in range(5)
+            ))
+            return server, page_id, dispatcher
+        finally:
+            await notion.aclose()
+            await server.stop()
+
+    server, page_id, dispatcher = asyncio.run(run())
+    assert len(server.children(page_id)) == 5
+    assert server.throttled > 0
+    assert dispatcher.stats["throttled"] == server.throttled
+
+
+def test_update_generator_spreads_messages_over_topics():
+    """
+    اختبار أن التحديثات الاصطناعية تتوزع على التوبيكات وترتبط بالبوت الوهمي
+    """
+    bot = FakeBot()
+    generator = UpdateGenerator(3, bot=bot)
+    updates = [generator.update() for _ in range(6)]
+    assert [update.message.message_thread_id for update in updates] == [100, 101, 102, 100, 101, 102]
+    assert len({update.update_id for update in updates}) == 6
+    assert all(update.message.is_topic_message and update.message.text for update in updates)
+
+    asyncio.run(updates[0].message.reply_text("تم"))
+    assert bot.sent[0][1] == "تم"
@@ -0,0 +1,47 @@
+import asyncio
+import json
+import logging
+
+from log_config import CorrelationFilter, DebugSampler, JsonFormatter, redact, set_correlation_id
+
+
+def record(level: int, msg: str, *args) -> logging.LogRecord:
+    return logging.LogRecord("bot", level, __file__, 1, msg, args, None)
+
+
+def test_json_lines_carry_the_update_id_of_their_task():
+    """
+    اختبار أن كل تحديث متزامن يكتب معرفه فقط، وأن التنسيق يحدث عند الكتابة
+    """
+    formatter = JsonFormatter()
+    correlation = CorrelationFilter()
+    lines = []
+
+    async def handle(update_id: int):
+        set_correlation_id(update_id)
+        await asyncio.sleep(0)
+        entry = record(logging.INFO, "رسالة %s", update_id)
+        correlation.filter(entry)
+        lines.append(json.loads(formatter.format(entry)))
+
+    async def run():
+        await asyncio.gather(handle(1), handle(2))
+
+    asyncio.run(run())
+    assert sorted((line["update_id"], line["msg"]) for line in lines) == [("1", "رسالة 1"), ("2", "رسالة 2")]
+    assert all(line["level"] == "INFO" and line["logger"] == "bot" for line in lines)
+
+
+def test_debug_sampling_keeps_higher_levels():
+    """
+    اختبار أن التقليل يطبق على DEBUG فقط
+    """
+    sampler = DebugSampler(0)
+    assert not sampler.filter(record(logging.DEBUG, "x"))
+    assert sampler.filter(record(logging.INFO, "x"))
+    assert DebugSampler(1).filter(record(logging.DEBUG, "x"))
+
+
+def test_redact_hides_message_text():
+    assert redact("نص سري") == "<6 chars>"
+    assert redact(None) == "<none>"
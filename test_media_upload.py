@@ -0,0 +1,148 @@
+import asyncio
+
+import httpx
+
+from blocks import FILE_REFERENCE
+from media_upload import MediaUploader
+from notion_dispatcher import NotionDispatcher
+
+
+FILE_BYTES = b"x" * 5000
+
+
+class FakeTelegramFile:
+    file_path = "https://api.telegram.org/file/bot123/photos/file_1.jpg"
+    file_size = len(FILE_BYTES)
+
+
+class FakeBot:
+    """
+    بوت وهمي يعيد نفس الملف دائماً
+    """
+
+    def __init__(self):
+        self.get_file_calls = 0
+
+    async def get_file(self, file_id):
+        self.get_file_calls += 1
+        return FakeTelegramFile()
+
+
+class FakeNotion:
+    """
+    عميل Notion وهمي لإنشاء طلبات الرفع
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, path, method, body=None):
+        self.requests.append((path, body))
+        return {"id": f"upload-{len(self.requests)}"}
+
+
+def reference(unique_id: str = "u1", file_size: int = len(FILE_BYTES)) -> dict:
+    """
+    مرجع ملف صورة كما يحفظه handle_message في الصندوق
+    """
+    return {
+        "type": FILE_REFERENCE,
+        FILE_REFERENCE: {
+            "file_id": "f1",
+            "file_unique_id": unique_id,
+            "file_size": file_size,
+            "file_name": None,
+            "mime_type": None,
+            "notion_type": "image",
+        },
+        "fallback": {"type": "paragraph", "paragraph": {"rich_text": [{"text": {"content": "صورة: "}}]}},
+    }
+
+
+def make_uploader(sent: list, **kwargs) -> MediaUploader:
+    """
+    إنشاء رافع متصل بخادم HTTP وهمي يمثل تيليجرام وNotion
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.telegram.org":
+            return httpx.Response(200, content=FILE_BYTES)
+        sent.append(request.read())
+        return httpx.Response(200, json={"status": "uploaded"})
+
+    uploader = MediaUploader(FakeNotion(), NotionDispatcher(rate=100), "token", enabled=True, **kwargs)
+    uploader.start(FakeBot(), http=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return uploader
+
+
+def test_reference_becomes_native_block():
+    """
+    اختبار رفع الملف كتدفق وتحويل المرجع إلى كتلة صورة أصلية
+    """
+    sent = []
+    uploader = make_uploader(sent)
+    blocks = asyncio.run(uploader.resolve_blocks([{"type": "paragraph"}, reference()]))
+    assert blocks[0] == {"type": "paragraph"}
+    assert blocks[1]["type"] == "image"
+    assert blocks[1]["image"]["file_upload"] == {"id": "upload-1"}
+    assert uploader.notion.requests[0][1]["filename"] == "file_1.jpg"
+    assert uploader.notion.requests[0][1]["content_type"] == "image/jpeg"
+    assert len(sent) == 1 and FILE_BYTES in sent[0]
+
+
+def test_upload_uses_configured_base_url():
+    """
+    اختبار إرسال الملف إلى عنوان Notion المحدد (الخادم الوهمي أو وسيط) بدل api.notion.com
+    """
+    urls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.telegram.org":
+            return httpx.Response(200, content=FILE_BYTES)
+        urls.append(str(request.url))
+        return httpx.Response(200, json={"status": "uploaded"})
+
+    uploader = MediaUploader(FakeNotion(), NotionDispatcher(rate=100), "token", enabled=True,
+                             base_url="http://127.0.0.1:8080/")
+    uploader.start(FakeBot(), http=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    asyncio.run(uploader.resolve_blocks([reference()]))
+    assert urls == ["http://127.0.0.1:8080/v1/file_uploads/upload-1/send"]
+
+
+def test_same_file_is_uploaded_once():
+    """
+    اختبار عدم رفع نفس الملف مرتين عند إعادة توجيهه
+    """
+    sent = []
+    uploader = make_uploader(sent)
+
+    async def run():
+        await asyncio.gather(uploader.resolve_blocks([reference()]), uploader.resolve_blocks([reference()]))
+        return await uploader.resolve_blocks([reference()])
+
+    blocks = asyncio.run(run())
+    assert blocks[0]["image"]["file_upload"] == {"id": "upload-1"}
+    assert len(sent) == 1
+    assert uploader.bot.get_file_calls == 1
+
+
+def test_oversized_file_keeps_link():
+    """
+    اختبار أن الملفات الأكبر من الحد تبقى رابطاً للرسالة
+    """
+    sent = []
+    uploader = make_uploader(sent, max_size=100)
+    blocks = asyncio.run(uploader.resolve_blocks([reference()]))
+    assert blocks[0]["type"] == "paragraph"
+    assert sent == []
+
+
+def test_album_children_are_resolved():
+    """
+    اختبار رفع الملفات الموجودة داخل toggle الألبوم
+    """
+    sent = []
+    uploader = make_uploader(sent)
+    toggle = {"type": "toggle", "toggle": {"rich_text": [], "children": [reference()]}}
+    [block] = asyncio.run(uploader.resolve_blocks([toggle]))
+    assert block["toggle"]["children"][0]["image"]["file_upload"] == {"id": "upload-1"}
+    assert toggle["toggle"]["children"][0]["type"] == "telegram_file"
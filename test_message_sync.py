@@ -0,0 +1,74 @@
+import asyncio
+
+from block_index import BlockIndex
+from blocks import EMPTY_PARAGRAPH
+from message_sync import ARCHIVE, EDIT, MessageSync
+from notion_dispatcher import NotionDispatcher
+
+
+def paragraph(text: str) -> dict:
+    return {"object": "block", "type": "paragraph", "paragraph": {"rich_text": [{"type": "text", "text": {"content": text}}]}}
+
+
+class FakeBlocks:
+    """
+    واجهة blocks وهمية تسجل الطلبات
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.children = self
+
+    async def update(self, block_id, **body):
+        self.calls.append(("update", block_id, body))
+
+    async def delete(self, block_id):
+        self.calls.append(("delete", block_id))
+
+    async def append(self, page_id, children, after=None):
+        self.calls.append(("append", page_id, after, [block["type"] for block in children]))
+        return {"results": [{"id": f"new-{i}"} for i in range(len(children))]}
+
+
+class FakeNotion:
+    def __init__(self):
+        self.blocks = FakeBlocks()
+
+
+def make_sync(tmp_path) -> MessageSync:
+    sync = MessageSync(FakeNotion(), NotionDispatcher(rate=100), BlockIndex(str(tmp_path / "index.db")))
+    sync.record("1:7", "page", [EMPTY_PARAGRAPH, paragraph("a"), EMPTY_PARAGRAPH], ["p1", "b1", "p2"])
+    return sync
+
+
+def test_edit_updates_block_in_place(tmp_path):
+    """
+    اختبار تعديل الكتلة في مكانها عندما لا يتغير نوعها
+    """
+    sync = make_sync(tmp_path)
+    asyncio.run(sync.apply("page", EDIT, {"target": "1:7", "blocks": [paragraph("b")]}))
+    assert sync.notion.blocks.calls == [("update", "b1", {"paragraph": paragraph("b")["paragraph"]})]
+
+
+def test_edit_with_new_structure_replaces_blocks(tmp_path):
+    """
+    اختبار إضافة الكتل الجديدة بعد القديمة ثم حذف القديمة عند تغير الأنواع
+    """
+    sync = make_sync(tmp_path)
+    code = {"object": "block", "type": "code", "code": {"rich_text": [], "language": "python"}}
+    asyncio.run(sync.apply("page", EDIT, {"target": "1:7", "blocks": [paragraph("b"), code]}))
+    assert sync.notion.blocks.calls == [
+        ("append", "page", "b1", ["paragraph", "code"]),
+        ("delete", "b1"),
+    ]
+    assert sync.index.get("1:7").content == [["new-0", "paragraph"], ["new-1", "code"]]
+
+
+def test_archive_removes_blocks_and_padding(tmp_path):
+    """
+    اختبار حذف كتل الرسالة والأسطر الفارغة المحيطة بها
+    """
+    sync = make_sync(tmp_path)
+    asyncio.run(sync.apply("page", ARCHIVE, {"target": "1:7"}))
+    assert [call[1] for call in sync.notion.blocks.calls] == ["b1", "p1", "p2"]
+    assert sync.index.get("1:7") is None
@@ -0,0 +1,70 @@
+import asyncio
+
+from notion_client import AsyncClient
+
+from metrics import Counter, Gauge, Histogram, MetricsServer, Registry, method_name
+
+
+def test_render_prometheus_text():
+    """
+    اختبار صيغة العرض: العدادات بالتسميات والفترات التراكمية للتوزيع
+    """
+    registry = Registry()
+    messages = registry.register(Counter("messages_total", "Messages", ("type", "outcome")))
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1.0)))
+    registry.register(Gauge("bound_topics", "Topics", function=lambda: 3))
+
+    messages.inc(type="text", outcome="saved")
+    messages.inc(2, type="text", outcome="saved")
+    latency.observe(0.05, method="append")
+    latency.observe(0.5, method="append")
+    latency.observe(5, method="append")
+
+    lines = registry.render().splitlines()
+    assert 'messages_total{type="text",outcome="saved"} 3' in lines
+    assert 'latency_seconds_bucket{method="append",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{method="append",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{method="append",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{method="append"} 3' in lines
+    assert "bound_topics 3" in lines
+    assert "# TYPE latency_seconds histogram" in lines
+
+
+def test_method_names():
+    """
+    اختبار أسماء طلبات Notion في المقاييس
+    """
+    notion = AsyncClient(auth="secret")
+    assert method_name(notion.blocks.children.append) == "notion.blocks.children.append"
+    assert method_name(notion.pages.create) == "notion.pages.create"
+    assert method_name(notion.search) == "notion.search"
+
+
+def test_server_serves_metrics():
+    """
+    اختبار أن نقطة HTTP تعرض المقاييس على /metrics فقط
+    """
+    registry = Registry()
+    registry.register(Counter("messages_total", "Messages")).inc()
+
+    async def get(port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def run():
+        server = MetricsServer(registry, "127.0.0.1", 0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await get(port, "/metrics"), await get(port, "/")
+        finally:
+            await server.stop()
+
+    metrics, other = asyncio.run(run())
+    assert metrics.startswith(b"HTTP/1.1 200 OK")
+    assert b"messages_total 1" in metrics
+    assert other.startswith(b"HTTP/1.1 404")
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import httpx
+from notion_client.errors import APIResponseError, RequestTimeoutError
+
+from notion_dispatcher import NotionDispatcher, TokenBucket
+
+
+def api_error(status: int, code: str, headers: dict = None) -> APIResponseError:
+    """
+    إنشاء خطأ Notion وهمي بالحالة المطلوبة
+    """
+    response = httpx.Response(status, headers=headers or {})
+    return APIResponseError(response, code, code)
+
+
+def test_rate_limited_call_honors_retry_after():
+    """
+    اختبار إعادة المحاولة بعد 429 مع احترام Retry-After
+    """
+    errors = [api_error(429, "rate_limited", {"Retry-After": "0.05"})]
+
+    async def request():
+        if errors:
+            raise errors.pop()
+        return {"ok": True}
+
+    dispatcher = NotionDispatcher(rate=100)
+    started = time.monotonic()
+    result = asyncio.run(dispatcher.call(request))
+    assert result == {"ok": True}
+    assert time.monotonic() - started >= 0.05
+    assert dispatcher.stats["throttled"] == 1
+    assert dispatcher.stats["retried"] == 1
+    assert dispatcher.stats["failed"] == 0
+
+
+def test_server_errors_and_timeouts_are_retried():
+    """
+    اختبار إعادة المحاولة عند أخطاء الخادم وانتهاء المهلة
+    """
+    errors = [api_error(503, "service_unavailable"), RequestTimeoutError()]
+
+    async def request():
+        if errors:
+            raise errors.pop()
+        return "done"
+
+    dispatcher = NotionDispatcher(rate=100, base_delay=0.001)
+    assert asyncio.run(dispatcher.call(request)) == "done"
+    assert dispatcher.stats["retried"] == 2
+
+
+def test_client_errors_fail_immediately():
+    """
+    اختبار أن أخطاء الطلب (مثل validation_error) لا يعاد إرسالها
+    """
+    calls = []
+
+    async def request():
+        calls.append(1)
+        raise api_error(400, "validation_error")
+
+    dispatcher = NotionDispatcher(rate=100)
+    try:
+        asyncio.run(dispatcher.call(request))
+    except APIResponseError:
+        pass
+    else:
+        raise AssertionError("expected APIResponseError")
+    assert len(calls) == 1
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_retries_are_bounded():
+    """
+    اختبار التوقف بعد استنفاد عدد المحاولات
+    """
+    async def request():
+        raise api_error(500, "internal_server_error")
+
+    dispatcher = NotionDispatcher(rate=100, max_retries=2, base_delay=0.001)
+    try:
+        asyncio.run(dispatcher.call(request))
+    except APIResponseError:
+        pass
+    assert dispatcher.stats == {"calls": 3, "throttled": 0, "retried": 2, "failed": 1}
+
+
+def test_token_bucket_paces_requests():
+    """
+    اختبار أن الدلو لا يسمح بأكثر من المعدل المحدد بعد استهلاك الدفعة الأولى
+    """
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.19
@@ -0,0 +1,226 @@
+import asyncio
+import sqlite3
+import time
+
+import httpx
+from notion_client.errors import APIResponseError
+
+from outbox import Outbox, OutboxDrainer, shard_of
+from write_buffer import PageWriteBuffer
+
+
+def blocks(n: int) -> list:
+    """
+    كتل رسالة واحدة للاختبار
+    """
+    return [{"n": n}]
+
+
+def test_put_is_idempotent(tmp_path):
+    """
+    اختبار أن نفس مفتاح الرسالة لا يُضاف مرتين
+    """
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    assert outbox.put("1:10", "page", blocks(1))
+    assert not outbox.put("1:10", "page", blocks(1))
+    assert [entry.id for entry in outbox.pending("page")] == [1]
+
+
+def test_drainer_delivers_in_order_and_replays_after_restart(tmp_path):
+    """
+    اختبار الإرسال بالترتيب، وبقاء الرسائل عند تعطل Notion ثم إرسالها بعد إعادة التشغيل
+    """
+    path = str(tmp_path / "outbox.db")
+    sent = []
+    available = False
+
+    async def append(page_id, children):
+        if not available:
+            raise httpx.ConnectError("notion down")
+        sent.extend(block["n"] for block in children)
+
+    async def first_run():
+        outbox = Outbox(path)
+        drainer = OutboxDrainer(outbox, PageWriteBuffer(append, flush_interval=0.01), min_retry_delay=60)
+        drainer.start()
+        for i in range(5):
+            outbox.put(f"1:{i}", "page", blocks(i))
+            drainer.notify("page")
+        await asyncio.sleep(0.05)
+        await drainer.stop()
+        outbox.close()
+
+    async def second_run():
+        outbox = Outbox(path)
+        drainer = OutboxDrainer(outbox, PageWriteBuffer(append, flush_interval=0.01))
+        drainer.start()
+        await asyncio.sleep(0.05)
+        await drainer.stop()
+        assert outbox.pending_pages() == []
+        outbox.close()
+
+    asyncio.run(first_run())
+    assert sent == []
+    available = True
+    asyncio.run(second_run())
+    assert sent == [0, 1, 2, 3, 4]
+
+
+def test_rejected_message_does_not_block_the_page(tmp_path):
+    """
+    اختبار أن الرسالة التي يرفضها Notion نهائياً لا تمنع إرسال ما بعدها
+    """
+    sent = []
+
+    async def append(page_id, children):
+        if any(block["n"] == 2 for block in children):
+            raise APIResponseError(httpx.Response(400), "invalid", "validation_error")
+        sent.extend(block["n"] for block in children)
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+        drainer = OutboxDrainer(outbox, PageWriteBuffer(append, flush_interval=0.01))
+        for i in range(5):
+            outbox.put(f"1:{i}", "page", blocks(i))
+        drainer.start()
+        await asyncio.sleep(0.2)
+        await drainer.stop()
+        return outbox.pending_pages()
+
+    assert asyncio.run(run()) == []
+    assert sent == [0, 1, 3, 4]
+
+
+def test_operations_run_after_earlier_appends(tmp_path):
+    """
+    اختبار أن العمليات الأخرى (مثل التعديل) تُنفذ بعد إضافة الرسائل التي قبلها وبترتيبها
+    """
+    events = []
+
+    async def append(page_id, children):
+        events.extend(("append", block["n"]) for block in children)
+        return [f"block-{block['n']}" for block in children]
+
+    async def apply(page_id, kind, payload):
+        events.append((kind, payload["target"]))
+
+    def on_delivered(key, page_id, sent_blocks, block_ids):
+        events.append(("record", key, block_ids))
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+        drainer = OutboxDrainer(
+            outbox, PageWriteBuffer(append, flush_interval=0.01), on_delivered=on_delivered, apply=apply
+        )
+        outbox.put("1:0", "page", blocks(0))
+        outbox.put("1:0:edit:5", "page", {"target": "1:0"}, kind="edit")
+        outbox.put("1:1", "page", blocks(1))
+        drainer.start()
+        await asyncio.sleep(0.1)
+        await drainer.stop()
+        return outbox.pending_pages()
+
+    assert asyncio.run(run()) == []
+    assert events == [
+        ("append", 0), ("record", "1:0", ["block-0"]),
+        ("edit", "1:0"),
+        ("append", 1), ("record", "1:1", ["block-1"]),
+    ]
+
+
+def test_parallel_kinds_run_together_after_appends(tmp_path):
+    """
+    اختبار أن الإدخالات المستقلة المتتالية (مثل صفوف قاعدة البيانات) تُنفذ معاً
+    """
+    running = []
+    peak = []
+
+    async def append(page_id, children):
+        return [None for _ in children]
+
+    async def apply(page_id, kind, payload):
+        running.append(payload)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(payload)
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+        drainer = OutboxDrainer(
+            outbox, PageWriteBuffer(append, flush_interval=0.01), apply=apply, parallel_kinds=("row",)
+        )
+        for i in range(5):
+            outbox.put(f"1:{i}", "db", {"n": i}, kind="row")
+        drainer.start()
+        await asyncio.sleep(0.1)
+        await drainer.stop()
+        return outbox.pending_pages()
+
+    assert asyncio.run(run()) == []
+    assert max(peak) == 5
+
+
+def test_drainer_sends_only_owned_pages(tmp_path):
+    """
+    اختبار أن كل صفحة تقع في جزء عامل واحد ثابت، وأن المُفرِّغ يتجاهل صفحات الأجزاء الأخرى
+    """
+    pages = [f"page-{i}" for i in range(20)]
+    assert [shard_of(page_id, 3) for page_id in pages] == [shard_of(page_id, 3) for page_id in pages]
+    assert {shard_of(page_id, 3) for page_id in pages} == {0, 1, 2}
+
+    sent = {}
+
+    async def append(page_id, children):
+        sent.setdefault(page_id, []).extend(block["n"] for block in children)
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+        for i, page_id in enumerate(pages):
+            outbox.put(f"1:{i}", page_id, blocks(i))
+        drainer = OutboxDrainer(
+            outbox, PageWriteBuffer(append, flush_interval=0.01), owns=lambda page_id: shard_of(page_id, 3) == 1
+        )
+        drainer.start()
+        await asyncio.sleep(0.05)
+        await drainer.stop()
+        assert sorted(outbox.pending_pages()) == sorted(page_id for page_id in pages if shard_of(page_id, 3) != 1)
+        outbox.close()
+
+    asyncio.run(run())
+    assert sorted(sent) == sorted(page_id for page_id in pages if shard_of(page_id, 3) == 1)
+
+
+def test_delivered_entries_are_purged_while_running(tmp_path, monkeypatch):
+    """
+    اختبار حذف الرسائل المرسلة القديمة أثناء التشغيل دون إعادة تشغيل، مع إبقاء الحديثة منها
+    """
+    path = str(tmp_path / "outbox.db")
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    async def append(page_id, children):
+        pass
+
+    def stored_keys():
+        with sqlite3.connect(path) as db:
+            return [row[0] for row in db.execute("SELECT idempotency_key FROM outbox ORDER BY id")]
+
+    async def run():
+        outbox = Outbox(path)
+        drainer = OutboxDrainer(outbox, PageWriteBuffer(append, flush_interval=0.01), retention=60, purge_interval=10)
+        drainer.start()
+        outbox.put("1:1", "page", blocks(1))
+        drainer.notify("page")
+        await asyncio.sleep(0.05)
+        assert stored_keys() == ["1:1"]
+
+        # بعد انتهاء مدة الاحتفاظ، أول دفعة تالية تحذف الرسالة القديمة
+        clock[0] += 120
+        outbox.put("1:2", "page", blocks(2))
+        drainer.notify("page")
+        await asyncio.sleep(0.05)
+        assert stored_keys() == ["1:2"]
+        await drainer.stop()
+        outbox.close()
+
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+import asyncio
+
+from page_index import PageIndex, get_page_title, UNTITLED
+
+
+def notion_page(page_id: str, title: str, edited: str) -> dict:
+    """
+    إنشاء صفحة Notion وهمية كما يعيدها البحث
+    """
+    return {
+        "id": page_id,
+        "last_edited_time": edited,
+        "properties": {"title": {"title": [{"plain_text": title}]}},
+    }
+
+
+class FakeSearch:
+    """
+    بحث Notion وهمي يدعم الترتيب والتقسيم إلى صفحات
+    """
+
+    def __init__(self, pages: list, page_size: int = 2):
+        self.pages = pages
+        self.page_size = page_size
+        self.requests = 0
+
+    async def __call__(self, **params):
+        self.requests += 1
+        ordered = sorted(self.pages, key=lambda p: p["last_edited_time"], reverse=True)
+        start = int(params.get("start_cursor") or 0)
+        end = start + self.page_size
+        return {
+            "results": ordered[start:end],
+            "has_more": end < len(ordered),
+            "next_cursor": str(end) if end < len(ordered) else None,
+        }
+
+
+def test_title_extraction():
+    """
+    اختبار استخراج العنوان والعنوان الافتراضي
+    """
+    assert get_page_title(notion_page("1", "مذكرات", "2024-01-01")) == "مذكرات"
+    assert get_page_title({"id": "2", "properties": {}}) == UNTITLED
+
+
+def test_full_load_follows_pagination():
+    """
+    اختبار أن التحميل الأول يجلب كل صفحات نتائج البحث
+    """
+    search = FakeSearch([notion_page(str(i), f"Page {i}", f"2024-01-0{i}") for i in range(1, 6)])
+    index = PageIndex(search)
+    pages = asyncio.run(index.get())
+    assert [page["id"] for page in pages] == ["5", "4", "3", "2", "1"]
+    assert search.requests == 3
+
+
+def test_incremental_refresh_stops_at_known_pages():
+    """
+    اختبار أن التحديث التدريجي يتوقف عند الصفحات المعروفة ويضيف الصفحات الجديدة
+    """
+    search = FakeSearch([notion_page(str(i), f"Page {i}", f"2024-01-0{i}") for i in range(1, 6)])
+    index = PageIndex(search, ttl=0)
+
+    async def run():
+        await index.refresh()
+        search.pages.append(notion_page("9", "Journal", "2024-01-09"))
+        search.requests = 0
+        await index.refresh()
+
+    asyncio.run(run())
+    # الصفحة 5 لها نفس وقت آخر تحديث فتُعاد قراءتها، ثم يتوقف البحث عند الصفحة 4
+    assert search.requests == 2
+    assert [page["id"] for page in index.filter("")][:2] == ["9", "5"]
+    assert [page["id"] for page in index.filter("jour")] == ["9"]
+
+
+def test_databases_are_indexed_with_their_title():
+    """
+    اختبار أن قواعد البيانات تظهر في الفهرس بعنوانها ونوعها
+    """
+    database = {
+        "object": "database",
+        "id": "db",
+        "last_edited_time": "2024-01-09",
+        "title": [{"plain_text": "المهام"}],
+        "properties": {"Name": {"type": "title"}},
+    }
+    index = PageIndex(FakeSearch([notion_page("1", "مذكرات", "2024-01-01"), database]))
+    asyncio.run(index.get())
+    assert get_page_title(database) == "المهام"
+    assert index.lookup("db")["object"] == "database"
+    assert index.lookup("1")["object"] == "page"
+    assert [page["id"] for page in index.filter("المهام")] == ["db"]
+
+
+def test_rows_and_shards_are_not_indexed():
+    """
+    اختبار إخفاء صفوف قواعد البيانات وصفحات التقسيم، ومنها صفحات تُحفظ بعد فهرستها،
+    مع بقاء صفحات المستخدم الفرعية تحت الصفحة المرتبطة
+    """
+    row = {**notion_page("row", "رسالة", "2024-01-05"), "parent": {"type": "database_id", "database_id": "db"}}
+    shard = {**notion_page("shard", "مذكرات (2)", "2024-01-04"), "parent": {"type": "page_id", "page_id": "1"}}
+    child = {**notion_page("child", "ملاحظة", "2024-01-03"), "parent": {"type": "page_id", "page_id": "1"}}
+    later = {**notion_page("later", "مذكرات (3)", "2024-01-06"), "parent": {"type": "page_id", "page_id": "1"}}
+    shards = {"shard"}
+    search = FakeSearch([notion_page("1", "مذكرات", "2024-01-01"), notion_page("2", "أفكار", "2024-01-02"),
+                         row, shard, child, later])
+    index = PageIndex(search, ttl=0, hidden_pages=lambda: shards)
+
+    asyncio.run(index.refresh())
+    assert [page["id"] for page in index.filter("")] == ["later", "child", "2", "1"]
+
+    shards.add("later")
+    asyncio.run(index.refresh())
+    assert [page["id"] for page in index.filter("")] == ["child", "2", "1"]
+
+
+def test_full_refresh_is_bounded():
+    """
+    اختبار توقف التحديث الكامل بعد حد الطلبات مع بقاء الصفحات الأقدم وحذف الأحدث التي لم تعد موجودة
+    """
+    search = FakeSearch([notion_page(str(i), f"Page {i}", f"2024-01-0{i}") for i in range(1, 8)])
+    index = PageIndex(search, ttl=0, max_full_requests=2)
+
+    async def run():
+        await index.refresh(full=True)
+        search.pages = [page for page in search.pages if page["id"] != "6"]
+        search.requests = 0
+        await index.refresh(full=True)
+
+    asyncio.run(run())
+    assert search.requests == 2
+    # أول تحميل يتوقف عند الصفحات 7..4، والتحديث الثاني يحذف 6 ولا يلمس ما بعد نهاية البحث
+    assert [page["id"] for page in index.filter("")] == ["7", "5", "4", "3"]
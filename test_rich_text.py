@@ -0,0 +1,95 @@
+from telegram import MessageEntity
+
+from rich_text import inline_rich_text, text_to_blocks, utf16_len
+
+
+def contents(block: dict) -> list:
+    """
+    نصوص عناصر rich_text في الكتلة
+    """
+    body = block[block["type"]]
+    return [item["text"]["content"] for item in body["rich_text"]]
+
+
+def test_entities_use_utf16_offsets():
+    """
+    اختبار أن مواضع التنسيق تحسب بوحدات UTF-16 (الرموز التعبيرية تأخذ وحدتين)
+    """
+    text = "😀 bold end"
+    entities = [MessageEntity("bold", 3, 4)]
+    [block] = text_to_blocks(text, entities)
+    items = block["paragraph"]["rich_text"]
+    assert [item["text"]["content"] for item in items] == ["😀 ", "bold", " end"]
+    assert items[1]["annotations"] == {"bold": True}
+    assert "annotations" not in items[0]
+
+
+def test_nested_entities_and_links():
+    """
+    اختبار التنسيقات المتداخلة والروابط
+    """
+    text = "see docs now"
+    entities = [
+        MessageEntity("text_link", 4, 8, url="https://example.com"),
+        MessageEntity("italic", 4, 4),
+    ]
+    [block] = text_to_blocks(text, entities)
+    items = block["paragraph"]["rich_text"]
+    assert [item["text"]["content"] for item in items] == ["see ", "docs", " now"]
+    assert items[1]["annotations"] == {"italic": True}
+    assert items[1]["text"]["link"] == {"url": "https://example.com"}
+    assert items[2]["text"]["link"] == {"url": "https://example.com"}
+
+
+def test_long_text_is_split_at_notion_limits():
+    """
+    اختبار تقسيم النص الطويل إلى عناصر لا تتجاوز 2000 حرف
+    """
+    text = "ا" * 4096
+    [block] = text_to_blocks(text)
+    assert [len(part) for part in contents(block)] == [2000, 2000, 96]
+
+
+def test_split_never_exceeds_utf16_limit():
+    """
+    اختبار أن التقسيم يحسب الرموز خارج BMP بوحدتين
+    """
+    text = "😀" * 1500
+    [block] = text_to_blocks(text)
+    assert all(utf16_len(part) <= 2000 for part in contents(block))
+    assert "".join(contents(block)) == text
+
+
+def test_code_and_lists_become_native_blocks():
+    """
+    اختبار تحويل pre والقوائم إلى كتل code وقوائم Notion
+    """
+    text = "Intro\nprint(1)\n- one\n- two\n1. first\nOutro"
+    entities = [MessageEntity("pre", 6, 8, language="py")]
+    blocks = text_to_blocks(text, entities)
+    assert [block["type"] for block in blocks] == [
+        "paragraph", "code", "bulleted_list_item", "bulleted_list_item", "numbered_list_item", "paragraph"
+    ]
+    assert blocks[1]["code"]["language"] == "python"
+    assert contents(blocks[1]) == ["print(1)"]
+    assert contents(blocks[2]) == ["one"]
+    assert contents(blocks[4]) == ["first"]
+
+
+def test_plain_multiline_text_stays_one_paragraph():
+    """
+    اختبار أن النص العادي متعدد الأسطر يبقى فقرة واحدة كما كان
+    """
+    [block] = text_to_blocks("a\n\nb")
+    assert contents(block) == ["a\n\nb"]
+
+
+def test_inline_rich_text_is_capped():
+    """
+    اختبار أن الوصف لا يتجاوز عدد العناصر المسموح
+    """
+    text = "ab" * 150
+    entities = [MessageEntity("bold", i, 1) for i in range(0, 300, 2)]
+    items = inline_rich_text(text, entities, limit=10)
+    assert len(items) == 10
+    assert "".join(item["text"]["content"] for item in items) == text
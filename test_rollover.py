@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from binding_store import BindingStore
+from rollover import RolloverRouter, parse_policy
+
+
+def make_router(tmp_path, policy: str):
+    store = BindingStore(str(tmp_path / "bindings.db"), legacy_path=None)
+    store.bind("-1", "4", "parent")
+    store.set_rollover("-1", "4", policy)
+    created = []
+
+    async def create_page(parent_page_id, title):
+        created.append(title)
+        return f"child-{len(created)}"
+
+    return RolloverRouter(store, create_page), created
+
+
+def day(n: int, hour: int = 12) -> datetime:
+    return datetime(2026, 10, n, hour, tzinfo=timezone.utc)
+
+
+def test_parse_policy():
+    """
+    اختبار قراءة سياسة التقسيم من الأمر
+    """
+    assert parse_policy("Daily") == "daily"
+    assert parse_policy("500") == "blocks:500"
+    assert parse_policy("off") is None
+    with pytest.raises(ValueError):
+        parse_policy("10")
+
+
+def test_daily_pages_are_created_once_and_cached(tmp_path):
+    """
+    اختبار إنشاء صفحة واحدة لكل يوم حتى مع الرسائل المتزامنة، وعودة الرسائل القديمة إلى صفحة يومها
+    """
+    router, created = make_router(tmp_path, "daily")
+
+    async def run():
+        first = await asyncio.gather(*(router.resolve("-1", "4", "parent", day(17), 3) for _ in range(5)))
+        second = await router.resolve("-1", "4", "parent", day(18), 3)
+        late = await router.resolve("-1", "4", "parent", day(17, 23), 3)
+        return first, second, late
+
+    first, second, late = asyncio.run(run())
+    assert set(first) == {"child-1"}
+    assert second == "child-2"
+    assert late == "child-1"
+    assert created == ["2026-10-17", "2026-10-18"]
+
+
+def test_block_count_rollover_survives_restart(tmp_path):
+    """
+    اختبار إنشاء صفحة جديدة عند تجاوز عدد الكتل، مع حفظ العدد بعد إعادة التشغيل
+    """
+    router, created = make_router(tmp_path, "blocks:100")
+
+    async def run(router):
+        return [await router.resolve("-1", "4", "parent", day(17), 30) for _ in range(4)]
+
+    assert asyncio.run(run(router)) == ["child-1", "child-1", "child-1", "child-2"]
+    # مخزن جديد (كأن البوت أعيد تشغيله) يكمل العد من القرص
+    restarted = RolloverRouter(BindingStore(router.store.path, legacy_path=None), router.create_page)
+    assert asyncio.run(run(restarted)) == ["child-2", "child-2", "child-3", "child-3"]
+    assert created == ["جزء 1", "جزء 2", "جزء 3"]
+
+
+def test_pages_are_chosen_when_sending(tmp_path):
+    """
+    اختبار حفظ الرسائل تحت الصفحة المرتبطة دون أي طلب، واختيار صفحتها الفرعية عند الإرسال فقط
+    """
+    router, created = make_router(tmp_path, "daily")
+    blocks = [{"type": "paragraph"}]
+    payload = router.defer("-1", "4", day(17), blocks)
+    assert created == []
+    assert router.defer("-1", "other", day(17), blocks) is blocks
+
+    assert asyncio.run(router.route("parent", payload)) == ("child-1", blocks)
+    assert asyncio.run(router.route("parent", blocks)) == ("parent", blocks)
+    assert created == ["2026-10-17"]
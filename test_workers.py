@@ -0,0 +1,195 @@
+# اختبار عمال الصندوق الصادر مع خادم Notion الوهمي
+import asyncio
+import os
+import socket
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from binding_store import BindingStore
+from fakes import FakeNotionServer
+from outbox import Outbox, shard_of
+from rollover import RolloverRouter
+from services import BotServices
+from workers import run_worker, start_workers, stop_workers, worker_metrics_port
+
+
+def settings(server: FakeNotionServer, data_dir) -> dict:
+    return {
+        "NOTION_TOKEN": "secret_fake",
+        "NOTION_BASE_URL": server.base_url,
+        "NOTION_RATE_LIMIT": "100",
+        "NOTION_FLUSH_INTERVAL": "0.01",
+        "OUTBOX_PATH": os.path.join(data_dir, "outbox.db"),
+        "DIGEST_PATH": os.path.join(data_dir, "digest.db"),
+        "BINDINGS_PATH": os.path.join(data_dir, "bindings.db"),
+        "BLOCK_INDEX_PATH": os.path.join(data_dir, "block_index.db"),
+        "OUTBOX_WORKERS": "2",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def paragraph(text: str) -> dict:
+    return {"object": "block", "type": "paragraph",
+            "paragraph": {"rich_text": [{"type": "text", "text": {"content": text}}]}}
+
+
+def texts(server: FakeNotionServer, page_id: str) -> list:
+    return [block["paragraph"]["rich_text"][0]["text"]["content"] for block in server.children(page_id)]
+
+
+def fill_outbox(server: FakeNotionServer, environ: dict, pages: int, messages: int) -> list:
+    """
+    إضافة رسائل إلى الصندوق كما تفعل عملية البوت، لصفحات مرتبطة بتوبيكات مختلفة
+    """
+    # معرفات ثابتة حتى يكون توزيع الصفحات على العمال ثابتاً بين التشغيلات
+    page_ids = [server.add_page(f"صفحة {i}", page_id=f"page-{i}") for i in range(pages)]
+    bindings = BindingStore(environ["BINDINGS_PATH"], legacy_path=None)
+    outbox = Outbox(environ["OUTBOX_PATH"])
+    for number in range(messages):
+        for i, page_id in enumerate(page_ids):
+            if number == 0:
+                bindings.bind("-1001", str(i), page_id)
+            outbox.put(f"-1001:{i}:{number}", page_id, [paragraph(str(number))])
+    bindings.close()
+    outbox.close()
+    return page_ids
+
+
+def test_workers_split_pages_and_keep_order(tmp_path):
+    """
+    اختبار أن العاملين يرسلان كل الصفحات معاً، كل صفحة من عامل واحد وبترتيب رسائلها
+    """
+    server = FakeNotionServer()
+
+    async def run():
+        await server.start()
+        environ = settings(server, str(tmp_path))
+        page_ids = fill_outbox(server, environ, pages=6, messages=5)
+        assert {shard_of(page_id, 2) for page_id in page_ids} == {0, 1}
+
+        stop = asyncio.Event()
+        workers = [asyncio.create_task(run_worker(environ, index, 2, stop, poll_interval=0.02)) for index in range(2)]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(len(server.children(page_id)) < 5 for page_id in page_ids):
+            await asyncio.sleep(0.02)
+        stop.set()
+        await asyncio.gather(*workers)
+        await server.stop()
+        return page_ids
+
+    page_ids = asyncio.run(run())
+    for page_id in page_ids:
+        assert texts(server, page_id) == ["0", "1", "2", "3", "4"]
+    assert Outbox(str(tmp_path / "outbox.db")).pending_count() == 0
+
+
+def test_worker_sees_policy_changes_for_known_pages(tmp_path):
+    """
+    اختبار وصول تفعيل /rollover إلى عامل يرسل الصفحة من قبل، دون إعادة تشغيله
+    """
+    server = FakeNotionServer()
+
+    async def run():
+        await server.start()
+        environ = settings(server, str(tmp_path))
+        page_ids = fill_outbox(server, environ, pages=1, messages=1)
+        page_id = page_ids[0]
+        stop = asyncio.Event()
+        worker = asyncio.create_task(run_worker(environ, shard_of(page_id, 2), 2, stop, poll_interval=0.02))
+
+        async def wait(condition):
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and not condition():
+                await asyncio.sleep(0.02)
+
+        await wait(lambda: len(server.children(page_id)) == 1)
+        # عملية البوت تفعّل التقسيم ثم تحفظ رسالة جديدة للصفحة نفسها
+        bindings = BindingStore(environ["BINDINGS_PATH"], legacy_path=None)
+        bindings.set_rollover("-1001", "0", "daily")
+        outbox = Outbox(environ["OUTBOX_PATH"])
+        blocks = RolloverRouter(bindings, None).defer("-1001", "0", datetime.now(timezone.utc), [paragraph("1")])
+        outbox.put("-1001:0:1", page_id, blocks)
+        outbox.close()
+        bindings.close()
+
+        shards = lambda: [shard for shard, page in list(server.pages.items()) if page.get("parent") == page_id]
+        await wait(lambda: shards() and server.children(shards()[0]))
+        stop.set()
+        await worker
+        await server.stop()
+        return page_id, shards()
+
+    page_id, shards = asyncio.run(run())
+    assert texts(server, page_id) == ["0"]
+    assert len(shards) == 1 and texts(server, shards[0]) == ["1"]
+
+
+def test_worker_exports_its_metrics(tmp_path):
+    """
+    اختبار أن كل عامل يعرض مقاييس طلبات Notion وتأخر الرسائل على منفذه الخاص
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = FakeNotionServer()
+
+    async def run():
+        await server.start()
+        environ = settings(server, str(tmp_path))
+        environ["METRICS_PORT"] = str(port - 2)
+        page_ids = fill_outbox(server, environ, pages=4, messages=2)
+        page_id = next(page_id for page_id in page_ids if shard_of(page_id, 2) == 1)
+
+        stop = asyncio.Event()
+        worker = asyncio.create_task(run_worker(environ, 1, 2, stop, poll_interval=0.02))
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and len(server.children(page_id)) < 2:
+            await asyncio.sleep(0.02)
+        url = f"http://127.0.0.1:{worker_metrics_port(port - 2, 1)}/metrics"
+        body = await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=5).read().decode())
+        stop.set()
+        await worker
+        await server.stop()
+        return body
+
+    body = asyncio.run(run())
+    assert "notion_requests_total" in body
+    assert "message_to_notion_lag_seconds_count" in body
+
+
+def test_worker_processes(tmp_path):
+    """
+    اختبار تشغيل العمال في عمليات منفصلة وإيقافهم
+    """
+    server = FakeNotionServer()
+    server.start_in_thread()
+    try:
+        environ = settings(server, str(tmp_path))
+        page_ids = fill_outbox(server, environ, pages=4, messages=3)
+        processes = start_workers(2, environ)
+        try:
+            deadline = time.monotonic() + 20
+            while time.monotonic() < deadline and any(len(server.children(page_id)) < 3 for page_id in page_ids):
+                time.sleep(0.05)
+        finally:
+            stop_workers(processes, timeout=10)
+        assert all(process.exitcode == 0 for process in processes)
+        for page_id in page_ids:
+            assert texts(server, page_id) == ["0", "1", "2"]
+    finally:
+        server.stop_thread()
+
+
+def test_workers_share_the_token_rate(tmp_path):
+    """
+    اختبار أن البوت والعمال يتقاسمون حد كل توكن بدل أن يأخذ كل منهم الحد كاملاً
+    """
+    environ = {**settings(FakeNotionServer(), str(tmp_path)), "NOTION_BASE_URL": "http://127.0.0.1:9"}
+    for shard in ((0, 2), None):
+        services = BotServices(environ, shard=shard)
+        assert services.default_workspace.dispatcher.bucket.rate == 100 / 3
+        services.outbox.close()
+        services.digest.buffer.close()
+        services.bindings.close()
+        services.block_index.close()
@@ -0,0 +1,35 @@
+import asyncio
+
+from workspaces import Workspace, WorkspacePool, workspace_id
+
+
+def test_pool_keeps_one_workspace_per_token():
+    """
+    اختبار أن لكل توكن مساحة عمل واحدة بعميل ومنظم مستقلين
+    """
+    async def run():
+        pool = WorkspacePool(lambda workspace, token: Workspace(workspace, token, block_index=None, rate=5))
+        first = pool.get("secret_a")
+        assert pool.get("secret_a") is first
+        second = pool.get("secret_b")
+        assert second.notion is not first.notion
+        assert second.dispatcher.bucket is not first.dispatcher.bucket
+        assert first.workspace == workspace_id("secret_a") != second.workspace
+        assert pool.get("secret_c", "").workspace == ""
+
+        await pool.discard("secret_b")
+        assert len(pool) == 2
+        assert pool.get("secret_b") is not second
+        await pool.close()
+        assert len(pool) == 0
+
+    asyncio.run(run())
+
+
+def test_workspace_id_does_not_contain_token():
+    """
+    اختبار أن معرف مساحة العمل ثابت ولا يكشف التوكن
+    """
+    assert workspace_id("secret_abc") == workspace_id("secret_abc")
+    assert "secret" not in workspace_id("secret_abc")
+    assert len(workspace_id("secret_abc")) == 16
@@ -0,0 +1,84 @@
+import asyncio
+from write_buffer import PageWriteBuffer
+
+
+def make_blocks(n: int) -> list:
+    """
+    إنشاء كتل رسالة واحدة للاختبار (سطر فارغ + محتوى + سطر فارغ)
+    """
+    return [{"n": n}, {"n": n}, {"n": n}]
+
+
+def test_burst_is_coalesced_in_order():
+    """
+    اختبار أن الرسائل المتتالية لنفس الصفحة تُرسل في طلب واحد وبنفس الترتيب
+    """
+    calls = []
+
+    async def append(page_id, children):
+        calls.append((page_id, [block["n"] for block in children]))
+
+    async def run():
+        buffer = PageWriteBuffer(append, flush_interval=0.01)
+        await asyncio.gather(*(buffer.add("page", make_blocks(i)) for i in range(30)))
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert calls[0][1] == [i for i in range(30) for _ in range(3)]
+
+
+def test_batches_respect_notion_limit():
+    """
+    اختبار أن الدفعة لا تتجاوز 100 كتلة ولا تقسم كتل الرسالة الواحدة
+    """
+    calls = []
+
+    async def append(page_id, children):
+        calls.append([block["n"] for block in children])
+
+    async def run():
+        buffer = PageWriteBuffer(append, flush_interval=10)
+        await asyncio.gather(*(buffer.add("page", make_blocks(i)) for i in range(40)))
+
+    asyncio.run(run())
+    assert all(len(call) <= 100 for call in calls)
+    assert [n for call in calls for n in call] == [i for i in range(40) for _ in range(3)]
+    assert len(calls[0]) == 99
+
+
+def test_failure_is_reported_to_callers():
+    """
+    اختبار أن خطأ Notion يصل إلى كل رسائل الدفعة الفاشلة
+    """
+    async def append(page_id, children):
+        raise RuntimeError("notion down")
+
+    async def run():
+        buffer = PageWriteBuffer(append, flush_interval=0.01)
+        return await asyncio.gather(
+            *(buffer.add("page", make_blocks(i)) for i in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_flush_all_sends_pending_pages():
+    """
+    اختبار تفريغ كل الصفحات المنتظرة عند الإيقاف
+    """
+    calls = []
+
+    async def append(page_id, children):
+        calls.append(page_id)
+
+    async def run():
+        buffer = PageWriteBuffer(append, flush_interval=60)
+        tasks = [asyncio.create_task(buffer.add(page, make_blocks(0))) for page in ("a", "b")]
+        await asyncio.sleep(0)
+        await buffer.flush_all()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert sorted(calls) == ["a", "b"]
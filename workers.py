@@ -0,0 +1,166 @@
+# عمال الصندوق الصادر: عمليات منفصلة ترسل رسائل الصندوق إلى Notion
+# عملية البوت (الاستقبال) تحوّل كل رسالة إلى كتل وتحفظها في outbox.db كما في التشغيل العادي،
+# وكل عامل يرسل الصفحات التي تقع في جزئه فقط (shard_of)، فتبقى رسائل الصفحة الواحدة بترتيبها
+# بينما تُرسل الصفحات المختلفة في عمليات وأنوية مختلفة
+#
+# الاستخدام: OUTBOX_WORKERS=4 python bot.py يشغل العمال مع البوت،
+# أو تشغيلهم منفصلين: python workers.py --workers 4 (مع OUTBOX_WORKERS=4 للبوت)
+# مع METRICS_PORT يعرض كل عامل مقاييسه (طلبات Notion وتأخر الرسائل) على المنفذ METRICS_PORT + 1 + رقمه
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+
+from dotenv import load_dotenv
+from telegram import Bot
+
+from log_config import setup_logging
+from services import BotServices
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5  # مدة انتظار الرسائل الجديدة في الصندوق بين كل فحص (بالثواني)
+
+
+def worker_metrics_port(base: int, index: int) -> int:
+    """
+    منفذ مقاييس العامل index، بعد منفذ البوت base
+    """
+    return base + 1 + index
+
+
+async def run_worker(environ, index: int, count: int, stop: asyncio.Event = None,
+                     poll_interval: float = POLL_INTERVAL):
+    """
+    إرسال رسائل صفحات هذا العامل حتى يُطلب الإيقاف
+
+    Args:
+        environ: إعدادات البوت نفسها (مسارات قواعد البيانات والتوكنات)
+        index (int): رقم العامل من 0
+        count (int): عدد العمال
+        stop (asyncio.Event): يُضبط لإيقاف العامل بعد انتهاء الدفعات الجارية
+    """
+    stop = stop or asyncio.Event()
+    # طلبات Notion تحدث في العمال، فلكل عامل نقطة مقاييس بعد منفذ البوت حتى لا يحجزوا نفس المنفذ
+    environ = dict(environ)
+    if environ.get("METRICS_PORT"):
+        environ["METRICS_PORT"] = str(worker_metrics_port(int(environ["METRICS_PORT"]), index))
+    services = BotServices(environ, shard=(index, count))
+    bot_token = environ.get("TELEGRAM_BOT_TOKEN")
+    # البوت يُستخدم فقط لتنزيل الملفات من تيليجرام عند رفع الوسائط
+    bot = Bot(bot_token) if bot_token else None
+    services.workspaces.start(bot, warm_index=False)
+    services.drainer.start()
+    if services.metrics_server is not None:
+        try:
+            await services.metrics_server.start()
+        except OSError as e:
+            logger.warning("تعذر تشغيل نقطة مقاييس العامل %s: %s", index + 1, e)
+    logger.info("بدء عامل الصندوق الصادر %s من %s", index + 1, count)
+
+    known = set()
+    try:
+        while not stop.is_set():
+            pages = [page_id for page_id in services.outbox.pending_pages() if services.drainer.owns(page_id)]
+            # الروابط وسياسات التقسيم ومساحات العمل تتغير في عملية البوت، فنعيد قراءتها
+            # عند ظهور صفحة جديدة أو تعديل bindings.db، حتى للصفحات التي يرسلها العامل من قبل
+            if not known.issuperset(pages) or services.bindings.changed():
+                await asyncio.to_thread(services.bindings.reload)
+                known.update(pages)
+            for page_id in pages:
+                services.drainer.notify(page_id)
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logger.info("إيقاف عامل الصندوق الصادر %s", index + 1)
+        await services.drainer.stop()
+        if services.metrics_server is not None:
+            await services.metrics_server.stop()
+        services.outbox.close()
+        services.digest.buffer.close()
+        services.bindings.close()
+        services.block_index.close()
+        await services.workspaces.close()
+        if bot is not None:
+            await bot.shutdown()
+
+
+def _worker_main(environ: dict, index: int, count: int):
+    """
+    نقطة بداية عملية العامل
+    """
+    setup_logging(
+        level=environ.get("LOG_LEVEL", "INFO"),
+        json_format=environ.get("LOG_FORMAT", "text") == "json",
+        debug_sample_rate=float(environ.get("LOG_DEBUG_SAMPLE", "1")),
+    )
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # الإيقاف (أو Ctrl+C في الطرفية) ينهي الدفعات الجارية قبل الخروج، والباقي يبقى في الصندوق
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await run_worker(environ, index, count, stop)
+
+    asyncio.run(main())
+
+
+def start_workers(count: int, environ=None) -> list:
+    """
+    تشغيل count عامل في عمليات منفصلة
+
+    Returns:
+        list: عمليات العمال (multiprocessing.Process)
+    """
+    environ = dict(os.environ if environ is None else environ)
+    # spawn حتى لا ترث العمليات حلقة الأحداث أو اتصالات قواعد البيانات من العملية الأم
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        process = context.Process(
+            target=_worker_main, args=(environ, index, count), name=f"outbox-worker-{index}", daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes: list, timeout: float = 30.0):
+    """
+    إيقاف العمال وانتظار انتهاء الدفعات الجارية
+    """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            logger.warning("العامل %s لم يتوقف خلال %s ثانية", process.name, timeout)
+            process.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="عمال إرسال الصندوق الصادر إلى Notion")
+    parser.add_argument("--workers", type=int, default=None, help="عدد العمال (الافتراضي OUTBOX_WORKERS)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    count = args.workers or int(os.getenv("OUTBOX_WORKERS", "0")) or os.cpu_count()
+    setup_logging(level=os.getenv("LOG_LEVEL", "INFO"), json_format=os.getenv("LOG_FORMAT", "text") == "json")
+    processes = start_workers(count)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
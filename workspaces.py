@@ -0,0 +1,168 @@
+# مساحات عمل Notion متعددة: لكل توكن integration عميل دائم واتصالاته وحد معدله الخاص
+# حتى لا يستهلك فريق كثير الرسائل حصة الفرق الأخرى
+import asyncio
+import hashlib
+import logging
+
+from notion_client import AsyncClient
+
+from database_rows import ROW, DatabaseRows
+from media_upload import MediaUploader
+from message_sync import MessageSync, created_block_ids
+from notion_dispatcher import NotionDispatcher
+from page_index import PageIndex
+
+logger = logging.getLogger(__name__)
+
+
+def workspace_id(token: str) -> str:
+    """
+    معرف ثابت لمساحة العمل مشتق من التوكن، يُحفظ مع الروابط بدل التوكن نفسه
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class Workspace:
+    """
+    اتصال بمساحة عمل واحدة: عميل Notion ومنظم طلباته ومكونات الكتابة التي تستخدمه
+    """
+
+    def __init__(self, workspace: str, token: str, block_index, base_url: str = "https://api.notion.com",
+                 rate: float = 3.0, max_retries: int = 5, page_index_ttl: float = 300.0, media: dict = None,
+                 hidden_pages=None):
+        """
+        Args:
+            workspace (str): معرف مساحة العمل (binding_store.DEFAULT_WORKSPACE للتوكن الافتراضي)
+            token (str): توكن الـ integration
+            block_index: فهرس كتل الرسائل المشترك بين كل مساحات العمل
+            rate (float): حد الطلبات في الثانية لهذا التوكن وحده
+            media (dict): إعدادات MediaUploader (enabled، max_size، concurrency)
+            hidden_pages: دالة تعيد معرفات صفحات التقسيم التي تُخفى من قائمة /start
+        """
+        self.workspace = workspace
+        # العميل يحتفظ باتصالات HTTP مفتوحة، فيُنشأ مرة واحدة لكل توكن ويبقى طوال التشغيل
+        self.notion = AsyncClient(auth=token, base_url=base_url)
+        self.dispatcher = NotionDispatcher(rate=rate, max_retries=max_retries)
+        self.media_uploader = MediaUploader(self.notion, self.dispatcher, token, base_url=base_url, **(media or {}))
+        self.message_sync = MessageSync(self.notion, self.dispatcher, block_index)
+        self.database_rows = DatabaseRows(self.notion, self.dispatcher, prepare=self.media_uploader.resolve_blocks)
+        self.page_index = PageIndex(self.search, ttl=page_index_ttl, hidden_pages=hidden_pages)
+        self._page_index_task = None
+
+    async def search(self, **params) -> dict:
+        """
+        البحث في Notion عبر الموزع
+        """
+        return await self.dispatcher.call(self.notion.search, **params)
+
+    async def append_blocks(self, page_id: str, children: list):
+        """
+        إضافة دفعة من الكتل إلى صفحة Notion
+
+        Returns:
+            list: معرفات الكتل المنشأة بنفس الترتيب
+        """
+        response = await self.dispatcher.call(self.notion.blocks.children.append, page_id, children=children)
+        return created_block_ids(response, len(children))
+
+    async def apply(self, page_id: str, kind: str, payload):
+        """
+        تنفيذ إدخالات الصندوق الصادر من غير الإضافة إلى الصفحة
+        """
+        if kind == ROW:
+            await self.database_rows.create(page_id, payload)
+        else:
+            await self.message_sync.apply(page_id, kind, payload)
+
+    async def create_child_page(self, parent_page_id: str, title: str) -> str:
+        """
+        إنشاء صفحة فرعية تحت الصفحة المرتبطة
+        """
+        page = await self.dispatcher.call(
+            self.notion.pages.create,
+            parent={"page_id": parent_page_id},
+            properties={"title": {"title": [{"type": "text", "text": {"content": title}}]}},
+        )
+        return page["id"]
+
+    async def check(self) -> dict:
+        """
+        التحقق من التوكن
+
+        Returns:
+            dict: مستخدم البوت (الـ integration) كما يعيده users.me
+
+        Raises:
+            APIResponseError: Unauthorized إذا كان التوكن غير صالح
+        """
+        return await self.dispatcher.call(self.notion.users.me)
+
+    def start(self, bot, warm_index: bool = True):
+        """
+        تجهيز الرافع وإبقاء فهرس الصفحات محدثاً في الخلفية
+        (عمال الصندوق الصادر لا يعرضون قائمة /start، فلا يحتاجون إلى الفهرس)
+        """
+        self.media_uploader.start(bot)
+        if warm_index and self._page_index_task is None:
+            self._page_index_task = asyncio.get_running_loop().create_task(self.page_index.keep_warm())
+
+    async def close(self):
+        if self._page_index_task is not None:
+            self._page_index_task.cancel()
+            self._page_index_task = None
+        await self.media_uploader.close()
+        await self.notion.aclose()
+
+
+class WorkspacePool:
+    """
+    مساحات العمل المفتوحة مفهرسة بالتوكن، تُنشأ عند أول طلب وتبقى مفتوحة حتى الإيقاف
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: دالة (workspace, token) تنشئ Workspace جديدة
+        """
+        self._factory = factory
+        self._workspaces = {}  # token -> Workspace
+        self._bot = None
+        self._warm_index = True
+
+    def get(self, token: str, workspace: str = None) -> Workspace:
+        """
+        مساحة العمل الخاصة بالتوكن، تُنشأ وتُشغّل إذا لم تكن مفتوحة
+        """
+        connection = self._workspaces.get(token)
+        if connection is None:
+            connection = self._workspaces[token] = self._factory(
+                workspace_id(token) if workspace is None else workspace, token
+            )
+            if self._bot is not None:
+                connection.start(self._bot, self._warm_index)
+        return connection
+
+    async def discard(self, token: str):
+        """
+        إغلاق مساحة عمل وإزالتها من المجموعة (مثل توكن تبين أنه غير صالح)
+        """
+        connection = self._workspaces.pop(token, None)
+        if connection is not None:
+            await connection.close()
+
+    def start(self, bot, warm_index: bool = True):
+        self._bot = bot
+        self._warm_index = warm_index
+        for connection in self._workspaces.values():
+            connection.start(bot, warm_index)
+
+    async def close(self):
+        self._bot = None
+        await asyncio.gather(*(connection.close() for connection in self._workspaces.values()))
+        self._workspaces.clear()
+
+    def __iter__(self):
+        return iter(list(self._workspaces.values()))
+
+    def __len__(self) -> int:
+        return len(self._workspaces)
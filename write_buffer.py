@@ -0,0 +1,146 @@
+# مخزن كتابة مؤجلة لكل صفحة Notion
+# يجمع الرسائل المتتالية لنفس الصفحة ويرسلها في طلب blocks.children.append واحد
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لعدد الكتل في طلب إضافة واحد حسب Notion
+NOTION_MAX_CHILDREN = 100
+
+
+class _PageQueue:
+    """
+    الرسائل المنتظرة لصفحة واحدة
+    """
+    __slots__ = ("entries", "blocks", "timer", "lock")
+
+    def __init__(self):
+        self.entries = []  # قائمة (الكتل، المستقبل) بترتيب الوصول
+        self.blocks = 0  # عدد الكتل المنتظرة
+        self.timer = None  # مؤقت التفريغ بعد انتهاء النافذة الزمنية
+        self.lock = asyncio.Lock()  # يمنع تداخل عمليات التفريغ لنفس الصفحة
+
+
+class PageWriteBuffer:
+    """
+    مخزن مؤقت يجمع الكتل لكل صفحة ويفرغها عند انتهاء نافذة زمنية قصيرة
+    أو عند الوصول إلى عدد معين من الكتل، مع الحفاظ على ترتيب الرسائل
+    """
+
+    def __init__(self, append, flush_interval: float = 0.5, max_blocks: int = NOTION_MAX_CHILDREN):
+        """
+        Args:
+            append: دالة غير متزامنة (page_id, children) ترسل الكتل إلى Notion
+                وتعيد معرفات الكتل المنشأة بنفس الترتيب (أو None إذا لم تكن معروفة)
+            flush_interval (float): مدة النافذة الزمنية بالثواني قبل التفريغ
+            max_blocks (int): عدد الكتل الذي يؤدي إلى التفريغ الفوري
+        """
+        self._append = append
+        self.flush_interval = flush_interval
+        self.max_blocks = min(max_blocks, NOTION_MAX_CHILDREN)
+        self._queues = {}
+        self._tasks = set()
+
+    async def add(self, page_id: str, blocks: list) -> list:
+        """
+        إضافة كتل رسالة واحدة إلى الصفحة والانتظار حتى يتم حفظها في Notion
+
+        Returns:
+            list: معرفات كتل الرسالة في Notion (قد تكون None إذا لم يعدها append)
+
+        Raises:
+            Exception: الخطأ الذي أعاده Notion عند فشل الدفعة التي تحتوي الرسالة
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        queue = self._queues.get(page_id)
+        if queue is None:
+            queue = self._queues[page_id] = _PageQueue()
+        queue.entries.append((blocks, future))
+        queue.blocks += len(blocks)
+
+        if queue.blocks >= self.max_blocks:
+            self._schedule_flush(page_id)
+        elif queue.timer is None:
+            queue.timer = loop.call_later(self.flush_interval, self._schedule_flush, page_id)
+
+        # الحماية من الإلغاء حتى لا يؤدي إلغاء المعالج إلى إسقاط الرسالة من الدفعة
+        return await asyncio.shield(future)
+
+    def _schedule_flush(self, page_id: str):
+        """
+        جدولة تفريغ الصفحة في مهمة منفصلة
+        """
+        task = asyncio.get_running_loop().create_task(self.flush(page_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, page_id: str):
+        """
+        إرسال كل الكتل المنتظرة للصفحة على دفعات لا تتجاوز حد Notion
+        """
+        queue = self._queues.get(page_id)
+        if queue is None:
+            return
+
+        async with queue.lock:
+            if queue.timer is not None:
+                queue.timer.cancel()
+                queue.timer = None
+            entries, queue.entries, queue.blocks = queue.entries, [], 0
+            if not entries:
+                return
+
+            error = None
+            for batch in _batches(entries, self.max_blocks):
+                if error is None:
+                    children = [block for blocks, _ in batch for block in blocks]
+                    created = []
+                    try:
+                        for start in range(0, len(children), NOTION_MAX_CHILDREN):
+                            chunk = children[start:start + NOTION_MAX_CHILDREN]
+                            block_ids = await self._append(page_id, chunk)
+                            created.extend(block_ids if block_ids is not None else [None] * len(chunk))
+                    except Exception as e:
+                        logger.error("خطأ في تفريغ دفعة الصفحة %s: %s", page_id, e)
+                        error = e
+                if error is not None:
+                    # بعد أول فشل لا نرسل الدفعات التالية حتى لا يختل ترتيب الرسائل
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                    continue
+
+                logger.info("تم إرسال %s رسالة (%s كتلة) إلى الصفحة %s", len(batch), len(children), page_id)
+                position = 0
+                for blocks, future in batch:
+                    if not future.done():
+                        future.set_result(created[position:position + len(blocks)])
+                    position += len(blocks)
+
+    async def flush_all(self):
+        """
+        تفريغ كل الصفحات وانتظار انتهاء عمليات التفريغ الجارية (يستخدم عند الإيقاف)
+        """
+        await asyncio.gather(*(self.flush(page_id) for page_id in list(self._queues)))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _batches(entries: list, max_blocks: int):
+    """
+    تقسيم الرسائل إلى دفعات متتالية دون تقسيم كتل الرسالة الواحدة
+    """
+    batch = []
+    count = 0
+    for entry in entries:
+        size = len(entry[0])
+        if batch and count + size > max_blocks:
+            yield batch
+            batch, count = [], 0
+        batch.append(entry)
+        count += size
+    if batch:
+        yield batch